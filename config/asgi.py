@@ -0,0 +1,10 @@
+"""
+ASGI entry point: gunicorn with uvicorn workers, serving the async dashboards.
+
+    gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:$PORT
+"""
+import os
+from django.core.asgi import get_asgi_application
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'true')
+application = get_asgi_application()
@@ -29,17 +29,27 @@ except ImportError:
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'portal.aio.WhiteNoiseMiddleware',  # WhiteNoise, async-capable for ASGI
+    'portal.aio.StreamingMiddleware',  # under ASGI, streams downloads instead of buffering them
+    'portal.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portal.principal.PrincipalMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+# Serve the dashboards with their async views, which run independent queries
+# concurrently. config/asgi.py turns this on; under WSGI the sync views are used.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'false').lower() == 'true'
+# Worker threads (each with its own database connection) the async views run
+# their queries on; the most queries one ASGI worker has in flight at once.
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', '32'))
 
 TEMPLATES = [
     {
@@ -75,7 +85,7 @@ if not _database_url:
     if _use_sqlite:
         DATABASES = {
             'default': {
-                'ENGINE': 'django.db.backends.sqlite3',
+                'ENGINE': 'portal.backends.sqlite3',
                 'NAME': BASE_DIR / 'db.sqlite3',
             }
         }
@@ -95,6 +105,88 @@ if not _database_url:
             }
         }
 
+# SQLite (USE_SQLITE, or a sqlite:// DATABASE_URL) runs in WAL mode with the
+# pragmas below applied to every connection (see portal.sqlite), and its
+# transactions take the write lock up front (portal.backends.sqlite3), so
+# concurrent gunicorn workers queue for writes instead of failing with
+# "database is locked".
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['ENGINE'] = 'portal.backends.sqlite3'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_MB', '256')) * 2 ** 20,
+    # Negative: KiB rather than pages
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_MB', '64')) * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Read replicas: DATABASE_REPLICA_URLS is a comma-separated list of database
+# URLs (e.g. postgres://reader@replica1/school or, to try it locally,
+# sqlite:////path/to/replica.sqlite3). Views marked @replica_reads read from
+# them; see portal.replicas. A browser that has just written reads from the
+# primary for REPLICA_PIN_SECONDS so it sees its own changes.
+DATABASE_REPLICAS = []
+_replica_urls = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+if _replica_urls:
+    try:
+        import dj_database_url
+
+        for _n, _url in enumerate(_replica_urls, 1):
+            DATABASES[f'replica{_n}'] = {
+                **dj_database_url.parse(_url, conn_max_age=600),
+                # Tests read the test primary through the replica aliases
+                'TEST': {'MIRROR': 'default'},
+            }
+            DATABASE_REPLICAS.append(f'replica{_n}')
+    except ImportError:
+        # without dj_database_url every read stays on the primary
+        pass
+DATABASE_ROUTERS = ['portal.replicas.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '60'))
+
+# Shared cache: Redis when REDIS_URL is set, otherwise a file cache that all
+# gunicorn workers on the host can see (local-memory caches are per process,
+# so write-through invalidation would not reach the other workers).
+_redis_url = os.environ.get('REDIS_URL')
+if _redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _redis_url,
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _redis_url,
+            'KEY_PREFIX': 'sessions',
+        },
+    }
+else:
+    _cache_dir = Path(os.environ.get('CACHE_DIR', str(BASE_DIR / '.cache')))
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(_cache_dir),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(_cache_dir / 'sessions'),
+            'OPTIONS': {'MAX_ENTRIES': 50000},
+        },
+    }
+
+# Sessions are read from their own cache (so feed/page churn never evicts
+# them) and written through to the database, which is the fallback on a
+# cache miss. Flash messages travel in a signed cookie and the CSRF token in
+# its own cookie, so a session is only written when its data changes (login,
+# logout), never just because a page was viewed.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_SAVE_EVERY_REQUEST = False
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -132,3 +224,35 @@ except ImportError:
     pass
 
 AUTH_USER_MODEL = 'portal.User'
+# PrincipalBackend loads user + role profile in one cached query; ModelBackend
+# keeps sessions created before it was added valid
+AUTHENTICATION_BACKENDS = [
+    'portal.principal.PrincipalBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Printed on generated documents such as report cards
+SCHOOL_NAME = os.environ.get('SCHOOL_NAME', 'Secondary School')
+# Processes used when an admin downloads report cards; 0 renders in the web process
+REPORT_CARD_WORKERS = int(os.environ.get('REPORT_CARD_WORKERS', '2'))
+# Student onboarding: IDs are <prefix><year><serial>, e.g. STU20260001. Generated
+# one-time passwords are hashed at the lower iteration count (they are random,
+# and Django upgrades the hash at first login) across ONBOARDING_WORKERS processes
+STUDENT_ID_PREFIX = os.environ.get('STUDENT_ID_PREFIX', 'STU')
+INITIAL_PASSWORD_ITERATIONS = int(os.environ.get('INITIAL_PASSWORD_ITERATIONS', '100000'))
+ONBOARDING_WORKERS = int(os.environ.get('ONBOARDING_WORKERS', '2'))
+
+# Outgoing email (notifications are sent by ``manage.py runworker``). Without
+# EMAIL_HOST messages are printed to the worker's console.
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@localhost')
+if os.environ.get('EMAIL_HOST'):
+    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    EMAIL_HOST = os.environ['EMAIL_HOST']
+    EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
+    EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+    EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+    EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() == 'true'
+else:
+    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Seconds a notification waits so that a user's events go out as one digest email
+NOTIFICATION_DIGEST_DELAY = int(os.environ.get('NOTIFICATION_DIGEST_DELAY', '120'))
@@ -1,5 +1,5 @@
 """
-Root URL configuration. Public site and Portal.
+Root URL configuration. Public site, Portal and the read-only JSON API.
 """
 from django.conf import settings
 from django.conf.urls.static import static
@@ -10,6 +10,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('public.urls', namespace='public')),
     path('portal/', include('portal.urls', namespace='portal')),
+    path('api/v1/', include('portal.api_urls', namespace='api_v1')),
 ]
 
 if settings.DEBUG:
@@ -1,18 +1,57 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.http import StreamingHttpResponse
+from . import approvals, attendance, exports, jobs, report_cards, typeahead
 from .models import (
     User, AcademicSession, Term, Class, Subject,
     Teacher, Student, ClassSubject, Result, Announcement,
-    AdmissionApplication, ContactMessage, NewsArticle, Attendance,
+    AdmissionApplication, ContactMessage, NewsArticle, Attendance, TermReport, Job, Notification, PickerKey,
 )
 
 
+class PickerSearchMixin:
+    """
+    Search (changelist and autocomplete widgets) through the typeahead prefix
+    index: every word must start a name, username or ID. ``search_fields``
+    only serve Django's checks and the empty search.
+    """
+    picker_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        rows = typeahead.matching(self.picker_kind, search_term)
+        if rows is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=rows.values('object_id')), False
+
+
+class ExportMixin:
+    """'Export selected' actions streaming the selection through ``export`` (a portal.exports function)."""
+    export = None
+
+    def _export(self, queryset, fmt):
+        return exports.response(self.export(queryset), fmt)
+
+    @admin.action(description='Export selected as CSV')
+    def export_csv(self, request, queryset):
+        return self._export(queryset, 'csv')
+
+    @admin.action(description='Export selected as XLSX')
+    def export_xlsx(self, request, queryset):
+        return self._export(queryset, 'xlsx')
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'role', 'is_staff')
     list_filter = ('role', 'is_staff')
-    fieldsets = BaseUserAdmin.fieldsets + [('Portal', {'fields': ('role', 'phone', 'avatar')})]
-    add_fieldsets = BaseUserAdmin.add_fieldsets + [('Portal', {'fields': ('role', 'phone')})]
+    fieldsets = BaseUserAdmin.fieldsets + (('Portal', {'fields': ('role', 'phone', 'avatar')}),)
+    add_fieldsets = BaseUserAdmin.add_fieldsets + (('Portal', {'fields': ('role', 'phone')}),)
+    # Prefix matches for the student/teacher user autocompletes
+    search_fields = ('^username', '^first_name', '^last_name', '^email')
 
 
 @admin.register(AcademicSession)
@@ -37,27 +76,70 @@ class SubjectAdmin(admin.ModelAdmin):
 
 
 @admin.register(Teacher)
-class TeacherAdmin(admin.ModelAdmin):
+class TeacherAdmin(PickerSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'employee_id')
     filter_horizontal = ('subjects',)
+    autocomplete_fields = ('user',)
+    ordering = ('user__first_name', 'user__last_name')
+    search_fields = ('^employee_id', '^user__first_name', '^user__last_name', '^user__username')
+    picker_kind = PickerKey.KIND_TEACHER
 
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(PickerSearchMixin, ExportMixin, admin.ModelAdmin):
     list_display = ('user', 'student_id', 'current_class', 'parent_contact')
     list_filter = ('current_class',)
+    autocomplete_fields = ('user',)
+    ordering = ('user__first_name', 'user__last_name')
+    search_fields = ('^student_id', '^user__first_name', '^user__last_name', '^user__username')
+    picker_kind = PickerKey.KIND_STUDENT
+    export = staticmethod(exports.roster)
+    actions = ['export_csv', 'export_xlsx']
 
 
 @admin.register(ClassSubject)
 class ClassSubjectAdmin(admin.ModelAdmin):
     list_display = ('class_ref', 'subject', 'teacher')
     list_filter = ('class_ref',)
+    autocomplete_fields = ('teacher',)
 
 
 @admin.register(Result)
-class ResultAdmin(admin.ModelAdmin):
+class ResultAdmin(ExportMixin, admin.ModelAdmin):
     list_display = ('student', 'subject', 'term', 'score', 'status', 'uploaded_by', 'created_at')
     list_filter = ('term', 'status', 'subject')
+    autocomplete_fields = ('student', 'uploaded_by')
+    export = staticmethod(exports.results)
+    actions = ['approve_selected', 'reject_selected', 'export_csv', 'export_xlsx']
+
+    @admin.action(description='Approve selected pending results')
+    def approve_selected(self, request, queryset):
+        count = approvals.approve(queryset)
+        self.message_user(request, f'{count} result(s) approved.')
+
+    @admin.action(description='Reject selected pending results')
+    def reject_selected(self, request, queryset):
+        count = approvals.reject(queryset)
+        self.message_user(request, f'{count} result(s) rejected.')
+
+
+@admin.register(TermReport)
+class TermReportAdmin(admin.ModelAdmin):
+    list_display = ('student', 'term', 'class_ref', 'total', 'average', 'position', 'class_size')
+    list_filter = ('term', 'class_ref')
+    readonly_fields = ('student', 'term', 'class_ref', 'total', 'average', 'subject_count', 'position', 'class_size')
+    actions = ['download_report_cards']
+
+    @admin.action(description='Download report cards for selected students (PDF zip)')
+    def download_report_cards(self, request, queryset):
+        selected = queryset.values_list('class_ref_id', 'term_id', 'student_id')
+        pairs = sorted({(class_id, term_id) for class_id, term_id, _ in selected})
+        documents = report_cards.iter_rendered(
+            pairs, workers=settings.REPORT_CARD_WORKERS,
+            student_ids={student_id for _, _, student_id in selected})
+        response = StreamingHttpResponse(report_cards.stream_zip(documents), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="report-cards.zip"'
+        return response
 
 
 @admin.register(Announcement)
@@ -68,8 +150,9 @@ class AnnouncementAdmin(admin.ModelAdmin):
 
 @admin.register(AdmissionApplication)
 class AdmissionApplicationAdmin(admin.ModelAdmin):
-    list_display = ('first_name', 'last_name', 'email', 'applying_class', 'status', 'submitted_at')
+    list_display = ('first_name', 'last_name', 'email', 'applying_class', 'status', 'student', 'submitted_at')
     list_filter = ('status', 'applying_class')
+    autocomplete_fields = ('student',)
 
 
 @admin.register(ContactMessage)
@@ -85,6 +168,46 @@ class NewsArticleAdmin(admin.ModelAdmin):
 
 
 @admin.register(Attendance)
-class AttendanceAdmin(admin.ModelAdmin):
+class AttendanceAdmin(ExportMixin, admin.ModelAdmin):
     list_display = ('student', 'date', 'present', 'remarks')
     list_filter = ('date', 'present')
+    autocomplete_fields = ('student',)
+    export = staticmethod(exports.attendance)
+    actions = ['mark_present', 'mark_absent', 'export_csv', 'export_xlsx']
+
+    def _mark(self, queryset, present):
+        # Through attendance.mark() so the yearly bitmaps follow, one upsert per date
+        rows = sorted(queryset.values_list('date', 'student_id', 'remarks'))
+        count = 0
+        for on_date, group in groupby(rows, key=itemgetter(0)):
+            count += attendance.mark(on_date, {student_id: (present, remarks) for _, student_id, remarks in group})
+        return count
+
+    @admin.action(description='Mark selected present')
+    def mark_present(self, request, queryset):
+        self.message_user(request, f'{self._mark(queryset, True)} record(s) marked present.')
+
+    @admin.action(description='Mark selected absent')
+    def mark_absent(self, request, queryset):
+        self.message_user(request, f'{self._mark(queryset, False)} record(s) marked absent.')
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'title', 'created_at', 'sent_at')
+    list_filter = ('kind', ('sent_at', admin.EmptyFieldListFilter))
+    search_fields = ('user__username', 'title')
+    raw_id_fields = ('user',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'queue', 'priority', 'attempts', 'run_at', 'locked_by', 'finished_at')
+    list_filter = ('status', 'queue', 'task')
+    search_fields = ('task',)
+    readonly_fields = ('attempts', 'locked_until', 'locked_by', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_selected']
+
+    @admin.action(description='Queue selected jobs again')
+    def retry_selected(self, request, queryset):
+        self.message_user(request, f'{jobs.retry(queryset)} job(s) queued again.')
@@ -0,0 +1,113 @@
+"""
+Helpers for the async views served under ASGI (config/asgi.py).
+
+Django's async ORM methods (``acount()``, ``aget()``, ...) all run in the
+request's one sync thread, one after another, and under ASGI that thread is
+new for every request, so any connection it opens is opened afresh.
+``run()`` and ``gather()`` use a shared pool of ASYNC_DB_THREADS worker
+threads instead (asyncio's default pool has only a handful). Each thread
+keeps its own database connection, so ``gather()``'s queries really overlap
+and the event loop serves other requests in the meantime. Each call's
+connection is released as at the end of a request (close_old_connections,
+so CONN_MAX_AGE keeps it open for the next call).
+
+Django runs a middleware chain async only as far as its first sync-only
+middleware, and everything below it (the async views included) then hops
+threads and event loops on every request. WhiteNoise is sync-only, hence
+``WhiteNoiseMiddleware`` below, which MIDDLEWARE uses instead.
+
+Streamed downloads (exports, report-card zips) are sync generators. Under
+ASGI Django drains such a generator into a list with a single sync_to_async
+call before sending the first byte, holding the whole download in memory.
+``StreamingMiddleware`` hands it to the server a chunk at a time instead.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from whitenoise import middleware as whitenoise
+
+
+@cache
+def _executor():
+    return ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix='portal-db')
+
+
+def _released(call):
+    def released():
+        try:
+            return call()
+        finally:
+            close_old_connections()
+    return released
+
+
+async def run(call):
+    """Run the blocking ``call()`` on a worker thread and return its result."""
+    return await sync_to_async(_released(call), thread_sensitive=False, executor=_executor())()
+
+
+async def gather(calls):
+    """Run ``{name: callable}`` concurrently on worker threads; returns ``{name: result}``."""
+    results = await asyncio.gather(*(run(call) for call in calls.values()))
+    return dict(zip(calls, results))
+
+
+class WhiteNoiseMiddleware(whitenoise.WhiteNoiseMiddleware):
+    """WhiteNoise that also runs async, so it keeps the chain below it async under ASGI."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        return super().__call__(request)
+
+    async def _acall(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+_DONE = object()
+
+
+async def _chunks(iterator):
+    # One chunk per hop to the request's sync thread, where the view (and its
+    # database connection) ran
+    step = sync_to_async(next, thread_sensitive=True)
+    iterator = iter(iterator)
+    while (chunk := await step(iterator, _DONE)) is not _DONE:
+        yield chunk
+
+
+class StreamingMiddleware:
+    """Under ASGI, stream sync streaming responses chunk by chunk; a no-op under WSGI."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        return self.get_response(request)
+
+    async def _acall(self, request):
+        response = await self.get_response(request)
+        if response.streaming and not response.is_async:
+            response.streaming_content = _chunks(response.streaming_content)
+        return response
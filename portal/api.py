@@ -0,0 +1,361 @@
+"""
+Read-only JSON API (version 1) for the mobile app: results, terms,
+announcements, attendance and news.
+
+Every resource is a ``values()`` projection. The fields a request asks for
+(``?fields=``) map straight to ORM paths, and no model instances are built.
+The projection for each field set is worked out once. Lists are
+keyset-paginated with the portal's KeysetPaginator (``?cursor=``,
+``?limit=``). Each resource scopes rows to the principal: students see their
+own results and attendance and their class's announcements.
+
+Conditional requests. A resource has a version number in Django's cache.
+It is moved on commit by the signal handlers in portal.signals and by the
+bulk write paths (approvals, imports, attendance registers, report
+recomputes), which skip signals. A response is cached under (resource,
+version, scope, query) together with its ETag, a hash of the body. A
+repeat request for unchanged data is answered from the cache: a 304 when
+If-None-Match matches, the cached body otherwise, in both cases without a
+query. An unchanged body keeps its ETag even after the version moves.
+"""
+import hashlib
+import json
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlsplit
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import feeds
+from .models import (
+    AcademicSession, Announcement, Attendance, Class, ClassSubject, NewsArticle, Result, Student, Subject, Term,
+)
+from .pagination import KeysetPaginator
+from .replicas import primary
+
+VERSION = 'v1'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_BATCH = 10
+RESPONSE_TIMEOUT = 60 * 10
+# Versions are moved on every write; expiry is only a safety net
+VERSION_TIMEOUT = 60 * 60 * 24
+
+
+class ApiError(Exception):
+    """A request the API refuses; carries the HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- Versions -------------------------------------------------------------------
+
+def _version_key(resource):
+    return f'portal:api:{VERSION}:version:{resource}'
+
+
+def version(resource):
+    key = _version_key(resource)
+    current = cache.get(key)
+    if current is None:
+        current = timezone.now().timestamp()
+        cache.add(key, current, VERSION_TIMEOUT)
+    return current
+
+
+def bump(*resources):
+    """Retire cached responses of ``resources`` now."""
+    stamp = timezone.now().timestamp()
+    cache.set_many({_version_key(r): stamp for r in resources}, VERSION_TIMEOUT)
+
+
+def touch(*resources):
+    """Retire cached responses of ``resources`` once the current transaction commits."""
+    transaction.on_commit(lambda: bump(*resources))
+
+
+# --- Resources ------------------------------------------------------------------
+
+class Resource:
+    """
+    One API collection. ``fields`` maps public names to ORM paths; ``scope``
+    narrows the base queryset to what a principal may read and ``scope_key``
+    names that slice for the response cache; ``filters`` maps query
+    parameters to (lookup, parser).
+    """
+
+    def __init__(self, name, model, fields, ordering, scope, scope_key, default=None, filters=None, public=False):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.default = tuple(default or fields)
+        self.ordering = ordering
+        self.scope = scope
+        self.scope_key = scope_key
+        self.filters = filters or {}
+        self.public = public
+
+    def fields_for(self, raw):
+        if not raw:
+            return self.default
+        names = tuple(dict.fromkeys(n.strip() for n in raw.split(',') if n.strip()))
+        unknown = [n for n in names if n not in self.fields]
+        if unknown:
+            raise ApiError(400, f"Unknown field(s) for {self.name}: {', '.join(unknown)}.")
+        return names
+
+    def queryset(self, principal, params):
+        qs = self.scope(self.model.objects.all(), principal)
+        if qs is None:
+            raise ApiError(403, f'Your account cannot read {self.name}.')
+        for param, (lookup, parse) in self.filters.items():
+            raw = params.get(param)
+            if raw in (None, ''):
+                continue
+            value = parse(raw)
+            if value is None:
+                raise ApiError(400, f'Invalid value for {param}.')
+            qs = qs.filter(**{lookup: value})
+        return qs
+
+
+@lru_cache(maxsize=None)
+def projection(resource_name, names):
+    """
+    values() arguments for a field set and where each field lands in the row.
+    The ordering columns keep their names (the paginator reads them); the
+    rest get aliases, since values() refuses names that clash with fields.
+    """
+    resource = RESOURCES[resource_name]
+    keys = [f.lstrip('-') for f in resource.ordering]
+    columns = {n: n if n in keys else f'api_{n}' for n in names}
+    expressions = {columns[n]: F(resource.fields[n]) for n in names if n not in keys}
+    return keys, expressions, columns
+
+
+def _int(raw):
+    # Not str.isdigit(): it passes '²', which int() rejects
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date(raw):
+    # parse_date returns None for a malformed date but raises for an impossible one (2024-13-45)
+    try:
+        return parse_date(raw)
+    except ValueError:
+        return None
+
+
+def _choice(choices):
+    return lambda raw: raw if raw in dict(choices) else None
+
+
+def _results_scope(qs, principal):
+    if principal.is_admin:
+        return qs
+    if principal.is_teacher:
+        return qs.filter(uploaded_by_id=principal.user.pk)
+    if principal.is_student and principal.student:
+        return qs.filter(student=principal.student, status=Result.STATUS_APPROVED)
+    return None
+
+
+def _announcements_scope(qs, principal):
+    if principal.is_admin:
+        return qs
+    if principal.is_student or principal.is_teacher:
+        return qs.filter(feeds.feed_filter(principal.class_id))
+    return None
+
+
+def _attendance_scope(qs, principal):
+    if principal.is_admin:
+        return qs
+    if principal.is_teacher:
+        classes = ClassSubject.objects.filter(teacher__user_id=principal.user.pk).values('class_ref_id')
+        return qs.filter(student__current_class_id__in=classes)
+    if principal.is_student and principal.student:
+        return qs.filter(student=principal.student)
+    return None
+
+
+def _signed_in(qs, principal):
+    return qs if principal.role else None
+
+
+def _everyone(qs, principal):
+    return qs
+
+
+def _per_role(principal):
+    # Admins share one slice; everyone else sees rows scoped to themselves
+    return 'admin' if principal.is_admin else f'user:{principal.user.pk}' if principal.user else 'anonymous'
+
+
+def _per_feed(principal):
+    return 'admin' if principal.is_admin else f'class:{principal.class_id or 0}'
+
+
+RESOURCES = {r.name: r for r in [
+    Resource(
+        'results', Result,
+        fields={
+            'id': 'pk', 'student': 'student_id', 'student_code': 'student__student_id',
+            'term': 'term_id', 'term_name': 'term__name', 'session': 'term__session__name',
+            'subject': 'subject_id', 'subject_name': 'subject__name', 'subject_code': 'subject__code',
+            'score': 'score', 'position': 'subject_position', 'status': 'status', 'approved_at': 'approved_at',
+        },
+        default=['id', 'term', 'term_name', 'session', 'subject', 'subject_name', 'score', 'position', 'status'],
+        ordering=('-term_id', 'subject_id', 'pk'),
+        scope=_results_scope, scope_key=_per_role,
+        filters={
+            'term': ('term_id', _int), 'subject': ('subject_id', _int), 'student': ('student_id', _int),
+            'status': ('status', _choice(Result.STATUS_CHOICES)),
+        },
+    ),
+    Resource(
+        'terms', Term,
+        fields={
+            'id': 'pk', 'name': 'name', 'session': 'session_id', 'session_name': 'session__name',
+            'start_date': 'start_date', 'end_date': 'end_date', 'is_current': 'session__is_current',
+        },
+        ordering=('-start_date', 'pk'),
+        scope=_signed_in, scope_key=lambda principal: 'all',
+        filters={'session': ('session_id', _int)},
+    ),
+    Resource(
+        'announcements', Announcement,
+        fields={
+            'id': 'pk', 'title': 'title', 'content': 'content', 'date': 'date', 'created_at': 'created_at',
+            'scope': 'scope', 'class': 'target_class_id', 'class_name': 'target_class__name',
+        },
+        ordering=feeds.FEED_ORDERING,
+        scope=_announcements_scope, scope_key=_per_feed,
+        filters={'since': ('date__gte', _date)},
+    ),
+    Resource(
+        'attendance', Attendance,
+        fields={
+            'id': 'pk', 'date': 'date', 'present': 'present', 'remarks': 'remarks',
+            'student': 'student_id', 'student_code': 'student__student_id',
+        },
+        default=['id', 'date', 'present', 'remarks'],
+        ordering=('-date', 'pk'),
+        scope=_attendance_scope, scope_key=_per_role,
+        filters={
+            'from': ('date__gte', _date), 'to': ('date__lte', _date), 'student': ('student_id', _int),
+        },
+    ),
+    Resource(
+        'news', NewsArticle,
+        fields={
+            'id': 'pk', 'slug': 'slug', 'title': 'title', 'excerpt': 'excerpt', 'content': 'content',
+            'published_date': 'published_date', 'updated_at': 'updated_at',
+        },
+        default=['id', 'slug', 'title', 'excerpt', 'published_date'],
+        ordering=('-published_date', '-pk'),
+        scope=_everyone, scope_key=lambda principal: 'all', public=True,
+    ),
+]}
+
+# Which resources a model's rows show up in, directly or through a joined
+# name (for the signal handlers)
+DEPENDENTS = {
+    Result: ['results'],
+    Term: ['terms', 'results'],
+    AcademicSession: ['terms', 'results'],
+    Subject: ['results'],
+    Student: ['results', 'attendance'],
+    Class: ['announcements'],
+    ClassSubject: ['attendance'],  # a teacher's classes scope what attendance they read
+    Announcement: ['announcements'],
+    Attendance: ['attendance'],
+    NewsArticle: ['news'],
+}
+
+
+# --- Responses ------------------------------------------------------------------
+
+def _limit(params):
+    raw = params.get('limit')
+    if raw in (None, ''):
+        return DEFAULT_LIMIT
+    value = _int(raw)
+    if value is None or value < 1:
+        raise ApiError(400, 'limit must be a positive integer.')
+    return min(value, MAX_LIMIT)
+
+
+def _list(resource, principal, params):
+    names = resource.fields_for(params.get('fields'))
+    keys, expressions, columns = projection(resource.name, names)
+    rows = resource.queryset(principal, params).values(*keys, **expressions)
+    page = KeysetPaginator(rows, resource.ordering, per_page=_limit(params)).page(params.get('cursor'))
+    return {
+        'data': [{n: row[c] for n, c in columns.items()} for row in page.object_list],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+
+
+def _detail(resource, principal, params, pk):
+    names = resource.fields_for(params.get('fields'))
+    keys, expressions, columns = projection(resource.name, names)
+    row = resource.queryset(principal, {}).filter(pk=pk).values(*keys, **expressions).first()
+    if row is None:
+        raise ApiError(404, f'No {resource.name} item {pk}.')
+    return {'data': {n: row[c] for n, c in columns.items()}}
+
+
+def _cache_key(resource, principal, params, pk):
+    query = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    digest = hashlib.md5(f'{pk}?{query}'.encode(), usedforsecurity=False).hexdigest()
+    return f'portal:api:{VERSION}:{resource.name}:{version(resource.name)}:{resource.scope_key(principal)}:{digest}'
+
+
+def fetch(name, principal, params, pk=None):
+    """
+    (status, body bytes, etag) for one resource request; ``params`` is a plain
+    dict of query parameters. Successful bodies come from the response cache.
+    """
+    resource = RESOURCES.get(name)
+    try:
+        if resource is None:
+            raise ApiError(404, f'No resource named {name}.')
+        if not resource.public and not principal.role:
+            raise ApiError(401, 'Sign in to use the API.')
+        key = _cache_key(resource, principal, params, pk)
+        entry = cache.get(key)
+        if entry is None:
+            with primary():
+                payload = _list(resource, principal, params) if pk is None else _detail(resource, principal, params, pk)
+            body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+            entry = (body, '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest())
+            cache.set(key, entry, RESPONSE_TIMEOUT)
+        return (200, *entry)
+    except ApiError as exc:
+        return exc.status, json.dumps({'error': exc.message}).encode(), None
+
+
+def parse_path(path):
+    """('results', {'term': '3'}, None) from 'results?term=3', or 'results/7' -> pk 7; None if malformed."""
+    parts = urlsplit(path)
+    segments = [s for s in parts.path.strip('/').split('/') if s]
+    if not segments or len(segments) > 2 or (len(segments) == 2 and not segments[1].isdecimal()):
+        return None
+    pk = int(segments[1]) if len(segments) == 2 else None
+    return segments[0], dict(parse_qsl(parts.query)), pk
+
+
+def visible_resources(principal):
+    return [name for name, r in RESOURCES.items() if r.public or principal.role]
@@ -0,0 +1,16 @@
+"""
+URLs of the read-only JSON API, mounted at /api/v1/ (namespace ``api_v1``).
+A later incompatible version gets its own module and prefix.
+"""
+from django.urls import path
+
+from .views import api_views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('', api_views.api_index, name='index'),
+    path('batch/', api_views.api_batch, name='batch'),
+    path('<slug:name>/', api_views.api_resource, name='resource'),
+    path('<slug:name>/<int:pk>/', api_views.api_resource, name='item'),
+]
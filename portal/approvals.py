@@ -0,0 +1,56 @@
+"""
+Result approval workflow: set-based status changes for the approval queue.
+
+Every transition is one UPDATE over a filtered queryset, so approving a whole
+term costs the same single statement as approving one result. Only pending
+results are ever moved, which keeps the pending-results counter exact.
+Approvals queue one notification job for the students concerned.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import api, counters, notifications, reports
+from .models import Result
+
+
+def pending_results(term=None, class_ref=None, subject=None, uploaded_by=None, pks=None):
+    """Pending results narrowed by any combination of filters (None = no filter)."""
+    qs = Result.objects.filter(status=Result.STATUS_PENDING)
+    if term is not None:
+        qs = qs.filter(term=term)
+    if class_ref is not None:
+        qs = qs.filter(student__current_class=class_ref)
+    if subject is not None:
+        qs = qs.filter(subject=subject)
+    if uploaded_by is not None:
+        qs = qs.filter(uploaded_by=uploaded_by)
+    if pks is not None:
+        qs = qs.filter(pk__in=pks)
+    return qs
+
+
+def _review(queryset, **changes):
+    with transaction.atomic():
+        count = queryset.filter(status=Result.STATUS_PENDING).update(**changes)
+        counters.bump(counters.PENDING_RESULTS, -count)
+        if count:
+            api.touch('results')
+    return count
+
+
+def approve(queryset):
+    """Approve the pending results in ``queryset`` with one UPDATE; returns the row count."""
+    with transaction.atomic():
+        pending = queryset.filter(status=Result.STATUS_PENDING)
+        # Term reports only count approved results, so only approvals move them
+        reports.schedule(reports.affected(pending))
+        students = [list(pair) for pair in pending.order_by().values_list('student_id', 'term_id').distinct()]
+        count = _review(queryset, status=Result.STATUS_APPROVED, approved_at=timezone.now())
+        if count:
+            notifications.results_approved.enqueue(students)
+        return count
+
+
+def reject(queryset):
+    """Reject the pending results in ``queryset`` with one UPDATE; returns the row count."""
+    return _review(queryset, status=Result.STATUS_REJECTED, approved_at=None)
@@ -0,0 +1,247 @@
+"""
+Daily attendance register and yearly attendance bitmaps.
+
+A register for a class and date is read in two queries and written back with
+one bulk upsert on (student, date) per batch (see portal.upserts), so
+marking 60 students costs the same single statement as marking one, and
+re-submitting a register simply overwrites the same rows.
+
+Alongside the daily rows each student has one AttendanceYear per academic
+session: bitmaps of the days marked and days present plus monthly counts.
+A student's whole year is one row, and school-wide absence reports are a
+single pass over one row per student. Term counts are read off the bitmaps
+at report time, so terms added or re-dated after marking need no rebuild. ``mark()`` keeps the bitmaps in
+step; ``rebuild()`` recomputes them from the daily rows.
+"""
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Count, FilteredRelation, Q
+
+from . import api
+from .models import AcademicSession, Attendance, AttendanceYear, Student
+from .upserts import upsert
+
+BATCH_SIZE = 1000
+
+
+def register(class_id, on_date):
+    """(student, Attendance or None) for every student in the class, in roll order."""
+    students = list(
+        Student.objects.filter(current_class_id=class_id).select_related('user').order_by('student_id', 'pk')
+    )
+    marked = {
+        a.student_id: a
+        for a in Attendance.objects.filter(date=on_date, student__current_class_id=class_id)
+    }
+    return [(s, marked.get(s.pk)) for s in students]
+
+
+@transaction.atomic
+def mark(on_date, marks):
+    """
+    Upsert ``{student_id: (present, remarks)}`` for one date. Works for any
+    number of students (a class or the whole school); returns rows written.
+    """
+    rows = [
+        Attendance(student_id=student_id, date=on_date, present=present, remarks=remarks)
+        for student_id, (present, remarks) in marks.items()
+    ]
+    upsert(rows, unique_fields=['student', 'date'], update_fields=['present', 'remarks'], batch_size=BATCH_SIZE)
+    _mark_years(on_date, marks)
+    api.touch('attendance')
+    return len(rows)
+
+
+def daily_summary(on_date):
+    """Enrolled/present/absent counts per class for a date, in one grouped query."""
+    rows = (
+        Student.objects.filter(current_class__isnull=False)
+        .annotate(day=FilteredRelation('attendances', condition=Q(attendances__date=on_date)))
+        .values('current_class_id', 'current_class__name')
+        .annotate(
+            enrolled=Count('pk'),
+            present=Count('day', filter=Q(day__present=True)),
+            absent=Count('day', filter=Q(day__present=False)),
+        )
+        .order_by('current_class__name')
+    )
+    return [dict(row, unmarked=row['enrolled'] - row['present'] - row['absent']) for row in rows]
+
+
+# --- Yearly bitmaps -------------------------------------------------------------
+
+def session_for(on_date):
+    return AcademicSession.objects.filter(start_date__lte=on_date, end_date__gte=on_date).first()
+
+
+def calendar(session):
+    """(start, end): the layout of a session's bitmaps."""
+    return session.start_date, session.end_date
+
+
+def _span(cal):
+    return (cal[1] - cal[0]).days + 1
+
+
+def _to_int(data):
+    return int.from_bytes(bytes(data), 'little')
+
+
+def _count(bits, start, stop):
+    if stop <= start:
+        return 0
+    return ((bits >> start) & ((1 << (stop - start)) - 1)).bit_count()
+
+
+def _rollups(cal, marked, present):
+    start, end = cal
+    span = _span(cal)
+    months = {}
+    month = start.replace(day=1)
+    while month <= end:
+        following = (month + timedelta(days=32)).replace(day=1)
+        lo, hi = max((month - start).days, 0), min((following - start).days, span)
+        days = _count(marked, lo, hi)
+        if days:
+            months[month.strftime('%Y-%m')] = [days, _count(present, lo, hi)]
+        month = following
+    return {'months': months}
+
+
+def _fields(cal, marked, present):
+    size = (_span(cal) + 7) // 8
+    return {
+        'marked': marked.to_bytes(size, 'little'),
+        'present': present.to_bytes(size, 'little'),
+        'days_marked': marked.bit_count(),
+        'days_present': present.bit_count(),
+        'rollups': _rollups(cal, marked, present),
+    }
+
+
+def year_fields(cal, days):
+    """AttendanceYear field values from (date, present) pairs; dates outside the session are ignored."""
+    start, end = cal
+    marked = present = 0
+    for on_date, is_present in days:
+        if start <= on_date <= end:
+            bit = 1 << (on_date - start).days
+            marked |= bit
+            if is_present:
+                present |= bit
+    return _fields(cal, marked, present)
+
+
+def year_days(year):
+    """(date, present) for every marked day of an AttendanceYear, in date order."""
+    marked, present = _to_int(year.marked), _to_int(year.present)
+    start = year.session.start_date
+    return [
+        (start + timedelta(days=i), bool(present >> i & 1))
+        for i in range(marked.bit_length()) if marked >> i & 1
+    ]
+
+
+def _save_years(session, years):
+    upsert(
+        [AttendanceYear(student_id=student_id, session=session, **fields) for student_id, fields in years.items()],
+        unique_fields=['student', 'session'],
+        update_fields=['marked', 'present', 'days_marked', 'days_present', 'rollups', 'updated_at'],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _lock_years(session, student_ids):
+    """{student_id: (marked, present)} of existing AttendanceYears, locked until the transaction ends."""
+    rows = AttendanceYear.objects.select_for_update().filter(
+        session=session, student_id__in=student_ids,
+    ).order_by('student_id').values_list('student_id', 'marked', 'present')
+    return {student_id: (_to_int(marked), _to_int(present)) for student_id, marked, present in rows}
+
+
+def _mark_years(on_date, marks):
+    session = session_for(on_date)
+    if session is None:
+        return
+    cal = calendar(session)
+    bit = 1 << (on_date - session.start_date).days
+    existing = _lock_years(session, list(marks))
+    missing = [student_id for student_id in marks if student_id not in existing]
+    if missing:
+        # Create empty rows first so that a concurrent register for the same new
+        # students waits on (and then merges with) these instead of overwriting them
+        empty = _fields(cal, 0, 0)
+        AttendanceYear.objects.bulk_create(
+            [AttendanceYear(student_id=student_id, session=session, **empty) for student_id in missing],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        existing.update(_lock_years(session, missing))
+    years = {}
+    for student_id, (is_present, _) in marks.items():
+        marked, present = existing.get(student_id, (0, 0))
+        present = present | bit if is_present else present & ~bit
+        years[student_id] = _fields(cal, marked | bit, present)
+    _save_years(session, years)
+
+
+@transaction.atomic
+def rebuild(session, student_ids=None):
+    """Recompute AttendanceYears for a session from the daily rows; returns rows written."""
+    cal = calendar(session)
+    days = Attendance.objects.filter(date__range=(session.start_date, session.end_date))
+    years = AttendanceYear.objects.filter(session=session)
+    if student_ids is not None:
+        days = days.filter(student_id__in=student_ids)
+        years = years.filter(student_id__in=student_ids)
+    rows = days.order_by('student_id').values_list('student_id', 'date', 'present')
+
+    written, batch = 0, {}
+    for student_id, group in groupby(rows.iterator(chunk_size=5000), key=itemgetter(0)):
+        batch[student_id] = year_fields(cal, ((on_date, present) for _, on_date, present in group))
+        if len(batch) >= BATCH_SIZE:
+            _save_years(session, batch)
+            written, batch = written + len(batch), {}
+    _save_years(session, batch)
+    years.exclude(student_id__in=days.values('student_id')).delete()
+    return written + len(batch)
+
+
+def absence_report(session, term=None, threshold=0.9):
+    """
+    Per-class attendance and the students below ``threshold`` for a session
+    (or one of its terms), from a single pass over its AttendanceYears.
+    """
+    if term is not None:
+        # Bit range of the term, from its current dates
+        span = _span(calendar(session))
+        lo = max((term.start_date - session.start_date).days, 0)
+        hi = min((term.end_date - session.start_date).days + 1, span)
+    classes, flagged = {}, []
+    rows = AttendanceYear.objects.filter(session=session).order_by(
+        'student__current_class__name', 'student__student_id',
+    ).values_list(
+        'student_id', 'student__student_id', 'student__user__first_name', 'student__user__last_name',
+        'student__user__username', 'student__current_class__name', 'days_marked', 'days_present',
+        *(('marked', 'present') if term is not None else ()),
+    )
+    for pk, ref, first, last, username, class_name, marked, present, *bitmaps in rows.iterator(chunk_size=2000):
+        if term is not None:
+            marked, present = (_count(_to_int(bits), lo, hi) for bits in bitmaps)
+        if not marked:
+            continue
+        totals = classes.setdefault(class_name, {'class_name': class_name or '—', 'students': 0, 'marked': 0, 'present': 0})
+        totals['students'] += 1
+        totals['marked'] += marked
+        totals['present'] += present
+        if present / marked < threshold:
+            flagged.append({
+                'pk': pk, 'student_id': ref, 'name': f'{first} {last}'.strip() or username,
+                'class_name': class_name or '—', 'marked': marked, 'present': present,
+                'absent': marked - present, 'rate': round(100 * present / marked, 1),
+            })
+    for totals in classes.values():
+        totals['rate'] = round(100 * totals['present'] / totals['marked'], 1)
+    return list(classes.values()), sorted(flagged, key=itemgetter('rate'))
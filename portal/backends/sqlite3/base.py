@@ -0,0 +1,19 @@
+"""
+SQLite backend whose transactions start with BEGIN IMMEDIATE.
+
+With a plain (deferred) BEGIN, a transaction that reads first takes the write
+lock only at its first write. If another connection wrote in the meantime,
+SQLite fails the upgrade at once with "database is locked" and does not wait
+out busy_timeout. BEGIN IMMEDIATE takes the write lock up front, so
+concurrent writers queue on busy_timeout instead. In WAL mode readers are not
+blocked either way. Django 5.1's ``transaction_mode`` option does the same;
+this keeps older Django versions covered. The pragmas are applied in
+portal.sqlite.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
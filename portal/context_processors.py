@@ -1,5 +1,7 @@
 """Context for portal nav: current user and role."""
 def portal_nav(request):
+    principal = getattr(request, 'principal', None)
     return {
-        'portal_user': getattr(request, 'user', None) if request.user.is_authenticated else None,
+        'portal_user': principal.user if principal is not None else None,
+        'principal': principal,
     }
@@ -0,0 +1,79 @@
+"""
+Maintained counters for the admin dashboard.
+
+Each counter is a row in ``Counter`` holding the size of one filtered set
+(e.g. pending results). Signal handlers in ``portal.signals`` bump the rows as
+objects are created, change state or are deleted, inside the same transaction
+as the change. Bulk writes that bypass signals call ``bump()`` with the
+number of rows they moved in or out of a set (not ``recount()``, whose
+absolute write can lose a concurrent bump), and ``manage.py
+reconcile_counters`` corrects any drift.
+"""
+from django.db.models import F
+
+from .models import (
+    Counter, Student, Teacher, Result, AdmissionApplication, ContactMessage,
+)
+
+STUDENTS = 'students'
+TEACHERS = 'teachers'
+PENDING_RESULTS = 'pending_results'
+PENDING_ADMISSIONS = 'pending_admissions'
+UNREAD_CONTACTS = 'unread_contacts'
+
+# name -> (model, field filters an object must match to be counted)
+COUNTERS = {
+    STUDENTS: (Student, {}),
+    TEACHERS: (Teacher, {}),
+    PENDING_RESULTS: (Result, {'status': Result.STATUS_PENDING}),
+    PENDING_ADMISSIONS: (AdmissionApplication, {'status': AdmissionApplication.STATUS_PENDING}),
+    UNREAD_CONTACTS: (ContactMessage, {'read': False}),
+}
+
+
+def counters_for(model):
+    return [(name, filters) for name, (m, filters) in COUNTERS.items() if m is model]
+
+
+def matches(instance, filters):
+    """Whether ``instance`` is counted; None if a filtered field was not loaded."""
+    values = instance.__dict__
+    if any(field not in values for field in filters):
+        return None
+    return all(values[field] == wanted for field, wanted in filters.items())
+
+
+def true_count(name):
+    model, filters = COUNTERS[name]
+    return model.objects.filter(**filters).count()
+
+
+def recount(*names):
+    """Recompute counters from the tables; returns {name: (old, new)}."""
+    changes = {}
+    for name in names or COUNTERS:
+        value = true_count(name)
+        counter, created = Counter.objects.get_or_create(name=name, defaults={'value': value})
+        old = None if created else counter.value
+        if not created and counter.value != value:
+            Counter.objects.filter(name=name).update(value=value)
+        changes[name] = (old, value)
+    return changes
+
+
+def bump(name, delta):
+    """Atomically add ``delta`` to a counter, creating it from a full count if missing."""
+    if not delta:
+        return
+    if not Counter.objects.filter(name=name).update(value=F('value') + delta):
+        recount(name)
+
+
+def read(*names):
+    """Current values in one query; missing counters are initialised on first read."""
+    names = names or tuple(COUNTERS)
+    values = dict(Counter.objects.filter(name__in=names).values_list('name', 'value'))
+    missing = [name for name in names if name not in values]
+    if missing:
+        values.update({name: new for name, (old, new) in recount(*missing).items()})
+    return values
@@ -0,0 +1,264 @@
+"""
+Streaming CSV / XLSX exports of results, class rosters and attendance.
+
+Rows are read with ``values_list(...).iterator(chunk_size=CHUNK_SIZE)``. That
+is a server-side cursor on PostgreSQL and fetchmany() batches elsewhere, with
+no model instances built. Each row is encoded as it arrives and handed to a
+StreamingHttpResponse every FLUSH_ROWS rows. Memory stays flat however many
+years are exported, and the download starts with the first chunk. Rows come
+out in primary-key order, which needs no sort before the first one.
+
+Text that a spreadsheet would run as a formula (``=...``, ``+...``, ``-...``,
+``@...``) is written to CSV with a leading apostrophe; XLSX cells are inline
+strings, which are never evaluated.
+
+XLSX is written directly (a zip of a few fixed XML parts plus one worksheet
+streamed row by row, strings inline). openpyxl's write-only mode would still
+finish the whole file before the first byte could be sent.
+"""
+import codecs
+import csv
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Attendance, Result, Student
+
+CHUNK_SIZE = 2000  # rows fetched per round trip
+FLUSH_ROWS = 500  # rows per chunk sent to the client
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+# --- Exports --------------------------------------------------------------------
+# Each returns (title, headers, rows) for a queryset of its model; rows is a
+# lazy iterator of tuples.
+
+def _stream(queryset, *fields):
+    return queryset.order_by('pk').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+def results(queryset=None):
+    rows = _stream(
+        Result.objects.all() if queryset is None else queryset,
+        'term__session__name', 'term__name', 'student__student_id', 'student__user__first_name',
+        'student__user__last_name', 'student__current_class__name', 'subject__code', 'subject__name',
+        'score', 'subject_position', 'status', 'approved_at',
+    )
+    headers = ['session', 'term', 'student_id', 'first_name', 'last_name', 'class', 'subject_code', 'subject',
+               'score', 'subject_position', 'status', 'approved_at']
+    return 'Results', headers, rows
+
+
+def roster(queryset=None):
+    rows = _stream(
+        Student.objects.all() if queryset is None else queryset,
+        'student_id', 'user__first_name', 'user__last_name', 'user__username', 'user__email',
+        'current_class__name', 'date_of_birth', 'parent_contact', 'user__is_active',
+    )
+    headers = ['student_id', 'first_name', 'last_name', 'username', 'email', 'class', 'date_of_birth',
+               'parent_contact', 'active']
+    return 'Roster', headers, rows
+
+
+def attendance(queryset=None):
+    rows = _stream(
+        Attendance.objects.all() if queryset is None else queryset,
+        'date', 'student__student_id', 'student__user__first_name', 'student__user__last_name',
+        'student__current_class__name', 'present', 'remarks',
+    )
+    headers = ['date', 'student_id', 'first_name', 'last_name', 'class', 'present', 'remarks']
+    return 'Attendance', headers, rows
+
+
+def results_queryset(term=None, class_ref=None, subject=None, uploaded_by=None, status=None):
+    """Results narrowed by any combination of filters (None = no filter)."""
+    qs = Result.objects.all()
+    if term is not None:
+        qs = qs.filter(term=term)
+    if class_ref is not None:
+        qs = qs.filter(student__current_class=class_ref)
+    if subject is not None:
+        qs = qs.filter(subject=subject)
+    if uploaded_by is not None:
+        qs = qs.filter(uploaded_by=uploaded_by)
+    if status:
+        qs = qs.filter(status=status)
+    return qs
+
+
+def attendance_queryset(class_ref=None, start=None, end=None):
+    qs = Attendance.objects.all()
+    if class_ref is not None:
+        qs = qs.filter(student__current_class=class_ref)
+    if start is not None:
+        qs = qs.filter(date__gte=start)
+    if end is not None:
+        qs = qs.filter(date__lte=end)
+    return qs
+
+
+# --- Encoders -------------------------------------------------------------------
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if timezone.is_aware(value) else value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    return str(value)
+
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_text(value):
+    """_text() of a CSV cell; text that would be read as a formula gets a leading apostrophe."""
+    text = _text(value)
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+class _Lines:
+    """File-like target for csv.writer that collects the encoded lines."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, line):
+        self.parts.append(line)
+
+    def drain(self):
+        data = ''.join(self.parts).encode('utf-8')
+        self.parts.clear()
+        return data
+
+
+def stream_csv(headers, rows):
+    """CSV (UTF-8 with a BOM, so Excel reads it right) as a generator of byte chunks."""
+    lines = _Lines()
+    writer = csv.writer(lines)
+    writer.writerow(headers)
+    yield codecs.BOM_UTF8 + lines.drain()
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_text(value) for value in row])
+        if count % FLUSH_ROWS == 0:
+            yield lines.drain()
+    yield lines.drain()
+
+
+class _Sink:
+    """Write-only, unseekable buffer that zipfile streams into."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+_ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_SHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _cell(value):
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    if value is None:
+        return '<c/>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_ILLEGAL_XML.sub("", _text(value)))}</t></is></c>'
+
+
+def _row(values):
+    return '<row>' + ''.join(_cell(value) for value in values) + '</row>'
+
+
+def stream_xlsx(headers, rows, sheet='Sheet1'):
+    """A one-sheet XLSX workbook as a generator of byte chunks."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in _XLSX_PARTS.items():
+            archive.writestr(name, _XML + xml)
+        archive.writestr('xl/workbook.xml', (
+            f'{_XML}<workbook xmlns="{_SHEET_NS}" xmlns:r="{_REL_NS}">'
+            f'<sheets><sheet name="{escape(sheet[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        yield sink.drain()
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as part:
+            part.write(f'{_XML}<worksheet xmlns="{_SHEET_NS}"><sheetData>{_row(headers)}'.encode())
+            buffered = []
+            for row in rows:
+                buffered.append(_row(row))
+                if len(buffered) >= FLUSH_ROWS:
+                    part.write(''.join(buffered).encode())
+                    buffered.clear()
+                    yield sink.drain()
+            part.write((''.join(buffered) + '</sheetData></worksheet>').encode())
+    yield sink.drain()
+
+
+def stream(fmt, title, headers, rows):
+    if fmt == 'xlsx':
+        return stream_xlsx(headers, rows, sheet=title)
+    return stream_csv(headers, rows)
+
+
+def response(export, fmt='csv', name=None):
+    """StreamingHttpResponse downloading ``export`` (a (title, headers, rows) triple) as csv or xlsx."""
+    fmt = fmt if fmt in FORMATS else 'csv'
+    title, headers, rows = export
+    filename = f'{slugify(name or title)}-{timezone.localdate().isoformat()}.{fmt}'
+    resp = StreamingHttpResponse(stream(fmt, title, headers, rows), content_type=FORMATS[fmt])
+    resp['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Keep reverse proxies from buffering the whole download first
+    resp['X-Accel-Buffering'] = 'no'
+    return resp
@@ -0,0 +1,85 @@
+"""
+Precomputed announcement feeds held in Django's cache.
+
+Every student in a class sees the same notices, so instead of an OR/DISTINCT
+query per page load there is one ordered list per class (school-wide notices
+merged with that class's own) and one school-wide list for teachers and
+students without a class. Feeds are rebuilt write-through when an
+Announcement or Class changes (see portal.signals), so reads are cache hits.
+A school-wide notice touches every class feed; those are dropped instead and
+each is rebuilt by its next reader, so publishing costs no query per class.
+"""
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Announcement, Class
+from .replicas import primary
+
+FEED_SIZE = 200
+# Feeds are rebuilt on every write; expiry is only a safety net
+FEED_TIMEOUT = 60 * 60 * 24
+SCHOOL_KEY = 'portal:feed:school'
+FEED_ORDERING = ('-date', '-created_at', '-pk')
+
+
+def feed_key(class_id=None):
+    return f'portal:feed:class:{class_id}' if class_id else SCHOOL_KEY
+
+
+def feed_filter(class_id=None):
+    """Q selecting the announcements a class (or, with no class, everyone) should see."""
+    if class_id:
+        return Q(scope=Announcement.SCOPE_SCHOOL) | Q(target_class_id=class_id)
+    return Q(scope=Announcement.SCOPE_SCHOOL)
+
+
+def feed_queryset(class_id=None):
+    """Announcements a class (or, with no class, everyone) should see, uncached."""
+    return Announcement.objects.filter(feed_filter(class_id)).select_related('target_class')
+
+
+def as_entry(a):
+    """Plain, cacheable form of an Announcement as used by the feed templates."""
+    return {
+        'pk': a.pk,
+        'title': a.title,
+        'content': a.content,
+        'date': a.date,
+        'created_at': a.created_at,
+        'scope': a.scope,
+        'scope_display': a.get_scope_display(),
+        'target_class_name': a.target_class.name if a.target_class else '',
+    }
+
+
+def build_feed(class_id=None):
+    """Query the newest FEED_SIZE announcements for a class (or school-wide only)."""
+    return [as_entry(a) for a in feed_queryset(class_id).order_by(*FEED_ORDERING)[:FEED_SIZE]]
+
+
+def get_feed(class_id=None):
+    """Feed entries (plain dicts, newest first); built and cached on a miss."""
+    key = feed_key(class_id)
+    feed = cache.get(key)
+    if feed is None:
+        with primary():
+            feed = build_feed(class_id)
+        cache.set(key, feed, FEED_TIMEOUT)
+    return feed
+
+
+def refresh(class_ids=(), school=False):
+    """
+    Rebuild the given class feeds. When a school-wide notice changed, rebuild
+    the school feed and drop every class feed for its next reader to rebuild.
+    """
+    if school:
+        cache.set(SCHOOL_KEY, build_feed(), FEED_TIMEOUT)
+        cache.delete_many([feed_key(pk) for pk in Class.objects.values_list('pk', flat=True)])
+        return
+    for class_id in {c for c in class_ids if c}:
+        cache.set(feed_key(class_id), build_feed(class_id), FEED_TIMEOUT)
+
+
+def forget(class_id):
+    cache.delete(feed_key(class_id))
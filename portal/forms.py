@@ -1,6 +1,9 @@
 from django import forms
 from django.contrib.auth import authenticate
-from .models import Announcement, Result, AdmissionApplication, ContactMessage
+from django.forms.utils import flatatt
+from django.urls import reverse
+from django.utils.html import format_html
+from .models import Announcement, Result, AdmissionApplication, ContactMessage, PickerKey
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -35,9 +38,37 @@ class AnnouncementForm(forms.ModelForm):
         }
 
 
+class TypeaheadInput(forms.Widget):
+    """
+    A text box that looks people up through portal:typeahead as the user types
+    and submits the chosen pk (behaviour in static/js/ui.js), in place of a
+    <select> listing every student or teacher.
+    """
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    def render(self, name, value, attrs=None, renderer=None):
+        from . import typeahead
+        attrs = self.build_attrs(self.attrs, attrs)
+        value = '' if value is None else str(value)
+        return format_html(
+            '<div class="typeahead" data-typeahead="{}">'
+            '<input type="hidden" name="{}" value="{}">'
+            '<input type="text"{} value="{}" autocomplete="off" role="combobox" aria-autocomplete="list">'
+            '<ul class="typeahead-menu" role="listbox" hidden></ul></div>',
+            reverse('portal:typeahead', args=[self.kind]), name, value,
+            flatatt(attrs), typeahead.label(self.kind, value) if value.isdecimal() else '',
+        )
+
+
 class ResultUploadForm(forms.Form):
     """Bulk or single result upload - simplified; actual implementation can use model forms."""
-    student = forms.ModelChoiceField(queryset=None, widget=forms.Select(attrs={'class': 'form-select'}))
+    student = forms.ModelChoiceField(
+        queryset=None,
+        widget=TypeaheadInput(PickerKey.KIND_STUDENT, attrs={'class': 'form-control', 'placeholder': 'Name or student ID'}),
+    )
     subject = forms.ModelChoiceField(queryset=None, widget=forms.Select(attrs={'class': 'form-select'}))
     score = forms.DecimalField(max_digits=5, decimal_places=2, widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}))
 
@@ -48,6 +79,117 @@ class ResultUploadForm(forms.Form):
         self.fields['subject'].queryset = Subject.objects.all()
 
 
+class ResultImportForm(forms.Form):
+    """Bulk result upload from a CSV/XLSX file or a grid pasted from a spreadsheet."""
+    class_ref = forms.ModelChoiceField(queryset=None, label='Class', widget=forms.Select(attrs={'class': 'form-select'}))
+    term = forms.ModelChoiceField(queryset=None, widget=forms.Select(attrs={'class': 'form-select'}))
+    subject = forms.ModelChoiceField(
+        queryset=None, required=False,
+        help_text='Used when the sheet has no subject column.',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    file = forms.FileField(required=False, widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx,.tsv,.txt'}))
+    pasted = forms.CharField(
+        required=False, label='Or paste from a spreadsheet',
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 6, 'placeholder': 'student_id\tscore'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        from .models import Class, Subject, Term
+        super().__init__(*args, **kwargs)
+        self.fields['class_ref'].queryset = Class.objects.all()
+        self.fields['term'].queryset = Term.objects.select_related('session').order_by('-session__start_date', '-start_date')
+        self.fields['subject'].queryset = Subject.objects.all()
+
+    def clean(self):
+        data = super().clean()
+        if not data.get('file') and not (data.get('pasted') or '').strip():
+            raise forms.ValidationError('Upload a file or paste the results grid.')
+        return data
+
+
+class StudentOnboardingForm(forms.Form):
+    """Create students from approved applications or from a roster file."""
+    SOURCE_APPLICATIONS = 'applications'
+    SOURCE_ROSTER = 'roster'
+    source = forms.ChoiceField(choices=[(SOURCE_APPLICATIONS, 'Approved applications'), (SOURCE_ROSTER, 'Roster file')])
+    class_ref = forms.ModelChoiceField(
+        queryset=None, required=False, label='Default class',
+        help_text='Used for applications or rows that name no class.',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    file = forms.FileField(required=False, widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx,.tsv,.txt'}))
+
+    def __init__(self, *args, **kwargs):
+        from .models import Class
+        super().__init__(*args, **kwargs)
+        self.fields['class_ref'].queryset = Class.objects.all()
+
+    def clean(self):
+        data = super().clean()
+        if data.get('source') == self.SOURCE_ROSTER and not data.get('file'):
+            raise forms.ValidationError('Choose a roster file to upload.')
+        return data
+
+
+class AttendanceRegisterForm(forms.Form):
+    """Class and date of an attendance register."""
+    class_ref = forms.ModelChoiceField(queryset=None, label='Class', widget=forms.Select(attrs={'class': 'form-select'}))
+    date = forms.DateField(widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        from .models import Class
+        super().__init__(*args, **kwargs)
+        self.fields['class_ref'].queryset = Class.objects.all()
+
+    def clean_date(self):
+        from django.utils import timezone
+        value = self.cleaned_data['date']
+        if value > timezone.localdate():
+            raise forms.ValidationError('Attendance cannot be marked for a future date.')
+        return value
+
+
+class ResultFilterForm(forms.Form):
+    """Filters for the results approval queue; every field is optional."""
+    term = forms.ModelChoiceField(queryset=None, required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    class_ref = forms.ModelChoiceField(queryset=None, required=False, label='Class', widget=forms.Select(attrs={'class': 'form-select'}))
+    subject = forms.ModelChoiceField(queryset=None, required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    # Picks a Teacher (the picker's ids); cleaned to the teacher's user, which results record
+    uploaded_by = forms.ModelChoiceField(
+        queryset=None, required=False, label='Uploaded by',
+        widget=TypeaheadInput(PickerKey.KIND_TEACHER, attrs={'class': 'form-control', 'placeholder': 'Teacher name or ID'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        from .models import Class, Subject, Teacher, Term
+        super().__init__(*args, **kwargs)
+        self.fields['term'].queryset = Term.objects.select_related('session').order_by('-session__start_date', '-start_date')
+        self.fields['class_ref'].queryset = Class.objects.all()
+        self.fields['subject'].queryset = Subject.objects.all()
+        self.fields['uploaded_by'].queryset = Teacher.objects.select_related('user')
+
+    def clean_uploaded_by(self):
+        teacher = self.cleaned_data['uploaded_by']
+        return teacher.user if teacher is not None else None
+
+    def filters(self):
+        """
+        Cleaned filter values as keyword arguments for approvals.pending_results().
+        An unbound form filters nothing; a bound one must be valid, since
+        dropping a stale filter would widen the set to the whole school.
+        """
+        if not self.is_bound:
+            return {}
+        if not self.is_valid():
+            raise ValueError('Invalid result filters; check is_valid() first.')
+        return {name: value for name, value in self.cleaned_data.items() if value is not None}
+
+    def error_summary(self):
+        return '; '.join(f'{self[name].label}: {" ".join(errors)}'
+                         for name, errors in self.errors.items())
+
+
 class ContactForm(forms.ModelForm):
     class Meta:
         model = ContactMessage
@@ -0,0 +1,121 @@
+"""
+Responsive derivatives for uploaded images (news pictures, avatars).
+
+Each original is decoded once and written at a set of widths as AVIF (when
+Pillow has AVIF support), WebP and JPEG under ``derived/<sha256>/`` in the
+default storage. Paths are content-addressed, so identical uploads share
+files and regeneration skips work already done. The list of derivatives is
+stored on the model (``image_variants`` / ``avatar_variants``) so templates
+build ``srcset`` without touching the disk (see templatetags/images.py).
+
+Generation runs after the upload commits, on a background thread; the
+``regenerate_images`` command covers existing media.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from .models import NewsArticle, User
+
+logger = logging.getLogger(__name__)
+
+NEWS_WIDTHS = (320, 640, 1024, 1600)
+AVATAR_WIDTHS = (64, 128)
+# model: (image field, variants field, widths)
+FIELDS = {
+    NewsArticle: ('image', 'image_variants', NEWS_WIDTHS),
+    User: ('avatar', 'avatar_variants', AVATAR_WIDTHS),
+}
+# (format, extension, Pillow save options), best first; JPEG is the fallback every browser reads
+FORMATS = [
+    (fmt, ext, options) for fmt, ext, options in (
+        ('AVIF', 'avif', {'quality': 50}),
+        ('WEBP', 'webp', {'quality': 75, 'method': 4}),
+        ('JPEG', 'jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    ) if fmt == 'JPEG' or features.check(fmt.lower())
+]
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='images')
+
+
+def _encode(image, fmt, options):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buf = BytesIO()
+    image.save(buf, format=fmt, **options)
+    return buf.getvalue()
+
+
+def derive(field_file, widths):
+    """Write the derivatives of one stored image; returns the variants manifest."""
+    with field_file.open('rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        sizes = sorted({w for w in widths if w < image.width} | {min(image.width, max(widths))})
+        sources = {ext: [] for _, ext, _ in FORMATS}
+        for width in sizes:
+            resized = None
+            for fmt, ext, options in FORMATS:
+                name = f'derived/{digest[:2]}/{digest}/{width}.{ext}'
+                if not default_storage.exists(name):
+                    if resized is None:
+                        height = max(1, round(image.height * width / image.width))
+                        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                    default_storage.save(name, ContentFile(_encode(resized, fmt, options)))
+                sources[ext].append([width, name])
+        return {
+            'name': field_file.name, 'hash': digest,
+            'width': image.width, 'height': image.height, 'sources': sources,
+        }
+
+
+def process(instance):
+    """(Re)build the derivatives of ``instance``'s image and store the manifest on it."""
+    image_field, variants_field, widths = FIELDS[type(instance)]
+    field_file = getattr(instance, image_field)
+    variants = {}
+    if field_file:
+        try:
+            variants = derive(field_file, widths)
+        except (OSError, Image.DecompressionBombError) as exc:
+            # Keep the name so the original is served and the upload is not retried on every save
+            logger.warning('Could not derive images for %s: %s', field_file.name, exc)
+            variants = {'name': field_file.name}
+    setattr(instance, variants_field, variants)
+    instance.save(update_fields=[variants_field])
+    return variants
+
+
+def is_stale(instance):
+    image_field, variants_field, _ = FIELDS[type(instance)]
+    return (getattr(instance, image_field).name or '') != getattr(instance, variants_field).get('name', '')
+
+
+def _process_later(model, pk, name):
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        # Skip if the image was replaced again meanwhile; that save scheduled its own run
+        if instance is not None and (getattr(instance, FIELDS[model][0]).name or '') == name:
+            process(instance)
+    except Exception:
+        logger.exception('Image derivatives failed for %s %s', model.__name__, pk)
+    finally:
+        connection.close()
+
+
+def schedule(instance):
+    """Build derivatives on the background thread once the current transaction commits."""
+    model, pk = type(instance), instance.pk
+    name = getattr(instance, FIELDS[model][0]).name or ''
+    transaction.on_commit(lambda: _executor.submit(_process_later, model, pk, name))
@@ -0,0 +1,328 @@
+"""
+Bulk result import: streams CSV / XLSX / pasted grids into Result rows.
+
+Lookups for students, subjects and terms are loaded once up front, rows are
+validated in memory and written with batched upserts on the
+(student, subject, term) unique key, so the number of queries depends only on
+the batch size, not on how many rows the sheet has.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import api, counters
+from .models import Student, Subject, Term, Result
+from .upserts import upsert
+
+try:
+    import openpyxl
+except ImportError:  # XLSX uploads are optional
+    openpyxl = None
+
+
+MAX_SCORE = Decimal('100')
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+
+STUDENT_HEADERS = ('student_id', 'student', 'admission_no', 'reg_no', 'username')
+SUBJECT_HEADERS = ('subject', 'subject_code', 'code')
+SCORE_HEADERS = ('score', 'mark', 'marks', 'total')
+TOTAL_HEADERS = ('total',)  # a score in the long layout, derived from the subject columns in the wide one
+TERM_HEADERS = ('term', 'term_id')
+
+
+class ImportFormatError(Exception):
+    """The file itself cannot be read (bad format, missing columns)."""
+
+
+def _norm(value):
+    return str(value).strip().lower().replace(' ', '_') if value is not None else ''
+
+
+def _key(value):
+    return str(value).strip().lower() if value is not None else ''
+
+
+# --- Row sources -----------------------------------------------------------
+
+def iter_csv(fileobj, delimiter=None):
+    """Yield rows (lists of cells) from a binary or text CSV file, one at a time."""
+    if isinstance(fileobj, (str, bytes)):
+        raise TypeError('iter_csv expects a file object')
+    stream = fileobj
+    if not isinstance(fileobj, io.TextIOBase):
+        stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    # Decoding happens lazily as rows are read, so errors surface mid-iteration
+    try:
+        if delimiter is None:
+            head = stream.readline()
+            delimiter = '\t' if '\t' in head else (';' if head.count(';') > head.count(',') else ',')
+            yield next(csv.reader([head], delimiter=delimiter), [])
+        yield from csv.reader(stream, delimiter=delimiter)
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(
+            'The file is not UTF-8 encoded. In Excel use "Save As" > "CSV UTF-8", or upload the .xlsx file.'
+        ) from exc
+
+
+def iter_xlsx(fileobj):
+    """Yield rows from the first worksheet using openpyxl's read-only (streaming) mode."""
+    if openpyxl is None:
+        raise ImportFormatError('XLSX support requires openpyxl. Upload a CSV file instead.')
+    try:
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ImportFormatError(f'Could not read spreadsheet: {exc}') from exc
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ['' if cell is None else cell for cell in row]
+    finally:
+        workbook.close()
+
+
+def iter_pasted(text):
+    """Yield rows from a grid pasted from a spreadsheet (tab separated) or typed as CSV."""
+    return iter_csv(io.StringIO(text.strip()))
+
+
+def iter_upload(uploaded_file):
+    name = (getattr(uploaded_file, 'name', '') or '').lower()
+    if name.endswith(('.xlsx', '.xlsm')):
+        return iter_xlsx(uploaded_file)
+    if name.endswith(('.csv', '.txt', '.tsv')) or not name:
+        return iter_csv(uploaded_file)
+    raise ImportFormatError('Unsupported file type. Upload a .csv or .xlsx file.')
+
+
+# --- Importer --------------------------------------------------------------
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.created_or_updated = 0
+        self.unchanged_approved = 0  # rows matching an approved result's score, left alone
+        self.error_count = 0
+        self.errors = []  # [(row_number, message)], capped at MAX_REPORTED_ERRORS
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+    @property
+    def ok(self):
+        return self.error_count == 0
+
+
+class ResultImporter:
+    """
+    Validate rows against pre-loaded lookup maps and upsert them as pending results.
+
+    Two layouts are accepted:
+      * long  - one score per row: student_id, subject, score [, term]
+      * wide  - one row per student: student_id, <subject>, <subject>, ...
+    The subject column may be omitted in the long layout when ``subject`` is given.
+
+    Approved results are never re-opened: a row repeating an approved score is
+    counted as unchanged, one with a different score is reported as an error.
+    """
+
+    def __init__(self, term, uploaded_by, subject=None, class_ref=None, batch_size=BATCH_SIZE):
+        self.term = term
+        self.uploaded_by = uploaded_by
+        self.subject = subject
+        self.class_ref = class_ref
+        self.batch_size = batch_size
+        self.report = ImportReport()
+        self.newly_pending = 0
+        self._load_lookups()
+
+    def _load_lookups(self):
+        students = Student.objects.all()
+        if self.class_ref is not None:
+            students = students.filter(current_class=self.class_ref)
+        self.students = {}
+        for pk, student_id, username in students.values_list('pk', 'student_id', 'user__username'):
+            if student_id:
+                self.students[_key(student_id)] = pk
+            self.students.setdefault(_key(username), pk)
+
+        self.subjects = {}
+        for pk, name, code in Subject.objects.values_list('pk', 'name', 'code'):
+            self.subjects[_key(name)] = pk
+            if code:
+                self.subjects[_key(code)] = pk
+            self.subjects[str(pk)] = pk
+
+        self.terms = {}
+        for pk, name, session_name in Term.objects.values_list('pk', 'name', 'session__name'):
+            self.terms[str(pk)] = pk
+            self.terms[_key(f'{session_name} - {name}')] = pk
+
+    def _parse_header(self, header):
+        columns = [_norm(h) for h in header]
+
+        def find(candidates):
+            for i, col in enumerate(columns):
+                if col in candidates:
+                    return i
+            return None
+
+        self.student_col = find(STUDENT_HEADERS)
+        self.subject_col = find(SUBJECT_HEADERS)
+        self.score_col = find(SCORE_HEADERS)
+        self.term_col = find(TERM_HEADERS)
+        if self.student_col is None:
+            raise ImportFormatError('Missing a student column (e.g. "student_id").')
+
+        # Any other column whose header names a subject is a wide-layout score column
+        self.subject_score_cols = []
+        used = {self.student_col, self.subject_col, self.score_col, self.term_col}
+        for i, raw in enumerate(header):
+            if i not in used and _key(raw) in self.subjects:
+                self.subject_score_cols.append((i, self.subjects[_key(raw)], str(raw).strip()))
+
+        # A wide sheet's "Total" column sums the subject columns; it is not a score
+        if (self.subject_score_cols and self.subject_col is None and self.score_col is not None
+                and columns[self.score_col] in TOTAL_HEADERS):
+            self.score_col = None
+
+        if self.score_col is None and not self.subject_score_cols:
+            raise ImportFormatError('Missing a "score" column or subject columns.')
+        if self.score_col is not None and self.subject_col is None and self.subject is None:
+            raise ImportFormatError('Missing a "subject" column. Choose a subject or add the column.')
+
+    @staticmethod
+    def _cell(row, index):
+        if index is None or index >= len(row):
+            return ''
+        value = row[index]
+        return value.strip() if isinstance(value, str) else value
+
+    def _parse_score(self, raw):
+        if isinstance(raw, float):
+            raw = repr(raw)
+        try:
+            score = Decimal(str(raw)).quantize(Decimal('0.01'))
+            if not score.is_finite():  # NaN survives quantize() and cannot be compared
+                raise ValueError(raw)
+        except (InvalidOperation, ValueError):
+            raise ValueError(f'Score "{raw}" is not a number.')
+        if score < 0 or score > MAX_SCORE:
+            raise ValueError(f'Score {score} is outside 0-{MAX_SCORE}.')
+        return score
+
+    def _entries_for_row(self, row_number, row):
+        """Yield (student_pk, subject_pk, term_pk, score) for one row, recording errors."""
+        student_raw = self._cell(row, self.student_col)
+        student_pk = self.students.get(_key(student_raw))
+        if student_pk is None:
+            where = f' in {self.class_ref}' if self.class_ref is not None else ''
+            self.report.add_error(row_number, f'Unknown student "{student_raw}"{where}.')
+            return
+
+        term_pk = self.term.pk
+        if self.term_col is not None and self._cell(row, self.term_col) != '':
+            term_raw = self._cell(row, self.term_col)
+            term_pk = self.terms.get(_key(term_raw))
+            if term_pk is None:
+                self.report.add_error(row_number, f'Unknown term "{term_raw}".')
+                return
+
+        if self.score_col is not None:
+            if self.subject_col is not None:
+                subject_raw = self._cell(row, self.subject_col)
+                subject_pk = self.subjects.get(_key(subject_raw))
+                if subject_pk is None:
+                    self.report.add_error(row_number, f'Unknown subject "{subject_raw}".')
+                    return
+            else:
+                subject_pk = self.subject.pk
+            try:
+                yield student_pk, subject_pk, term_pk, self._parse_score(self._cell(row, self.score_col))
+            except ValueError as exc:
+                self.report.add_error(row_number, str(exc))
+            return
+
+        for index, subject_pk, label in self.subject_score_cols:
+            raw = self._cell(row, index)
+            if raw == '':
+                continue
+            try:
+                yield student_pk, subject_pk, term_pk, self._parse_score(raw)
+            except ValueError as exc:
+                self.report.add_error(row_number, f'{label}: {exc}')
+
+    def _existing(self, keys):
+        """{(student, subject, term): (status, score)} of the results already stored for ``keys``, locked."""
+        students, subjects, terms = (set(part) for part in zip(*keys))
+        rows = Result.objects.select_for_update().filter(
+            student_id__in=students, subject_id__in=subjects, term_id__in=terms,
+        ).values_list('student_id', 'subject_id', 'term_id', 'status', 'score')
+        return {(student, subject, term): (status, score) for student, subject, term, status, score in rows}
+
+    def _flush(self, batch, seen):
+        if not batch:
+            return
+        existing = self._existing(batch)
+        for key, (status, score) in existing.items():
+            if key not in batch or status != Result.STATUS_APPROVED:
+                continue
+            new_score = batch.pop(key).score
+            if new_score == score:
+                self.report.unchanged_approved += 1
+            else:
+                self.report.add_error(
+                    seen[key], f'Score {score} is already approved; {new_score} was not saved. '
+                    'Ask an admin to reject the result before re-uploading it.',
+                )
+        if not batch:
+            return
+        upsert(
+            batch.values(), unique_fields=['student', 'subject', 'term'],
+            update_fields=['score', 'uploaded_by', 'status', 'created_at', 'approved_at'], batch_size=self.batch_size,
+        )
+        self.report.created_or_updated += len(batch)
+        # New rows and re-opened rejected ones join the pending set; pending rows stay in it
+        self.newly_pending += sum(1 for key in batch if key not in existing or existing[key][0] != Result.STATUS_PENDING)
+        batch.clear()
+        api.touch('results')
+
+    def run(self, rows):
+        """Consume an iterable of rows (header first) and return an ImportReport."""
+        rows = iter(rows)
+        header = next(rows, None)
+        if not header:
+            raise ImportFormatError('The file is empty.')
+        self._parse_header(header)
+
+        now = timezone.now()
+        seen = {}
+        batch = {}
+        with transaction.atomic():
+            for row_number, row in enumerate(rows, start=2):
+                if not any(str(c).strip() for c in row):
+                    continue
+                self.report.rows_read += 1
+                for student_pk, subject_pk, term_pk, score in self._entries_for_row(row_number, row):
+                    key = (student_pk, subject_pk, term_pk)
+                    if key in seen:
+                        self.report.add_error(row_number, f'Duplicate of row {seen[key]}; row skipped.')
+                        continue
+                    seen[key] = row_number
+                    batch[key] = Result(
+                        student_id=student_pk, subject_id=subject_pk, term_id=term_pk,
+                        score=score, uploaded_by=self.uploaded_by,
+                        status=Result.STATUS_PENDING, created_at=now, approved_at=None,
+                    )
+                    if len(batch) >= self.batch_size:
+                        self._flush(batch, seen)
+            self._flush(batch, seen)
+            # Upserts skip signals. Bump rather than recount: an absolute value written
+            # here could overwrite a concurrent bump. Approved rows are left alone, so
+            # term reports are unaffected.
+            counters.bump(counters.PENDING_RESULTS, self.newly_pending)
+        return self.report
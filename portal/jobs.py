@@ -0,0 +1,262 @@
+"""
+A small job queue kept in the database, so there is no broker to run.
+
+Functions decorated with ``@task`` gain ``.enqueue(*args, **kwargs)``, which
+inserts a Job row with JSON arguments in the caller's transaction. A job
+queued by a request that rolls back never runs; one queued by a request that
+commits is never lost. ``manage.py runworker`` claims ready jobs in priority
+order and runs them on a few threads.
+
+A claim marks the job running until ``now + timeout`` (the visibility
+timeout). If a worker dies, its jobs are claimed again once that passes, so
+tasks must be safe to run twice. On PostgreSQL, workers claim with
+SELECT ... FOR UPDATE SKIP LOCKED and never wait on each other. Elsewhere
+(SQLite) each candidate is claimed with a conditional UPDATE, and a worker
+that loses the race moves on to the next one. Failures are retried with
+exponential backoff up to ``max_attempts``.
+
+``.enqueue_unique(key, run_at, ...)`` queues a job only if no queued job has
+the same key (a partial unique index enforces it), for tasks such as the
+notification digest run that should wait in the queue at most once. A keyed
+job that fails while another with its key is queued is not retried.
+"""
+import importlib
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+RETRY_DELAY = 30  # seconds before the first retry; doubles with each attempt
+KEEP_FINISHED = timedelta(days=7)
+PURGE_INTERVAL = 60 * 60
+
+
+class UnknownTask(Exception):
+    """A job names a function that is not a registered task."""
+
+
+class Task:
+    """A function that can also be queued; see ``task``."""
+
+    def __init__(self, func, queue, priority, max_attempts, timeout):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        update_wrapper(self, func)
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        """Queue a call (arguments must be JSON-serialisable); returns the Job."""
+        return self.enqueue_at(timezone.now(), *args, **kwargs)
+
+    def enqueue_at(self, run_at, *args, **kwargs):
+        return Job.objects.create(**self._fields(run_at, args, kwargs))
+
+    def enqueue_unique(self, key, run_at, *args, **kwargs):
+        """Queue a call unless a job with ``key`` is already queued (INSERT ... ON CONFLICT DO NOTHING)."""
+        Job.objects.bulk_create([Job(key=key, **self._fields(run_at, args, kwargs))], ignore_conflicts=True)
+
+    def _fields(self, run_at, args, kwargs):
+        return {
+            'task': self.name, 'args': list(args), 'kwargs': kwargs, 'queue': self.queue, 'priority': self.priority,
+            'max_attempts': self.max_attempts, 'timeout': self.timeout, 'run_at': run_at,
+        }
+
+
+def task(func=None, *, queue='default', priority=100, max_attempts=3, timeout=300):
+    """Register ``func`` as a task: ``@task`` or ``@task(priority=10, ...)``."""
+    def decorator(func):
+        registered = Task(func, queue, priority, max_attempts, timeout)
+        REGISTRY[registered.name] = registered
+        return registered
+    return decorator(func) if func is not None else decorator
+
+
+def resolve(name):
+    """The registered task called ``name``, importing its module if needed."""
+    if name not in REGISTRY:
+        module = name.rpartition('.')[0]
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    if name not in REGISTRY:
+        raise UnknownTask(f'No task named "{name}".')
+    return REGISTRY[name]
+
+
+def _ready(now):
+    # Queued and due, or claimed by a worker whose claim has run out
+    return Q(status=Job.STATUS_QUEUED, run_at__lte=now) | Q(status=Job.STATUS_RUNNING, locked_until__lt=now)
+
+
+def claim(worker_id, queues=None, limit=1):
+    """Claim up to ``limit`` ready jobs for ``worker_id``; returns them marked running."""
+    now = timezone.now()
+    ready = Job.objects.filter(_ready(now))
+    if queues:
+        ready = ready.filter(queue__in=queues)
+    ready = ready.order_by('priority', 'run_at', 'pk')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            jobs = list(ready.select_for_update(skip_locked=True)[:limit])
+            for job in jobs:
+                job.status, job.locked_by = Job.STATUS_RUNNING, worker_id
+                job.locked_until = now + timedelta(seconds=job.timeout)
+                job.attempts += 1
+            Job.objects.bulk_update(jobs, ['status', 'locked_by', 'locked_until', 'attempts'])
+        return jobs
+
+    claimed = []
+    for job in ready[:limit * 4]:
+        locked_until = now + timedelta(seconds=job.timeout)
+        won = Job.objects.filter(_ready(now), pk=job.pk, attempts=job.attempts).update(
+            status=Job.STATUS_RUNNING, locked_by=worker_id, locked_until=locked_until, attempts=F('attempts') + 1,
+        )
+        if won:
+            job.status, job.locked_by, job.locked_until = Job.STATUS_RUNNING, worker_id, locked_until
+            job.attempts += 1
+            claimed.append(job)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def _finish(job, **changes):
+    # Only while the claim is still ours: a job that outlived its timeout may
+    # already be running elsewhere, and that run reports instead
+    return Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by).update(**changes)
+
+
+def run(job):
+    """Run a claimed job and record the outcome; returns True if it succeeded."""
+    now = timezone.now()
+    if job.attempts > job.max_attempts:
+        # Reclaimed after its last attempt's worker stopped responding
+        _finish(job, status=Job.STATUS_FAILED, finished_at=now, locked_until=None,
+                last_error=job.last_error or 'Timed out or the worker stopped.')
+        return False
+    try:
+        resolve(job.task).func(*job.args, **job.kwargs)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts and not isinstance(exc, UnknownTask):
+            delay = timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+            try:
+                with transaction.atomic():
+                    _finish(job, status=Job.STATUS_QUEUED, run_at=timezone.now() + delay, locked_until=None,
+                            last_error=error)
+            except IntegrityError:
+                # A job with the same key was queued meanwhile; that one does the work
+                _finish(job, status=Job.STATUS_FAILED, finished_at=timezone.now(), locked_until=None,
+                        last_error=f'{error}\nNot retried: a job with key "{job.key}" is already queued.')
+        else:
+            _finish(job, status=Job.STATUS_FAILED, finished_at=timezone.now(), locked_until=None, last_error=error)
+        return False
+    _finish(job, status=Job.STATUS_DONE, finished_at=timezone.now(), locked_until=None)
+    return True
+
+
+def purge(older_than=KEEP_FINISHED):
+    """Delete jobs that finished more than ``older_than`` ago; returns the count."""
+    cutoff = timezone.now() - older_than
+    return Job.objects.filter(status__in=[Job.STATUS_DONE, Job.STATUS_FAILED], finished_at__lt=cutoff).delete()[0]
+
+
+def retry(queryset):
+    """Send failed (or any) jobs back to the queue for a fresh set of attempts."""
+    queryset = queryset.exclude(status=Job.STATUS_RUNNING)
+    changes = {'status': Job.STATUS_QUEUED, 'attempts': 0, 'run_at': timezone.now(), 'locked_until': None, 'finished_at': None}
+    count = queryset.filter(key='').update(**changes)
+    for pk in queryset.exclude(key='').values_list('pk', flat=True):
+        try:
+            with transaction.atomic():
+                count += Job.objects.filter(pk=pk).update(**changes)
+        except IntegrityError:
+            pass  # a job with the same key is already queued
+    return count
+
+
+class Worker:
+    """
+    Runs jobs on ``concurrency`` threads until stopped. Each thread claims one
+    job at a time and sleeps ``poll_interval`` seconds when nothing is ready.
+    With ``burst`` the threads exit once the queue is empty.
+    """
+
+    def __init__(self, queues=None, concurrency=1, poll_interval=1.0, burst=False):
+        self.queues = queues
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.succeeded = self.failed = 0
+        self.last_purge = -PURGE_INTERVAL
+
+    def stop(self):
+        self.stopping.set()
+
+    def _loop(self, index):
+        worker_id = f'{self.name}:{index}'
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                jobs = claim(worker_id, self.queues)
+                if not jobs:
+                    if self.burst:
+                        return
+                    self._maybe_purge()
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                for job in jobs:
+                    ok = run(job)
+                    with self.lock:
+                        if ok:
+                            self.succeeded += 1
+                        else:
+                            self.failed += 1
+        finally:
+            connection.close()
+
+    def _maybe_purge(self):
+        with self.lock:
+            if time.monotonic() - self.last_purge < PURGE_INTERVAL:
+                return
+            self.last_purge = time.monotonic()
+        purged = purge()
+        if purged:
+            logger.info('Purged %s finished jobs', purged)
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._loop, args=(i,), name=f'jobs-{i}', daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # join() with a timeout so the main thread still receives signals
+            while thread.is_alive():
+                thread.join(0.5)
@@ -0,0 +1,147 @@
+"""
+Measure the JSON API: requests per second for each endpoint when the
+response cache is cold, when it is warm, and when the client revalidates
+with If-None-Match (a 304).
+
+    python manage.py bench_api
+    python manage.py bench_api --students 400 --requests 300
+
+Seeds one class of --students students with a year of approved results,
+attendance and announcements (rolled back afterwards). Then it signs in as
+one of them and drives each endpoint through the test client, with every
+middleware included. "cold" retires the resource's cached responses before
+each request. The student's HTML pages are timed the same way for reference.
+"""
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from portal import api
+from portal.models import (
+    AcademicSession, Announcement, Attendance, Class, NewsArticle, Result, Student, Subject, Term, User,
+)
+
+from .explain_queries import _Rollback
+
+SUBJECTS = 12
+SCHOOL_DAYS = 180
+
+# label: (path, resources the request reads)
+ENDPOINTS = {
+    'results': ('/api/v1/results/', ['results']),
+    'results (3 fields)': ('/api/v1/results/?fields=subject_name,score,position', ['results']),
+    'terms': ('/api/v1/terms/', ['terms']),
+    'announcements': ('/api/v1/announcements/', ['announcements']),
+    'attendance': ('/api/v1/attendance/?limit=200', ['attendance']),
+    'news': ('/api/v1/news/', ['news']),
+    'batch (3 reads)': (
+        '/api/v1/batch/?get=results&get=announcements%3Flimit%3D10&get=attendance%3Flimit%3D30',
+        ['results', 'announcements', 'attendance'],
+    ),
+}
+PAGES = {
+    'my_results (HTML)': '/portal/student/results/',
+    'announcements (HTML)': '/portal/student/announcements/',
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the JSON API per endpoint: cold, warm and 304 requests per second.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--announcements', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode (default 200).')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, n_students, n_announcements):
+        rng = random.Random(21)
+        today = date.today()
+        first = today - timedelta(days=300)
+        session = AcademicSession.objects.create(name=f'Bench API {first.year}', start_date=first,
+                                                 end_date=today + timedelta(days=30))
+        terms = [
+            Term.objects.create(session=session, name=f'Term {i + 1}', start_date=first + timedelta(days=110 * i),
+                                end_date=first + timedelta(days=110 * i + 90))
+            for i in range(3)
+        ]
+        school_class = Class.objects.create(name='Bench API')
+        subjects = Subject.objects.bulk_create([Subject(name=f'Bench Subject {i}', code=f'BA{i}') for i in range(SUBJECTS)])
+        users = User.objects.bulk_create([
+            User(username=f'bench-api-{i}', first_name='Bench', last_name=f'Student {i}', role=User.ROLE_STUDENT, password='!')
+            for i in range(n_students)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=u, student_id=f'BA{i:05d}', current_class=school_class) for i, u in enumerate(users)
+        ])
+        Result.objects.bulk_create([
+            Result(student=s, subject=subject, term=term, status=Result.STATUS_APPROVED,
+                   score=Decimal(rng.randint(2000, 10000)) / 100, subject_position=rng.randint(1, n_students))
+            for s in students for subject in subjects for term in terms
+        ], batch_size=2000)
+        Attendance.objects.bulk_create([
+            Attendance(student=s, date=first + timedelta(days=d), present=rng.random() > 0.05)
+            for s in students for d in range(SCHOOL_DAYS)
+        ], batch_size=2000)
+        others = Class.objects.bulk_create([Class(name=f'Bench API other {i}') for i in range(10)])
+        Announcement.objects.bulk_create([
+            Announcement(title=f'Bench notice {i}', content='Bench announcement body. ' * 10,
+                         date=today - timedelta(days=i % 300), scope=Announcement.SCOPE_CLASS,
+                         target_class=rng.choice(others + [school_class]))
+            if i % 2 else
+            Announcement(title=f'Bench notice {i}', content='Bench announcement body. ' * 10,
+                         date=today - timedelta(days=i % 300))
+            for i in range(n_announcements)
+        ], batch_size=1000)
+        NewsArticle.objects.bulk_create([
+            NewsArticle(title=f'Bench news {i}', slug=f'bench-api-news-{i}', excerpt='Bench excerpt.',
+                        content='<p>Bench news body.</p>' * 20, published_date=today - timedelta(days=i))
+            for i in range(100)
+        ])
+        return users[0]
+
+    def _time(self, client, path, requests, before=None, **headers):
+        timings, size, status = [], 0, None
+        for _ in range(requests):
+            if before:
+                before()
+            started = time.perf_counter()
+            response = client.get(path, **headers)
+            timings.append(time.perf_counter() - started)
+            size, status = len(response.content), response.status_code
+        return len(timings) / sum(timings), statistics.median(timings) * 1000, size, status
+
+    def _row(self, label, mode, measured):
+        rate, median, size, status = measured
+        self.stdout.write(f'{label:22} {mode:6} {status:>6} {rate:>8.0f} {median:>9.2f} {size / 1024:>8.1f}')
+
+    def _run(self, options):
+        started = time.perf_counter()
+        user = self._seed(options['students'], options['announcements'])
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s.')
+        client = Client()
+        client.force_login(user)
+        n = options['requests']
+
+        self.stdout.write(f"{'endpoint':22} {'mode':6} {'status':>6} {'req/s':>8} {'p50 ms':>9} {'KiB':>8}")
+        for label, (path, resources) in ENDPOINTS.items():
+            # Moving the version is what a committed write does
+            self._row(label, 'cold', self._time(client, path, n, before=lambda: api.bump(*resources)))
+            self._row(label, 'warm', self._time(client, path, n))
+            etag = client.get(path)['ETag']
+            self._row(label, '304', self._time(client, path, n, HTTP_IF_NONE_MATCH=etag))
+        for label, path in PAGES.items():
+            self._row(label, 'html', self._time(client, path, n))
@@ -0,0 +1,220 @@
+"""
+Compare the dashboards under WSGI (sync views, one request per worker) and
+ASGI (async views, one event loop) at a given peak concurrency: latency, and
+how many sync workers it takes to match one ASGI worker.
+
+    python manage.py bench_asgi
+    python manage.py bench_asgi --concurrency 64 --requests 1000 --db-latency-ms 3
+
+--concurrency clients each request the admin, teacher and student dashboards
+in turn until --requests requests have been made, all in this process:
+
+* WSGI with W workers: each client is a thread with a test Client, and a
+  semaphore lets W of them be served at once (W sync gunicorn workers).
+  W runs through 1, 2, 4, ... up to the concurrency.
+* ASGI: each client is a coroutine on a single event loop (one uvicorn
+  worker), calling Django's ASGIHandler the way uvicorn does, and the async
+  dashboard views are served. (AsyncClient would run every request's sync
+  parts on one shared thread, which no real server does.)
+
+Latency includes the wait for a free worker. Local databases answer in
+microseconds, so --db-latency-ms adds a sleep to every query to stand in for
+the round trip to a database server. Uses the existing data: needs an admin,
+a teacher and a student.
+"""
+import asyncio
+import importlib
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, reverse
+
+from portal.models import User
+
+PAGES = {
+    User.ROLE_ADMIN: 'portal:admin_dashboard',
+    User.ROLE_TEACHER: 'portal:teacher_dashboard',
+    User.ROLE_STUDENT: 'portal:student_dashboard',
+}
+
+
+class _Latency:
+    """execute_wrapper sleeping before every query, like a network round trip."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+
+def _serve_async_views(enabled):
+    # The URLconf picks sync or async dashboards when it is imported
+    settings.ASYNC_VIEWS = enabled
+    import config.urls
+    import portal.urls
+    importlib.reload(portal.urls)
+    importlib.reload(config.urls)
+    clear_url_caches()
+
+
+async def _asgi_get(handler, path, cookie):
+    """GET ``path`` through ``handler`` like an ASGI server; returns the status code."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': 'GET', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+    }
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; Django cancels this wait once it has responded
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await handler(scope, receive, send)
+    return status
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return (len(latencies) / elapsed, statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.95)] * 1000)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the dashboards under WSGI (sync workers) vs ASGI (async views) at peak concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous clients (default 32).')
+        parser.add_argument('--requests', type=int, default=600, help='Requests per run (default 600).')
+        parser.add_argument('--db-latency-ms', type=float, default=2.0,
+                            help='Added to every query (default 2; 0 for the raw local database).')
+
+    def handle(self, *args, **options):
+        users = {role: User.objects.filter(role=role, is_active=True).order_by('pk').first() for role in PAGES}
+        missing = [role for role, user in users.items() if user is None]
+        if missing:
+            raise CommandError(f"Need an active {', '.join(missing)} user; run seed data first.")
+        self.users = list(users.values())
+        self.latency = _Latency(options['db_latency_ms'] / 1000)
+        concurrency, total = options['concurrency'], options['requests']
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(self.latency)
+        connections.close_all()
+        connection_created.connect(add_latency, dispatch_uid='bench-asgi-latency')
+        original = settings.ASYNC_VIEWS
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self._run(concurrency, total)
+        finally:
+            connection_created.disconnect(dispatch_uid='bench-asgi-latency')
+            connections.close_all()
+            _serve_async_views(original)
+
+    def _run(self, concurrency, total):
+        self.stdout.write(f"{'server':8} {'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        _serve_async_views(True)
+        rate, p50, asgi_p95 = self._asgi(concurrency, total)
+        self.stdout.write(f"{'asgi':8} {1:>7} {rate:>8.1f} {p50:>8.1f} {asgi_p95:>8.1f}")
+
+        _serve_async_views(False)
+        needed = None
+        workers = 1
+        while True:
+            rate, p50, p95 = self._wsgi(concurrency, total, workers)
+            self.stdout.write(f"{'wsgi':8} {workers:>7} {rate:>8.1f} {p50:>8.1f} {p95:>8.1f}")
+            if needed is None and p95 <= asgi_p95:
+                needed = workers
+            if workers >= concurrency:
+                break
+            workers = min(workers * 2, concurrency)
+        if needed:
+            self.stdout.write(f'WSGI needs {needed} sync workers to match the p95 of one ASGI worker '
+                              f'at {concurrency} concurrent clients.')
+        else:
+            self.stdout.write(f'No WSGI worker count up to {concurrency} matched the ASGI p95.')
+
+    def _plan(self, total, concurrency):
+        """Per client: the users whose dashboards it requests, round robin."""
+        return [
+            [self.users[(c + i) % len(self.users)] for i in range(total // concurrency + (c < total % concurrency))]
+            for c in range(concurrency)
+        ]
+
+    def _cookies(self):
+        # Log in through the sync client once per user; the clients share its session cookies
+        cookies = {}
+        for user in self.users:
+            client = Client()
+            client.force_login(user)
+            cookies[user.pk] = client.cookies
+        return cookies
+
+    def _wsgi(self, concurrency, total, workers):
+        cookies = self._cookies()
+        slots = threading.Semaphore(workers)
+        latencies, lock = [], threading.Lock()
+
+        def client(plan):
+            browser, mine = Client(), []
+            try:
+                for user in plan:
+                    browser.cookies = cookies[user.pk]
+                    started = time.perf_counter()
+                    with slots:
+                        response = browser.get(reverse(PAGES[user.role]))
+                    mine.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.status_code
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(mine)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(client, self._plan(total, concurrency)))
+        return _summary(latencies, time.perf_counter() - started)
+
+    def _asgi(self, concurrency, total):
+        cookies = {
+            pk: '; '.join(f'{name}={morsel.value}' for name, morsel in jar.items())
+            for pk, jar in self._cookies().items()
+        }
+        connections.close_all()
+        handler = ASGIHandler()
+
+        async def client(plan, latencies):
+            for user in plan:
+                started = time.perf_counter()
+                status = await _asgi_get(handler, reverse(PAGES[user.role]), cookies[user.pk])
+                latencies.append(time.perf_counter() - started)
+                assert status == 200, status
+
+        async def run():
+            latencies = []
+            started = time.perf_counter()
+            await asyncio.gather(*(client(plan, latencies) for plan in self._plan(total, concurrency)))
+            return _summary(latencies, time.perf_counter() - started)
+        return asyncio.run(run())
@@ -0,0 +1,135 @@
+"""
+Measure the streaming exports: rows per second, time to the first rows and
+memory, against building the whole file in memory first.
+
+    python manage.py bench_exports
+    python manage.py bench_exports --students 3000 --years 5 --baseline
+
+Bulk-inserts --years sessions of three terms of results for --students
+students over 10 subjects (rolled back afterwards), then streams the full
+results export as CSV and XLSX, discarding the bytes. Peak RSS is sampled
+after every chunk and reported as growth over the RSS before the export.
+--baseline also runs the naive export (load every Result with select_related,
+then write one HttpResponse). Run it last: the process keeps the memory.
+"""
+import csv
+import os
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+
+from portal import exports
+from portal.models import AcademicSession, Class, Result, Student, Subject, Term, User
+
+from .explain_queries import _Rollback
+
+SUBJECTS = 10
+
+
+def _rss():
+    """Resident set size of this process in bytes (Linux), or 0 if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class Command(BaseCommand):
+    help = 'Benchmark streaming CSV/XLSX exports of results (rows/s, time to first rows, peak RSS).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--years', type=int, default=5, help='Academic sessions of results (3 terms each).')
+        parser.add_argument('--baseline', action='store_true', help='Also time the build-it-in-memory export.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, n_students, years):
+        rng = random.Random(11)
+        start = date.today() - timedelta(days=365 * years)
+        terms = []
+        for year in range(years):
+            first = start + timedelta(days=365 * year)
+            session = AcademicSession.objects.create(name=f'Bench {first.year}', start_date=first,
+                                                     end_date=first + timedelta(days=330))
+            terms += [
+                Term.objects.create(session=session, name=f'Term {i + 1}', start_date=first + timedelta(days=110 * i),
+                                    end_date=first + timedelta(days=110 * i + 90))
+                for i in range(3)
+            ]
+        classes = Class.objects.bulk_create([Class(name=f'Bench Export {i}') for i in range(20)])
+        subjects = Subject.objects.bulk_create([Subject(name=f'Bench Subject {i}', code=f'BX{i}') for i in range(SUBJECTS)])
+        users = User.objects.bulk_create([
+            User(username=f'bench-export-{i}', first_name='Bench', last_name=f'Student {i}', role=User.ROLE_STUDENT, password='!')
+            for i in range(n_students)
+        ], batch_size=1000)
+        students = Student.objects.bulk_create([
+            Student(user=u, student_id=f'BX{i:06d}', current_class=classes[i % len(classes)]) for i, u in enumerate(users)
+        ], batch_size=1000)
+        batch = []
+        for term in terms:
+            for student in students:
+                for subject in subjects:
+                    batch.append(Result(student=student, subject=subject, term=term, status=Result.STATUS_APPROVED,
+                                        score=Decimal(rng.randint(2000, 10000)) / 100))
+                    if len(batch) >= 5000:
+                        Result.objects.bulk_create(batch)
+                        batch = []
+        Result.objects.bulk_create(batch)
+        return len(terms) * len(students) * len(subjects)
+
+    def _measure(self, chunks):
+        base = _rss()
+        peak = base
+        started = time.perf_counter()
+        arrivals = []
+        size = 0
+        for chunk in chunks:
+            arrivals.append(time.perf_counter() - started)
+            size += len(chunk)
+            peak = max(peak, _rss())
+        # The streamed formats send their headers first; the second chunk is the first with rows
+        first = arrivals[1] if len(arrivals) > 1 else arrivals[0]
+        return time.perf_counter() - started, first, size, peak - base
+
+    def _naive(self):
+        # What an export usually starts as: every row as a model instance, one big response
+        response = HttpResponse(content_type='text/csv')
+        writer = csv.writer(response)
+        results = list(Result.objects.select_related('term__session', 'student__user', 'student__current_class', 'subject'))
+        for r in results:
+            writer.writerow([r.term.session.name, r.term.name, r.student.student_id, r.student.user.first_name,
+                             r.student.user.last_name, r.student.current_class.name if r.student.current_class else '',
+                             r.subject.code, r.subject.name, r.score, r.subject_position, r.status, r.approved_at])
+        yield response.content
+
+    def _run(self, options):
+        started = time.perf_counter()
+        rows = self._seed(options['students'], options['years'])
+        self.stdout.write(f'Seeded {rows} results in {time.perf_counter() - started:.1f}s.')
+
+        runs = [
+            ('csv (streamed)', lambda: exports.stream('csv', *exports.results())),
+            ('xlsx (streamed)', lambda: exports.stream('xlsx', *exports.results())),
+        ]
+        if options['baseline']:
+            runs.append(('csv (in memory)', self._naive))
+        self.stdout.write(f"{'export':16} {'rows/s':>9} {'total s':>8} {'first rows ms':>14} {'MiB out':>8} {'peak RSS +MiB':>14}")
+        for label, chunks in runs:
+            total, first, size, grown = self._measure(chunks())
+            self.stdout.write(
+                f'{label:16} {rows / total:>9.0f} {total:>8.2f} {first * 1000:>14.1f} '
+                f'{size / 2 ** 20:>8.1f} {grown / 2 ** 20:>14.1f}'
+            )
@@ -0,0 +1,142 @@
+"""
+Measure notification fan-out and delivery against a local SMTP stand-in.
+
+    python manage.py bench_notifications
+    python manage.py bench_notifications --users 5000 --events 3 --connect-ms 150
+
+Creates --users users (rolled back at the end), records --events
+notifications for each of them, then delivers them as digests over one
+pooled SMTP connection to a throwaway SMTP server on localhost. With
+--baseline it also sends a sample the naive way, one email per
+notification over a new connection each, for comparison. --connect-ms
+simulates the TCP/TLS/AUTH handshake of a real mail provider.
+"""
+import socketserver
+import threading
+import time
+
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from portal import notifications
+from portal.models import Notification, User
+
+from .explain_queries import _Rollback
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server that accepts and discards mail, counting connections and messages."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay=0.0, message_delay=0.0):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.connect_delay = connect_delay
+        self.message_delay = message_delay
+        self.connections = self.messages = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.connect_delay)
+        self.reply('220 localhost SMTP sink')
+        for raw in self.rfile:
+            command = raw.decode('utf-8', 'replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                time.sleep(server.message_delay)
+                with server.lock:
+                    server.messages += 1
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark notification recording and digest delivery against a local SMTP stand-in.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=3, help='Notifications per user before delivery (default 3).')
+        parser.add_argument('--batch', type=int, default=notifications.DELIVERY_BATCH, help='Emails per send_messages() call.')
+        parser.add_argument('--connect-ms', type=float, default=50.0, help='Simulated SMTP connection setup time (default 50).')
+        parser.add_argument('--message-ms', type=float, default=0.0, help='Simulated server time per message (default 0).')
+        parser.add_argument('--baseline', type=int, default=0, metavar='N', help='Also send N emails one connection each.')
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(options['connect_ms'] / 1000, options['message_ms'] / 1000)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        smtp = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1', 'EMAIL_PORT': sink.port,
+            'EMAIL_HOST_USER': '', 'EMAIL_HOST_PASSWORD': '', 'EMAIL_USE_TLS': False, 'EMAIL_USE_SSL': False,
+        }
+        try:
+            with override_settings(**smtp), transaction.atomic():
+                self._run(sink, options)
+                raise _Rollback
+        except _Rollback:
+            pass
+        finally:
+            sink.shutdown()
+            sink.server_close()
+
+    def _run(self, sink, options):
+        users = User.objects.bulk_create([
+            User(username=f'bench-notify-{i}', email=f'bench{i}@example.com', role=User.ROLE_STUDENT, password='!')
+            for i in range(options['users'])
+        ])
+        user_ids = [user.pk for user in users]
+
+        if options['baseline']:
+            started = time.perf_counter()
+            for i in range(options['baseline']):
+                send_mail('Baseline', 'Body text.', None, [f'bench{i}@example.com'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Baseline: {options['baseline']} emails, one connection each, in {elapsed:.2f}s "
+                f"({options['baseline'] / elapsed:.1f} emails/s)."
+            )
+            sink.connections = sink.messages = 0
+
+        started = time.perf_counter()
+        for event in range(options['events']):
+            notifications.record(user_ids, Notification.KIND_ANNOUNCEMENT, f'Benchmark event {event}', 'Body text.')
+        recorded = len(user_ids) * options['events']
+        record_s = time.perf_counter() - started
+        self.stdout.write(f'Recorded {recorded} notifications in {record_s:.2f}s ({recorded / record_s:.0f} rows/s).')
+
+        stats = notifications.deliver_pending(batch_size=options['batch'])
+        self.stdout.write(
+            f'Delivered {stats.notifications} notifications as {stats.emails} digest emails '
+            f'over {sink.connections} SMTP connection(s) in {stats.seconds:.2f}s: '
+            f'{stats.rate:.1f} emails/s, {stats.notifications / stats.seconds if stats.seconds else 0:.1f} notifications/s.'
+        )
+        self.stdout.write(
+            f'Lag from recording to sending: p50 {stats.lag(0.5):.2f}s, p95 {stats.lag(0.95):.2f}s, '
+            f'max {stats.lag(1.0):.2f}s (in production add NOTIFICATION_DIGEST_DELAY).'
+        )
+        if sink.messages != stats.emails:
+            self.stderr.write(self.style.ERROR(f'SMTP sink received {sink.messages} messages, expected {stats.emails}.'))
@@ -0,0 +1,115 @@
+"""
+Count the SQL queries (and time) each portal page costs, per role.
+
+    python manage.py bench_queries               # seed a sample school, measure, roll back
+    python manage.py bench_queries --no-seed     # measure against existing data
+    python manage.py bench_queries --repeat 20
+
+Every page is requested twice through the test client as a logged-in user of
+the right role: ``cold`` right after the per-user caches were cleared,
+``warm`` on the next request. Seeded rows are rolled back at the end.
+"""
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from portal.models import Class, Student, Teacher, Term, User
+
+from .explain_queries import _Rollback, _seed
+
+
+def portal_pages(sample):
+    """(role, label, url) for every portal page worth measuring."""
+    term, cls = sample['term'].pk, sample['class'].pk
+    return [
+        ('admin', 'admin_dashboard', reverse('portal:admin_dashboard')),
+        ('admin', 'student_management', reverse('portal:student_management')),
+        ('admin', 'teacher_management', reverse('portal:teacher_management')),
+        ('admin', 'results_management', reverse('portal:results_management')),
+        ('admin', 'class_rankings', f"{reverse('portal:class_rankings')}?class={cls}&term={term}"),
+        ('admin', 'announcements_list', reverse('portal:announcements_list')),
+        ('admin', 'admissions_queue', reverse('portal:admissions_queue')),
+        ('admin', 'attendance_report', reverse('portal:attendance_report')),
+        ('teacher', 'teacher_dashboard', reverse('portal:teacher_dashboard')),
+        ('teacher', 'upload_results', reverse('portal:upload_results')),
+        ('teacher', 'view_students', f"{reverse('portal:view_students')}?class={cls}"),
+        ('teacher', 'attendance_register', f"{reverse('portal:attendance_register')}?class_ref={cls}&date={sample['date']}"),
+        ('student', 'student_dashboard', reverse('portal:student_dashboard')),
+        ('student', 'my_results', reverse('portal:my_results')),
+        ('student', 'my_results (term)', f"{reverse('portal:my_results')}?term={term}"),
+        ('student', 'student_announcements', reverse('portal:student_announcements')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Report SQL query counts and timings for every portal page, per role.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-seed', action='store_true', help='Measure against the existing data only.')
+        parser.add_argument('--students', type=int, default=400)
+        parser.add_argument('--results', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5, help='Warm requests timed per page (default 5).')
+
+    def handle(self, *args, **options):
+        rows = []
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                if not options['no_seed']:
+                    _seed(options['students'], options['results'])
+                sample = self._sample()
+                clients = {}
+                for role, user in sample['users'].items():
+                    clients[role] = Client()
+                    clients[role].force_login(user)
+                for role, label, url in portal_pages(sample):
+                    rows.append((role, label) + self._measure(clients[role], url, options['repeat']))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'role':8} {'page':24} {'status':>6} {'cold':>5} {'warm':>5} {'ms':>8}")
+        for role, label, status, cold, warm, ms in rows:
+            line = f'{role:8} {label:24} {status:>6} {cold:>5} {warm:>5} {ms:>8.1f}'
+            self.stdout.write(line if status == 200 else self.style.ERROR(line))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(rows)} pages, {sum(r[4] for r in rows)} warm queries in total.'
+        ))
+
+    def _sample(self):
+        student = Student.objects.exclude(current_class=None).select_related('user', 'current_class').first()
+        teacher = Teacher.objects.select_related('user').first()
+        admin = User.objects.filter(role=User.ROLE_ADMIN).first()
+        term = Term.objects.order_by('-start_date').first()
+        if not (student and teacher and term):
+            raise CommandError('Need at least one student with a class, one teacher and one term; run without --no-seed.')
+        if admin is None:
+            admin = User.objects.create(username='bench-admin', role=User.ROLE_ADMIN, password='!')
+        return {
+            'users': {'admin': admin, 'teacher': teacher.user, 'student': student.user},
+            'class': student.current_class or Class.objects.first(),
+            'term': term,
+            'date': term.start_date.isoformat(),
+        }
+
+    def _count(self, client, url):
+        # Each request resets the query log, so it must be empty when a capture
+        # starts, and the capture is a view of the log: count it straight away
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        return response, len(queries)
+
+    def _measure(self, client, url, repeat):
+        cache.clear()
+        response, cold = self._count(client, url)
+        _, warm = self._count(client, url)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            client.get(url)
+        ms = (time.perf_counter() - started) * 1000 / max(repeat, 1)
+        return response.status_code, cold, warm, ms
@@ -0,0 +1,137 @@
+"""
+Time full-text search against the icontains scans it replaces.
+
+    python manage.py bench_search
+    python manage.py bench_search --students 50000 --announcements 20000
+
+Bulk-inserts named students and announcements (rolled back afterwards),
+indexes them, then runs the same name and word queries both ways and prints
+median and 95th percentile milliseconds per query. Typeahead keystrokes
+(growing name and ID prefixes) are timed against the picker prefix index the
+same way, and the student <select> they replace is rendered for its size.
+"""
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django import forms
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from portal import search, typeahead
+from portal.forms import ResultUploadForm
+from portal.models import Announcement, Class, PickerKey, SearchEntry, Student, User
+
+from .explain_queries import _Rollback
+
+FIRST_NAMES = ['Adebayo', 'Chiamaka', 'Emeka', 'Funmilayo', 'Ibrahim', 'Kemi', 'Ngozi', 'Oluwaseun',
+               'Tunde', 'Zainab', 'Amina', 'Babajide', 'Chinedu', 'Damilola', 'Efe', 'Halima']
+LAST_NAMES = ['Okafor', 'Adeyemi', 'Bello', 'Eze', 'Ogunleye', 'Musa', 'Nwosu', 'Abubakar',
+              'Balogun', 'Obi', 'Lawal', 'Okonkwo', 'Danjuma', 'Akande', 'Ibe', 'Yusuf']
+WORDS = ['sports', 'examination', 'holiday', 'meeting', 'parents', 'uniform', 'library', 'science',
+         'fair', 'fees', 'timetable', 'excursion', 'debate', 'choir', 'vaccination', 'resumption']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full-text search vs icontains over a seeded school.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50000)
+        parser.add_argument('--announcements', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=50, help='Queries per kind and method (default 50).')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, n_students, n_announcements, rng):
+        today = date.today()
+        classes = Class.objects.bulk_create([Class(name=f'Bench {i}') for i in range(40)])
+        users = User.objects.bulk_create([
+            User(username=f'bench-search-{i}', first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                 role=User.ROLE_STUDENT, password='!')
+            for i in range(n_students)
+        ], batch_size=1000)
+        Student.objects.bulk_create([
+            Student(user=u, student_id=f'BENCH{i:06d}', current_class=classes[i % len(classes)])
+            for i, u in enumerate(users)
+        ], batch_size=1000)
+        # A few thousand distinct words, like real notices, rather than the same sixteen everywhere
+        vocabulary = WORDS + [''.join(rng.choices('bcdfghklmnprstvwyz', k=3)) + rng.choice(['ing', 'tion', 'ment', 'ary'])
+                              for _ in range(3000)]
+        Announcement.objects.bulk_create([
+            Announcement(title=' '.join(rng.sample(vocabulary, 4)).capitalize(), content=' '.join(rng.choices(vocabulary, k=40)),
+                         date=today - timedelta(days=i % 2000))
+            for i in range(n_announcements)
+        ], batch_size=1000)
+
+    def _time(self, queries, run):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def _run(self, options):
+        rng = random.Random(7)
+        started = time.perf_counter()
+        self._seed(options['students'], options['announcements'], rng)
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s.')
+        started = time.perf_counter()
+        counts = search.rebuild([Student, Announcement])
+        self.stdout.write(f'Indexed {sum(counts.values())} entries in {time.perf_counter() - started:.1f}s ({connection.vendor}).')
+        started = time.perf_counter()
+        typeahead.rebuild([PickerKey.KIND_STUDENT])
+        self.stdout.write(f'Built picker keys in {time.perf_counter() - started:.1f}s.')
+
+        n = options['queries']
+        names = [f'{rng.choice(FIRST_NAMES)[:4]} {rng.choice(LAST_NAMES)[:3]}' for _ in range(n)]
+        words = [rng.choice(WORDS) for _ in range(n)]
+        # What a picker sends while someone types a name or an ID
+        keystrokes = []
+        for i in range(n):
+            typed = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' if i % 2 else f'BENCH{rng.randrange(options["students"]):06d}'
+            keystrokes += [typed[:length] for length in (1, 2, 3, 5, 8)]
+
+        def scan_students(query):
+            qs = Student.objects.select_related('user').order_by('user__last_name', 'user__first_name')
+            for word in query.split():
+                qs = qs.filter(Q(user__first_name__icontains=word) | Q(user__last_name__icontains=word) | Q(student_id__icontains=word))
+            return list(qs[:50])
+
+        def scan_announcements(query):
+            qs = Announcement.objects.order_by('-date', '-created_at')
+            for word in query.split():
+                qs = qs.filter(Q(title__icontains=word) | Q(content__icontains=word))
+            return list(qs[:50])
+
+        def scan_picker(query):
+            qs = Student.objects.select_related('user').order_by('user__first_name', 'user__last_name')
+            for word in query.split():
+                qs = qs.filter(Q(user__first_name__icontains=word) | Q(user__last_name__icontains=word) | Q(student_id__icontains=word))
+            return list(qs[:typeahead.LIMIT])
+
+        rows = [
+            ('students', 'full-text', self._time(names, lambda q: search.search(q, [SearchEntry.KIND_STUDENT], limit=50))),
+            ('students', 'icontains', self._time(names, scan_students)),
+            ('announcements', 'full-text', self._time(words, lambda q: search.search(q, [SearchEntry.KIND_ANNOUNCEMENT], limit=50))),
+            ('announcements', 'icontains', self._time(words, scan_announcements)),
+            ('typeahead', 'prefix', self._time(keystrokes, lambda q: typeahead.suggest(PickerKey.KIND_STUDENT, q))),
+            ('typeahead', 'icontains', self._time(keystrokes, scan_picker)),
+        ]
+        self.stdout.write(f"{'kind':14} {'method':10} {'p50 ms':>8} {'p95 ms':>8}")
+        for kind, method, (p50, p95) in rows:
+            self.stdout.write(f'{kind:14} {method:10} {p50:>8.2f} {p95:>8.2f}')
+
+        select = forms.Select(choices=forms.ModelChoiceField(Student.objects.select_related('user')).choices)
+        before = len(select.render('student', None))
+        after = len(ResultUploadForm()['student'].as_widget())
+        self.stdout.write(f'Student picker markup: {before / 1024:.0f} KiB as a <select>, {after} bytes as a typeahead.')
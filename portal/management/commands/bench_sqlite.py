@@ -0,0 +1,182 @@
+"""
+Hammer a SQLite database with concurrent result uploads and student reads
+from several processes, as gunicorn workers would, and report lock errors
+and latency.
+
+    python manage.py bench_sqlite
+    python manage.py bench_sqlite --writers 4 --readers 12 --seconds 30 --mode tuned
+
+Each mode gets a fresh database file in a temporary directory (migrated and
+seeded with --students students, 10 subjects and a term of approved results;
+the configured database is not touched):
+
+* default: Django's stock SQLite backend and rollback journal, deferred BEGIN;
+* tuned: portal.backends.sqlite3 with SQLITE_PRAGMAS (WAL, busy_timeout, ...).
+
+Writers upload a whole class's scores for a subject through ResultImporter,
+the code path behind Upload Results. Readers run the My Results queries for
+random students. Every operation is timed; "database is locked" failures
+are counted separately from other errors.
+"""
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from portal.importers import ResultImporter
+from portal.models import AcademicSession, Class, Result, Student, Subject, Term, TermReport, User
+
+SUBJECTS = 10
+CLASS_SIZE = 30
+MODES = {
+    # engine, pragmas
+    'default': ('django.db.backends.sqlite3', {'journal_mode': 'DELETE'}),
+    'tuned': ('portal.backends.sqlite3', None),  # None: settings.SQLITE_PRAGMAS
+}
+
+
+def _configure(path, engine, pragmas):
+    """Point the default database at ``path`` (in this process) with the given engine and pragmas."""
+    connections.close_all()
+    settings.DATABASES[DEFAULT_DB_ALIAS].update(ENGINE=engine, NAME=str(path), OPTIONS={})
+    settings.SQLITE_PRAGMAS = pragmas
+    try:
+        # Drop the old wrapper so the next query builds one with the new engine
+        del connections[DEFAULT_DB_ALIAS]
+    except AttributeError:
+        pass
+
+
+def _timed(operation, seconds, seed):
+    """Run ``operation(rng)`` until ``seconds`` pass; (latencies, lock errors, other errors)."""
+    rng = random.Random(seed)
+    latencies, locked, failed = [], 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            operation(rng)
+        except OperationalError as exc:
+            if 'locked' in str(exc) or 'busy' in str(exc):
+                locked += 1
+            else:
+                failed += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    return latencies, locked, failed
+
+
+def _upload(seconds, seed):
+    classes = list(Class.objects.filter(name__startswith='Bench SQLite'))
+    subjects = list(Subject.objects.filter(code__startswith='BQ'))
+    term = Term.objects.get(name='Bench SQLite term')
+    teacher = User.objects.get(username='bench-sqlite-teacher')
+    roll = {c.pk: list(c.students.values_list('student_id', flat=True)) for c in classes}
+
+    def operation(rng):
+        class_ref, subject = rng.choice(classes), rng.choice(subjects)
+        rows = [['student_id', 'score']] + [[sid, rng.randint(20, 100)] for sid in roll[class_ref.pk]]
+        ResultImporter(term=term, uploaded_by=teacher, subject=subject, class_ref=class_ref).run(rows)
+    return _timed(operation, seconds, seed)
+
+
+def _read(seconds, seed):
+    students = list(Student.objects.filter(student_id__startswith='BQ').values_list('pk', flat=True))
+
+    def operation(rng):
+        student = rng.choice(students)
+        list(Result.objects.filter(student_id=student, status=Result.STATUS_APPROVED)
+             .select_related('subject', 'term').order_by('-term__start_date'))
+        TermReport.objects.filter(student_id=student).first()
+    return _timed(operation, seconds, seed)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent uploads and reads on SQLite: default vs tuned (WAL) mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Uploading processes (default 4).')
+        parser.add_argument('--readers', type=int, default=8, help='Reading processes (default 8).')
+        parser.add_argument('--seconds', type=int, default=20, help='Duration per mode (default 20).')
+        parser.add_argument('--students', type=int, default=600)
+        parser.add_argument('--mode', choices=['both', *MODES], default='both')
+
+    def handle(self, *args, **options):
+        original = dict(settings.DATABASES[DEFAULT_DB_ALIAS])
+        original_pragmas = settings.SQLITE_PRAGMAS
+        modes = list(MODES) if options['mode'] == 'both' else [options['mode']]
+        self.stdout.write(f"{'mode':8} {'role':7} {'ops':>6} {'ops/s':>7} {'p50 ms':>8} {'p99 ms':>8} "
+                          f"{'locked':>7} {'errors':>7}")
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                for mode in modes:
+                    engine, pragmas = MODES[mode]
+                    config = (Path(tmp) / f'{mode}.sqlite3', engine, original_pragmas if pragmas is None else pragmas)
+                    _configure(*config)
+                    self._seed(options['students'])
+                    connections.close_all()
+                    self._run(mode, config, options)
+        finally:
+            connections.close_all()
+            settings.DATABASES[DEFAULT_DB_ALIAS].clear()
+            settings.DATABASES[DEFAULT_DB_ALIAS].update(original)
+            settings.SQLITE_PRAGMAS = original_pragmas
+            try:
+                del connections[DEFAULT_DB_ALIAS]
+            except AttributeError:
+                pass
+
+    def _seed(self, n_students):
+        call_command('migrate', verbosity=0, interactive=False)
+        rng = random.Random(23)
+        today = date.today()
+        session = AcademicSession.objects.create(name='Bench SQLite', start_date=today - timedelta(days=60),
+                                                 end_date=today + timedelta(days=200))
+        term = Term.objects.create(session=session, name='Bench SQLite term', start_date=session.start_date,
+                                   end_date=today + timedelta(days=30))
+        User.objects.create(username='bench-sqlite-teacher', role=User.ROLE_TEACHER, password='!')
+        classes = Class.objects.bulk_create([
+            Class(name=f'Bench SQLite {i}') for i in range(max(1, n_students // CLASS_SIZE))
+        ])
+        subjects = Subject.objects.bulk_create([Subject(name=f'Bench Subject {i}', code=f'BQ{i}') for i in range(SUBJECTS)])
+        users = User.objects.bulk_create([
+            User(username=f'bench-sqlite-{i}', first_name='Bench', last_name=f'Student {i}', role=User.ROLE_STUDENT,
+                 password='!')
+            for i in range(n_students)
+        ], batch_size=500)
+        students = Student.objects.bulk_create([
+            Student(user=u, student_id=f'BQ{i:05d}', current_class=classes[i % len(classes)]) for i, u in enumerate(users)
+        ], batch_size=500)
+        Result.objects.bulk_create([
+            Result(student=s, subject=subject, term=term, status=Result.STATUS_APPROVED,
+                   score=Decimal(rng.randint(2000, 10000)) / 100)
+            for s in students for subject in subjects
+        ], batch_size=1000)
+
+    def _run(self, mode, config, options):
+        seconds = options['seconds']
+        workers = options['writers'] + options['readers']
+        with ProcessPoolExecutor(max_workers=workers, initializer=_configure, initargs=config) as pool:
+            futures = [('upload', pool.submit(_upload, seconds, n)) for n in range(options['writers'])]
+            futures += [('read', pool.submit(_read, seconds, 1000 + n)) for n in range(options['readers'])]
+            outcomes = {'upload': ([], 0, 0), 'read': ([], 0, 0)}
+            for role, future in futures:
+                latencies, locked, failed = future.result()
+                total = outcomes[role]
+                outcomes[role] = (total[0] + latencies, total[1] + locked, total[2] + failed)
+        for role, (latencies, locked, failed) in outcomes.items():
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000 if latencies else 0
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+            self.stdout.write(f'{mode:8} {role:7} {len(latencies):>6} {len(latencies) / seconds:>7.1f} '
+                              f'{p50:>8.1f} {p99:>8.1f} {locked:>7} {failed:>7}')
@@ -0,0 +1,366 @@
+"""
+Benchmark every page in portal/urls.py and public/urls.py against the data
+in the database, and flag regressions against a stored baseline.
+
+    python manage.py seed_school                     # once, on a fresh database
+    python manage.py bench_suite --save-baseline     # record the reference numbers
+    python manage.py bench_suite                     # compare; fails on regressions
+    python manage.py bench_suite --only portal:my_results --only public:home --load-seconds 0
+
+Two phases:
+
+* Test client: each route is requested as a user of the role its view
+  requires (``required_role``; other portal pages as the admin, the public
+  site anonymously) until --repeat samples are taken or --route-seconds
+  pass, after one warm-up request. Records p50/p95/p99 latency, the SQL
+  queries of a warm request and the peak memory Python allocates while
+  serving one (tracemalloc).
+* HTTP load: a threaded WSGI server on a local port, and --concurrency
+  client threads requesting the pages round robin over real sockets for
+  --load-seconds. Records requests/s, p50/p95/p99 overall and per route,
+  errors, and the growth of the process's peak RSS. Streamed downloads
+  (exports, report cards) are left out of this phase.
+
+Routes that change data when fetched (logout, the approve/reject links) are
+skipped. URL arguments and query strings come from sample data; a new route
+with an argument the suite does not know is reported as skipped.
+
+The baseline is JSON (--baseline, default benchmarks/baseline.json). A
+route regresses when its status changes, its query count grows, or its p95
+latency or memory grows by more than --tolerance and by more than a noise
+floor; the load phase when requests/s falls or p95 or RSS grows likewise.
+Latency only compares on the machine (and data) that recorded the baseline;
+query counts compare anywhere.
+"""
+import http.client
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, get_resolver, reverse
+
+from portal.models import AcademicSession, Class, NewsArticle, Result, Student, Teacher, User
+
+from .bench_exports import _rss
+
+NAMESPACES = ('public', 'portal')
+SKIP = {
+    # Change data (or the session) on GET
+    'portal:logout': 'logs the user out',
+    'portal:approve_result': 'approves on GET',
+    'portal:reject_result': 'rejects on GET',
+    'portal:approve_admission': 'approves on GET',
+    'portal:reject_admission': 'rejects on GET',
+}
+NOISE_MS = 2.0
+NOISE_KIB = 64
+NOISE_RSS_MIB = 8
+
+
+def routes():
+    """(name, URLPattern) for every named route of the public site and the portal."""
+    resolver = get_resolver()
+    found = []
+    for namespace in NAMESPACES:
+        _, sub = resolver.namespace_dict[namespace]
+        found += [(f'{namespace}:{p.name}', p) for p in sub.url_patterns if isinstance(p, URLPattern) and p.name]
+    return found
+
+
+def route_arguments(sample):
+    """{route: (URL kwargs, query string)} for routes that need arguments or are worth a query."""
+    cls, term, session = sample['class'].pk, sample['term'].pk, sample['session'].pk
+    return {
+        'portal:typeahead': ({'kind': 'student'}, 'q=ad'),
+        'portal:search': ({}, 'q=exam'),
+        'portal:student_profile': ({'pk': sample['student'].pk}, ''),
+        'portal:teacher_profile': ({'pk': sample['teacher'].pk}, ''),
+        'portal:class_rankings': ({}, f'class={cls}&term={term}'),
+        'portal:download_report_cards': ({}, f'class={cls}&term={term}'),
+        'portal:export_results': ({}, f'class_ref={cls}&term={term}'),
+        'portal:export_roster': ({}, f'class={cls}'),
+        'portal:export_attendance': ({}, f'session={session}&class={cls}'),
+        'portal:view_students': ({}, f'class={cls}'),
+        'portal:attendance_register': ({}, f"class_ref={cls}&date={sample['date']}"),
+        'portal:my_results': ({}, f'term={term}'),
+        'public:news_detail': ({'slug': sample['news'].slug}, ''),
+        'public:news_search': ({}, 'q=school'),
+    }
+
+
+def _role(name, pattern):
+    if name.startswith('public:') or name == 'portal:login':
+        return None
+    return getattr(pattern.callback, 'required_role', User.ROLE_ADMIN)
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+
+    def ms(q):
+        return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+    return {'p50_ms': round(statistics.median(samples) * 1000, 2), 'p95_ms': ms(0.95), 'p99_ms': ms(0.99)}
+
+
+def _read(response):
+    """The whole body, consuming streamed responses like a browser would."""
+    try:
+        return b''.join(response.streaming_content) if response.streaming else response.content
+    finally:
+        response.close()
+
+
+def _grew(now, then, tolerance, floor):
+    return now > then * (1 + tolerance) and now - then > floor
+
+
+def regressions(current, baseline, tolerance):
+    """Human-readable regressions of ``current`` against ``baseline`` (both as saved by --save-baseline)."""
+    found = []
+    for name, now in current['routes'].items():
+        then = baseline.get('routes', {}).get(name)
+        if then is None:
+            continue
+        if now['status'] != then['status']:
+            found.append(f"{name}: status {then['status']} -> {now['status']}")
+        if now['queries'] > then['queries']:
+            found.append(f"{name}: {then['queries']} -> {now['queries']} queries")
+        if _grew(now['p95_ms'], then['p95_ms'], tolerance, NOISE_MS):
+            found.append(f"{name}: p95 {then['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms")
+        if _grew(now['peak_kib'], then['peak_kib'], tolerance, NOISE_KIB):
+            found.append(f"{name}: peak memory {then['peak_kib']} -> {now['peak_kib']} KiB")
+    now, then = current.get('load'), baseline.get('load')
+    if now and then and now['concurrency'] == then['concurrency']:
+        if now['rps'] < then['rps'] * (1 - tolerance):
+            found.append(f"load: {then['rps']:.1f} -> {now['rps']:.1f} requests/s")
+        if _grew(now['p95_ms'], then['p95_ms'], tolerance, NOISE_MS):
+            found.append(f"load: p95 {then['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms")
+        if _grew(now['rss_growth_mib'], then['rss_growth_mib'], tolerance, NOISE_RSS_MIB):
+            found.append(f"load: RSS growth {then['rss_growth_mib']} -> {now['rss_growth_mib']} MiB")
+        if now['errors'] > then['errors']:
+            found.append(f"load: {then['errors']} -> {now['errors']} errors")
+    return found
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every portal and public page (test client and HTTP load) and flag regressions against a baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per route (default 20).')
+        parser.add_argument('--route-seconds', type=float, default=5.0,
+                            help='Stop sampling a route after this long, whatever --repeat says (default 5).')
+        parser.add_argument('--concurrency', type=int, default=8, help='HTTP load clients (default 8).')
+        parser.add_argument('--load-seconds', type=float, default=20.0,
+                            help='Duration of the HTTP load phase; 0 skips it (default 20).')
+        parser.add_argument('--only', action='append', metavar='ROUTE', help='Only this route (e.g. portal:my_results); repeatable.')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Write this run as the new baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed growth in latency and memory before it counts as a regression (default 0.25).')
+
+    def handle(self, *args, **options):
+        sample = self._sample()
+        arguments = route_arguments(sample)
+        selected = [(name, pattern) for name, pattern in routes() if not options['only'] or name in options['only']]
+        if not selected:
+            raise CommandError('No route matches --only.')
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver', '127.0.0.1']
+        current = {'meta': self._meta(), 'routes': {}}
+        with override_settings(ALLOWED_HOSTS=hosts):
+            clients = {None: Client()}
+            for role, user in sample['users'].items():
+                clients[role] = Client()
+                clients[role].force_login(user)
+
+            self.stdout.write(f"{'route':34} {'role':8} {'status':>6} {'queries':>7} {'p50 ms':>8} {'p95 ms':>8} "
+                              f"{'p99 ms':>8} {'peak KiB':>9}")
+            pages = []
+            for name, pattern in selected:
+                if name in SKIP:
+                    self.stdout.write(f'{name:34} skipped: {SKIP[name]}')
+                    continue
+                kwargs, query = arguments.get(name, ({}, ''))
+                missing = set(pattern.pattern.converters) - set(kwargs)
+                if missing:
+                    self.stdout.write(f"{name:34} skipped: no sample for {', '.join(sorted(missing))}")
+                    continue
+                role = _role(name, pattern)
+                url = reverse(name, kwargs=kwargs) + (f'?{query}' if query else '')
+                row, streamed = self._measure(clients[role], url, options)
+                current['routes'][name] = row
+                self._print_route(name, role, row)
+                if not streamed and row['status'] < 400:
+                    pages.append((name, url, role))
+
+            if options['load_seconds'] > 0 and pages:
+                cookies = {role: '; '.join(f'{k}={m.value}' for k, m in client.cookies.items())
+                           for role, client in clients.items()}
+                current['load'] = self._load(pages, cookies, options['concurrency'], options['load_seconds'])
+                self._print_load(current['load'])
+        self._compare(current, options)
+
+    def _sample(self):
+        admin = User.objects.filter(role=User.ROLE_ADMIN, is_active=True).order_by('pk').first()
+        teacher = Teacher.objects.filter(assigned_classes__isnull=False).select_related('user').order_by('pk').first()
+        student = Student.objects.exclude(current_class=None).select_related('user', 'current_class').order_by('pk').first()
+        result = Result.objects.filter(student=student, status=Result.STATUS_APPROVED).select_related('term').first()
+        session = AcademicSession.objects.filter(is_current=True).first() or AcademicSession.objects.first()
+        news = NewsArticle.objects.order_by('-published_date').first()
+        if not (admin and teacher and student and result and session and news):
+            raise CommandError('Needs an admin, a teacher with classes, a student with approved results, a session '
+                               'and a news article; run seed_school first.')
+        return {
+            'users': {User.ROLE_ADMIN: admin, User.ROLE_TEACHER: teacher.user, User.ROLE_STUDENT: student.user},
+            'student': student, 'teacher': teacher, 'class': student.current_class, 'term': result.term,
+            'session': session, 'date': result.term.start_date.isoformat(), 'news': news,
+        }
+
+    def _meta(self):
+        return {
+            'recorded': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'rows': {model.__name__: model.objects.count() for model in (Class, Student, Result)},
+        }
+
+    def _get(self, client, url):
+        response = client.get(url)
+        _read(response)
+        return response
+
+    def _measure(self, client, url, options):
+        response = self._get(client, url)  # warm-up: caches, templates, connections
+        # The capture is a view of the query log, which every request resets
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self._get(client, url)
+        query_count = len(queries)
+        tracemalloc.start()
+        try:
+            self._get(client, url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        samples, deadline = [], time.perf_counter() + options['route_seconds']
+        while len(samples) < options['repeat'] and (not samples or time.perf_counter() < deadline):
+            started = time.perf_counter()
+            self._get(client, url)
+            samples.append(time.perf_counter() - started)
+        row = {'status': response.status_code, 'queries': query_count, **_percentiles(samples),
+               'peak_kib': peak // 1024, 'samples': len(samples)}
+        return row, response.streaming
+
+    def _load(self, pages, cookies, concurrency, seconds):
+        server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietHandler, allow_reuse_address=False)
+        server.set_app(WSGIHandler())
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        latencies = {name: [] for name, _, _ in pages}
+        errors, lock = [0], threading.Lock()
+        rss_before = peak_rss = _rss()
+
+        def client(offset):
+            nonlocal peak_rss
+            mine, failed, n = [], 0, offset
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                name, url, role = pages[n % len(pages)]
+                n += 1
+                started = time.perf_counter()
+                try:
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                    conn.request('GET', url, headers={'Cookie': cookies[role]} if cookies[role] else {})
+                    response = conn.getresponse()
+                    response.read()
+                    conn.close()
+                    ok = response.status < 400
+                except OSError:
+                    ok = False
+                if ok:
+                    mine.append((name, time.perf_counter() - started))
+                else:
+                    failed += 1
+            with lock:
+                for name, latency in mine:
+                    latencies[name].append(latency)
+                errors[0] += failed
+                peak_rss = max(peak_rss, _rss())
+
+        started = time.perf_counter()
+        try:
+            workers = [threading.Thread(target=client, args=(i * len(pages) // concurrency,)) for i in range(concurrency)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            server.shutdown()
+            server.server_close()
+            connections.close_all()
+        elapsed = time.perf_counter() - started
+        everything = [latency for samples in latencies.values() for latency in samples]
+        if not everything:
+            raise CommandError('Every request of the load phase failed.')
+        return {
+            'concurrency': concurrency,
+            'rps': round(len(everything) / elapsed, 1),
+            **_percentiles(everything),
+            'errors': errors[0],
+            'rss_growth_mib': round((peak_rss - rss_before) / 2 ** 20, 1),
+            'routes': {name: {'requests': len(samples), **_percentiles(samples)}
+                       for name, samples in latencies.items() if samples},
+        }
+
+    def _print_route(self, name, role, row):
+        line = (f"{name:34} {role or 'anon':8} {row['status']:>6} {row['queries']:>7} {row['p50_ms']:>8.1f} "
+                f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['peak_kib']:>9}")
+        self.stdout.write(line if row['status'] < 400 else self.style.ERROR(line))
+
+    def _print_load(self, load):
+        self.stdout.write(f"\nHTTP load, {load['concurrency']} clients: {load['rps']} requests/s, "
+                          f"p50 {load['p50_ms']:.1f} ms, p95 {load['p95_ms']:.1f} ms, p99 {load['p99_ms']:.1f} ms, "
+                          f"{load['errors']} errors, peak RSS +{load['rss_growth_mib']} MiB")
+        for name, row in load['routes'].items():
+            self.stdout.write(f"  {name:32} {row['requests']:>6} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                              f"{row['p99_ms']:>8.1f}")
+
+    def _compare(self, current, options):
+        path = Path(options['baseline'])
+        baseline = json.loads(path.read_text()) if path.exists() else None
+        found = []
+        if baseline is None:
+            self.stdout.write(f'\nNo baseline at {path}.')
+        else:
+            if baseline.get('meta', {}).get('rows') != current['meta']['rows']:
+                self.stdout.write(self.style.WARNING(
+                    f"The baseline was recorded on different data ({baseline.get('meta', {}).get('rows')}); "
+                    f"latency and memory may not compare."
+                ))
+            found = regressions(current, baseline, options['tolerance'])
+            for line in found:
+                self.stdout.write(self.style.ERROR(f'REGRESSION {line}'))
+        if options['save_baseline']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(current, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {path}.'))
+        elif found:
+            raise CommandError(f'{len(found)} regression(s) against {path}.')
+        elif baseline is not None:
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
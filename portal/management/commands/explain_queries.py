@@ -0,0 +1,213 @@
+"""
+Run EXPLAIN for the queries behind every portal view and fail on full table scans.
+
+    python manage.py explain_queries                # seed, explain, roll back
+    python manage.py explain_queries --no-seed      # explain against existing data
+    python manage.py explain_queries --results 200000 --verbose
+
+Seeded rows are written inside a transaction that is rolled back at the end,
+so the command is safe to run against a development database.
+"""
+import random
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from portal.models import (
+    User, AcademicSession, Term, Class, Subject, Teacher, Student, ClassSubject,
+    Result, Announcement, AdmissionApplication, ContactMessage, NewsArticle, Attendance,
+)
+
+# Tables large enough that a sequential scan is a real problem
+HOT_TABLES = {
+    Result._meta.db_table,
+    Attendance._meta.db_table,
+    Announcement._meta.db_table,
+    AdmissionApplication._meta.db_table,
+    ContactMessage._meta.db_table,
+    Student._meta.db_table,
+    NewsArticle._meta.db_table,
+}
+
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class _Rollback(Exception):
+    pass
+
+
+def portal_queries(sample):
+    """(label, queryset) pairs mirroring the queries each portal view issues."""
+    student = sample['student']
+    return [
+        # count() drops ordering, so the counts are explained unordered
+        ('admin_dashboard: pending results', Result.objects.filter(status=Result.STATUS_PENDING).order_by()),
+        ('admin_dashboard: pending admissions', AdmissionApplication.objects.filter(status=AdmissionApplication.STATUS_PENDING).order_by()),
+        ('admin_dashboard: unread contacts', ContactMessage.objects.filter(read=False).order_by()),
+        ('results_management', Result.objects.filter(status=Result.STATUS_PENDING, term=sample['term'])
+            .select_related('student__user', 'subject', 'term', 'uploaded_by')),
+        ('student_profile', Result.objects.filter(student=student).select_related('subject', 'term')
+            .order_by('-term__start_date')),
+        ('announcements_list', Announcement.objects.select_related('target_class', 'created_by').order_by('-date')[:50]),
+        ('admissions_queue', AdmissionApplication.objects.select_related('applying_class')
+            .filter(status=AdmissionApplication.STATUS_PENDING).order_by('-submitted_at')),
+        ('teacher_dashboard: announcements', Announcement.objects.filter(scope=Announcement.SCOPE_SCHOOL).order_by('-date')[:10]),
+        ('teacher_dashboard: pending count', Result.objects.filter(uploaded_by=sample['teacher_user'], status=Result.STATUS_PENDING).order_by()),
+        ('teacher_dashboard: my classes', ClassSubject.objects.filter(teacher=sample['teacher'])
+            .select_related('class_ref', 'subject')),
+        ('view_students', Student.objects.filter(current_class=student.current_class).select_related('user')),
+        ('student_dashboard: announcements', Announcement.objects.filter(
+            Q(scope=Announcement.SCOPE_SCHOOL) | Q(target_class=student.current_class)
+        ).distinct().order_by('-date')[:10]),
+        ('my_results: all terms', Result.objects.filter(student=student, status=Result.STATUS_APPROVED)
+            .select_related('subject', 'term').order_by('-term__start_date')),
+        ('my_results: one term', Result.objects.filter(student=student, term=sample['term'], status=Result.STATUS_APPROVED)
+            .select_related('subject', 'term')),
+        ('attendance: one day', Attendance.objects.filter(date=sample['date'])),
+        ('news_list', NewsArticle.objects.order_by('-published_date')[:9]),
+    ]
+
+
+SCAN_PATTERNS = {'sqlite': SQLITE_SCAN, 'postgresql': POSTGRES_SCAN}
+
+
+def full_scans(plan, vendor):
+    """Hot tables the plan reads without an index."""
+    return sorted({t for t in SCAN_PATTERNS[vendor].findall(plan) if t in HOT_TABLES})
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the portal view queries and fail if any of them falls back to a full table scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-seed', action='store_true', help='Explain against the existing data only.')
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--results', type=int, default=50000)
+        parser.add_argument('--verbose', action='store_true', help='Print every plan, not just failures.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SCAN_PATTERNS:
+            raise CommandError(f'EXPLAIN checks are not implemented for {connection.vendor}.')
+        self.verbose = options['verbose']
+        failures = []
+        try:
+            with transaction.atomic():
+                if not options['no_seed']:
+                    self.stdout.write(f"Seeding {options['students']} students / {options['results']} results (rolled back afterwards)...")
+                    _seed(options['students'], options['results'])
+                self._analyze()
+                sample = self._sample()
+                for label, queryset in portal_queries(sample):
+                    failures += self._check(label, queryset)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f'{len(failures)} query(ies) use a full table scan: ' + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All portal queries use indexes.'))
+
+    def _analyze(self):
+        # Refresh planner statistics so plans reflect the seeded size
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _sample(self):
+        student = Student.objects.exclude(current_class=None).order_by('?').first()
+        teacher = Teacher.objects.select_related('user').first()
+        term = Term.objects.order_by('-start_date').first()
+        if not (student and teacher and term):
+            raise CommandError('Need at least one student with a class, one teacher and one term; run without --no-seed.')
+        return {
+            'student': student,
+            'teacher': teacher,
+            'teacher_user': teacher.user,
+            'term': term,
+            'date': Attendance.objects.values_list('date', flat=True).first() or date.today(),
+        }
+
+    def _check(self, label, queryset):
+        plan = queryset.explain()
+        scans = full_scans(plan, connection.vendor)
+        if scans:
+            self.stdout.write(self.style.ERROR(f'FAIL  {label}: full scan of {", ".join(scans)}'))
+        else:
+            self.stdout.write(f'ok    {label}')
+        if self.verbose or scans:
+            for line in plan.splitlines():
+                self.stdout.write(f'        {line}')
+        return [label] if scans else []
+
+
+def _seed(n_students, n_results):
+    """Bulk-insert a school large enough for the planner to prefer indexes."""
+    rng = random.Random(42)
+    today = date.today()
+    session = AcademicSession.objects.create(name='Explain Session', start_date=today - timedelta(days=300), end_date=today)
+    terms = [
+        Term.objects.create(session=session, name=f'Term {i + 1}', start_date=today - timedelta(days=300 - 100 * i),
+                            end_date=today - timedelta(days=200 - 100 * i))
+        for i in range(3)
+    ]
+    classes = Class.objects.bulk_create([Class(name=f'Explain {i}') for i in range(40)])
+    subjects = Subject.objects.bulk_create([Subject(name=f'Explain Subject {i}', code=f'EX{i}') for i in range(12)])
+
+    teacher_users = User.objects.bulk_create([
+        User(username=f'explain-teacher-{i}', role=User.ROLE_TEACHER, password='!') for i in range(40)
+    ])
+    teachers = Teacher.objects.bulk_create([
+        Teacher(user=u, employee_id=f'EXPLAIN-T{i}') for i, u in enumerate(teacher_users)
+    ])
+    ClassSubject.objects.bulk_create([
+        ClassSubject(class_ref=c, subject=s, teacher=rng.choice(teachers)) for c in classes for s in subjects
+    ])
+
+    student_users = User.objects.bulk_create([
+        User(username=f'explain-student-{i}', role=User.ROLE_STUDENT, password='!') for i in range(n_students)
+    ], batch_size=1000)
+    students = Student.objects.bulk_create([
+        Student(user=u, student_id=f'EXPLAIN-S{i}', current_class=classes[i % len(classes)])
+        for i, u in enumerate(student_users)
+    ], batch_size=1000)
+
+    results, seen = [], set()
+    while len(results) < n_results and len(seen) < len(students) * len(subjects) * len(terms):
+        key = (rng.randrange(len(students)), rng.randrange(len(subjects)), rng.randrange(len(terms)))
+        if key in seen:
+            continue
+        seen.add(key)
+        results.append(Result(
+            student=students[key[0]], subject=subjects[key[1]], term=terms[key[2]],
+            score=rng.randint(0, 100), uploaded_by=rng.choice(teacher_users),
+            # Most results in a real database are long since approved
+            status=Result.STATUS_PENDING if rng.random() < 0.02 else Result.STATUS_APPROVED,
+        ))
+    Result.objects.bulk_create(results, batch_size=2000)
+
+    Announcement.objects.bulk_create([
+        Announcement(title=f'Explain {i}', content='-', date=today - timedelta(days=i % 700),
+                     scope=Announcement.SCOPE_CLASS if i % 3 else Announcement.SCOPE_SCHOOL,
+                     target_class=classes[i % len(classes)] if i % 3 else None)
+        for i in range(3000)
+    ], batch_size=1000)
+    AdmissionApplication.objects.bulk_create([
+        AdmissionApplication(first_name='Explain', last_name=str(i), email=f'explain{i}@example.com', phone='0',
+                             status=AdmissionApplication.STATUS_PENDING if i % 20 == 0 else AdmissionApplication.STATUS_APPROVED)
+        for i in range(5000)
+    ], batch_size=1000)
+    ContactMessage.objects.bulk_create([
+        ContactMessage(name='Explain', email='explain@example.com', subject=str(i), message='-', read=i % 25 != 0)
+        for i in range(5000)
+    ], batch_size=1000)
+    NewsArticle.objects.bulk_create([
+        NewsArticle(title=f'Explain {i}', slug=f'explain-{i}', content='-', published_date=today - timedelta(days=i))
+        for i in range(500)
+    ], batch_size=500)
+    Attendance.objects.bulk_create([
+        Attendance(student=s, date=today - timedelta(days=d), present=rng.random() > 0.05)
+        for s in students[:500] for d in range(60)
+    ], batch_size=2000)
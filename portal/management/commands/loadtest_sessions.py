@@ -0,0 +1,105 @@
+"""
+Load test for session and message storage: DB round trips per request.
+
+    python manage.py loadtest_sessions
+    python manage.py loadtest_sessions --requests 500 --concurrency 8
+
+Logs a student in once per worker thread and replays the student dashboard
+and results pages, first with the database session backend and fallback
+message storage (the Django defaults), then with the configured settings.
+Every query on each worker's connection is counted, split into session-table
+queries, other reads and writes. Uses the existing data: needs one student
+with a class.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from portal.models import Student, User
+
+DEFAULTS = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+}
+SESSION_TABLE = Session._meta.db_table
+
+
+class _Counter:
+    """connection.execute_wrapper that tallies queries by kind."""
+
+    def __init__(self):
+        self.session = self.reads = self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if SESSION_TABLE in sql:
+            self.session += 1
+        elif sql.lstrip().upper().startswith('SELECT'):
+            self.reads += 1
+        else:
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Measure DB round trips per request for the student pages under default vs configured session storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per page per mode (default 200).')
+        parser.add_argument('--concurrency', type=int, default=4, help='Worker threads (default 4).')
+
+    def handle(self, *args, **options):
+        user_id = Student.objects.exclude(current_class=None).values_list('user_id', flat=True).first()
+        if user_id is None:
+            raise CommandError('Need a student with a class; run seed data first.')
+        pages = [('student_dashboard', reverse('portal:student_dashboard')), ('my_results', reverse('portal:my_results'))]
+        modes = [
+            ('default (db sessions)', DEFAULTS),
+            (f'configured ({settings.SESSION_ENGINE.rsplit(".", 1)[-1]})', {
+                'SESSION_ENGINE': settings.SESSION_ENGINE, 'MESSAGE_STORAGE': settings.MESSAGE_STORAGE,
+            }),
+        ]
+        self.stdout.write(f"{'mode':28} {'page':18} {'req/s':>8} {'session':>8} {'reads':>6} {'writes':>7}  (per request)")
+        for label, overrides in modes:
+            with override_settings(ALLOWED_HOSTS=['testserver'], **overrides):
+                for page, url in pages:
+                    rate, counts = self._run(user_id, url, options['requests'], options['concurrency'])
+                    n = options['requests']
+                    self.stdout.write(
+                        f'{label:28} {page:18} {rate:>8.1f} {counts.session / n:>8.2f} '
+                        f'{counts.reads / n:>6.2f} {counts.writes / n:>7.2f}'
+                    )
+
+    def _run(self, user_id, url, total, concurrency):
+        user = User.objects.get(pk=user_id)
+        totals = _Counter()
+        lock = threading.Lock()
+        per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+
+        def worker(count):
+            client = Client()
+            client.force_login(user)
+            client.get(url)  # warm caches; not counted
+            counter = _Counter()
+            try:
+                with connection.execute_wrapper(counter):
+                    for _ in range(count):
+                        client.get(url)
+            finally:
+                connection.close()
+            with lock:
+                totals.session += counter.session
+                totals.reads += counter.reads
+                totals.writes += counter.writes
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, per_worker))
+        return total / (time.perf_counter() - started), totals
@@ -0,0 +1,67 @@
+"""
+Create student accounts in bulk from approved admissions or a roster sheet.
+
+    python manage.py onboard_students --applications --credentials logins.csv
+    python manage.py onboard_students --roster jss1.csv --class "JSS 1A" --workers 8
+
+Either every entry is created or, if any entry is invalid, none are and the
+errors are listed. The credentials sheet (student ID, username, one-time
+password) is written to --credentials; keep it safe and hand it out.
+"""
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import onboarding
+from portal.importers import ImportFormatError, iter_upload
+from portal.models import Class
+
+
+class Command(BaseCommand):
+    help = 'Create User + Student rows for approved admission applications or a roster CSV/XLSX.'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--applications', action='store_true', help='Approved applications without a student yet.')
+        source.add_argument('--roster', help='CSV or XLSX roster (first_name, last_name, class, ...).')
+        parser.add_argument('--class', dest='class_ref', help='Class (name or pk) for entries that name none.')
+        parser.add_argument('--credentials', default='-', help='CSV file for the login details (default: stdout).')
+        parser.add_argument('--workers', type=int, default=None, help='Hashing processes (default: CPU count; 0 hashes in-process).')
+
+    def handle(self, *args, **options):
+        class_ref = None
+        if options['class_ref']:
+            raw = options['class_ref']
+            class_ref = Class.objects.filter(pk=raw).first() if raw.isdecimal() else Class.objects.filter(name__iexact=raw).first()
+            if class_ref is None:
+                raise CommandError(f'Class "{raw}" does not exist.')
+
+        onboarder = onboarding.StudentOnboarder(class_ref=class_ref, workers=options['workers'])
+        try:
+            if options['applications']:
+                entries = onboarder.from_applications(onboarder.pending_applications())
+            else:
+                with open(options['roster'], 'rb') as f:
+                    entries = onboarder.from_rows(iter_upload(f))
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+        report = onboarder.run(entries)
+
+        if not report.ok:
+            for where, message in report.errors:
+                self.stderr.write(f'  {where}: {message}')
+            raise CommandError(f'{report.error_count} error(s); no students were created.')
+        if not report.created:
+            self.stdout.write('Nothing to onboard.')
+            return
+
+        if options['credentials'] == '-':
+            onboarding.write_credentials(csv.writer(sys.stdout), report.credentials)
+        else:
+            with open(options['credentials'], 'w', newline='', encoding='utf-8') as out:
+                onboarding.write_credentials(csv.writer(out), report.credentials)
+        self.stderr.write(self.style.SUCCESS(
+            f'{report.created} student(s) created: passwords hashed in {report.hash_seconds:.2f}s, '
+            f'rows written in {report.write_seconds:.2f}s.'
+        ))
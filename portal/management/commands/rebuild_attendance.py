@@ -0,0 +1,32 @@
+"""
+Rebuild the yearly attendance bitmaps and rollups from the daily rows.
+
+The register keeps them current; use this after loading Attendance rows
+outside the portal or after changing session dates:
+
+    python manage.py rebuild_attendance
+    python manage.py rebuild_attendance --session 3
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal import attendance
+from portal.models import AcademicSession
+
+
+class Command(BaseCommand):
+    help = 'Recompute AttendanceYear bitmaps and monthly rollups from Attendance rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', type=int, help='Only this academic session (pk).')
+
+    def handle(self, *args, **options):
+        sessions = AcademicSession.objects.order_by('start_date')
+        if options['session']:
+            sessions = sessions.filter(pk=options['session'])
+        for session in sessions:
+            started = time.perf_counter()
+            written = attendance.rebuild(session)
+            self.stdout.write(f'{session}: {written} student(s) in {time.perf_counter() - started:.2f}s')
+        self.stdout.write(self.style.SUCCESS('Attendance rollups rebuilt.'))
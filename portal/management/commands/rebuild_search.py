@@ -0,0 +1,42 @@
+"""
+Rebuild the full-text search entries from the students, news, announcements
+and admission applications, and the student/teacher picker keys.
+
+Saves keep the entries current; run this once after migrating, and after
+loading data outside the portal (bulk inserts skip the signal handlers):
+
+    python manage.py rebuild_search
+    python manage.py rebuild_search --kind student --kind news
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from portal import search, typeahead
+
+
+class Command(BaseCommand):
+    help = 'Recreate the SearchEntry rows (and with them the full-text index) and the PickerKey rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', dest='kinds', action='append',
+                            choices=sorted(set(search.KINDS.values()) | set(typeahead.SOURCES)),
+                            help='Only this kind; repeatable. Default: all.')
+
+    def handle(self, *args, **options):
+        wanted = options['kinds']
+        models = [m for m, kind in search.KINDS.items() if not wanted or kind in wanted]
+        pickers = [kind for kind in typeahead.SOURCES if not wanted or kind in wanted]
+        started = time.perf_counter()
+        with transaction.atomic():
+            counts = search.rebuild(models) if models else {}
+            people = typeahead.rebuild(pickers) if pickers else {}
+        for kind, count in counts.items():
+            self.stdout.write(f'  {kind}: {count}')
+        for kind, count in people.items():
+            self.stdout.write(f'  {kind} picker: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(counts.values())} search entries and picker keys for {sum(people.values())} people '
+            f'rebuilt in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,40 @@
+"""
+Rebuild TermReports and subject positions from approved results.
+
+Approvals keep reports current on their own; use this after importing data
+outside the portal or to backfill:
+
+    python manage.py recompute_reports
+    python manage.py recompute_reports --term 4 --class 12
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal import reports
+from portal.models import Result
+
+
+class Command(BaseCommand):
+    help = 'Recompute term reports (totals, averages, positions) for every class-term with approved results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', type=int, help='Only this term (pk).')
+        parser.add_argument('--class', dest='class_ref', type=int, help='Only this class (pk).')
+
+    def handle(self, *args, **options):
+        results = Result.objects.filter(status=Result.STATUS_APPROVED)
+        if options['term']:
+            results = results.filter(term_id=options['term'])
+        if options['class_ref']:
+            results = results.filter(student__current_class_id=options['class_ref'])
+        pairs = sorted((c, t) for c, t in reports.affected(results) if c is not None)
+
+        started = time.perf_counter()
+        written = 0
+        for class_id, term_id in pairs:
+            written += reports.recompute(class_id, term_id)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} report(s) for {len(pairs)} class-term(s) in {elapsed:.2f}s.'
+        ))
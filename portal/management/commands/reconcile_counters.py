@@ -0,0 +1,27 @@
+"""
+Recompute the dashboard counters from their tables and report any drift.
+
+Run periodically (e.g. nightly cron) to correct drift from raw SQL, bulk
+writes outside the portal, or crashes between a write and its counter bump:
+
+    python manage.py reconcile_counters
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from portal import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute maintained dashboard counters and correct drift.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changes = counters.recount()
+        for name, (old, new) in changes.items():
+            if old is None:
+                self.stdout.write(f'{name}: initialised to {new}')
+            elif old != new:
+                self.stdout.write(self.style.WARNING(f'{name}: corrected {old} -> {new} (drift {new - old:+d})'))
+            else:
+                self.stdout.write(f'{name}: {new}')
@@ -0,0 +1,50 @@
+"""
+Build responsive derivatives for existing news images and avatars.
+
+Uploads get their derivatives automatically; run this once for media that
+predates the pipeline, or with --force after changing widths or formats:
+
+    python manage.py regenerate_images
+    python manage.py regenerate_images --only news --force
+"""
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from portal import images
+from portal.models import NewsArticle, User
+
+
+class Command(BaseCommand):
+    help = 'Generate resized AVIF/WebP/JPEG derivatives for news images and avatars.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=['news', 'avatars'], help='Limit to one kind of image.')
+        parser.add_argument('--force', action='store_true', help='Rebuild manifests even when up to date.')
+
+    def handle(self, *args, **options):
+        targets = {'news': (NewsArticle, 'image'), 'avatars': (User, 'avatar')}
+        if options['only']:
+            targets = {options['only']: targets[options['only']]}
+        for label, (model, field) in targets.items():
+            started = time.perf_counter()
+            done = original_bytes = derived_bytes = 0
+            for instance in model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).iterator():
+                if options['force'] or images.is_stale(instance):
+                    images.process(instance)
+                    done += 1
+                variants = getattr(instance, images.FIELDS[model][1])
+                sources = variants.get('sources', {})
+                # Compare the original with the smallest-format derivative a mid-size screen picks
+                candidates = [entries[len(entries) // 2][1] for entries in sources.values() if entries]
+                if candidates:
+                    original_bytes += getattr(instance, field).size
+                    derived_bytes += min(default_storage.size(name) for name in candidates)
+            self.stdout.write(f'{label}: {done} processed in {time.perf_counter() - started:.2f}s')
+            if original_bytes:
+                self.stdout.write(
+                    f'  originals {original_bytes / 1024:.0f} KiB -> typical derivative '
+                    f'{derived_bytes / 1024:.0f} KiB ({100 * derived_bytes / original_bytes:.0f}%)'
+                )
+        self.stdout.write(self.style.SUCCESS('Image derivatives up to date.'))
@@ -0,0 +1,42 @@
+"""
+Run queued background jobs (see portal.jobs).
+
+    python manage.py runworker
+    python manage.py runworker --concurrency 4 --queue default
+    python manage.py runworker --burst        # drain the queue, then exit
+
+Runs until SIGINT/SIGTERM; jobs already started are finished first. Start
+as many workers as you like, on any host that reaches the database.
+"""
+import signal
+
+from django.core.management.base import BaseCommand
+
+from portal import jobs
+
+
+class Command(BaseCommand):
+    help = 'Claim and run queued background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', dest='queues', action='append', help='Queue to serve; repeatable. Default: all queues.')
+        parser.add_argument('--concurrency', type=int, default=2, help='Jobs run at once, each on its own thread (default 2).')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no job is ready (default 1).')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is ready.')
+
+    def handle(self, *args, **options):
+        worker = jobs.Worker(
+            queues=options['queues'], concurrency=max(options['concurrency'], 1),
+            poll_interval=options['poll_interval'], burst=options['burst'],
+        )
+
+        def stop(signum, frame):
+            self.stderr.write('Stopping after the running jobs finish...')
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        queues = ', '.join(options['queues']) if options['queues'] else 'all queues'
+        self.stdout.write(f"Worker {worker.name} serving {queues} with {worker.concurrency} thread(s).")
+        worker.run()
+        self.stdout.write(self.style.SUCCESS(f'{worker.succeeded} job(s) succeeded, {worker.failed} failed.'))
@@ -0,0 +1,343 @@
+"""
+Fill the database with a synthetic school at production scale, for load
+tests and benchmarks (see bench_suite).
+
+    python manage.py seed_school                      # 100 classes, 50,000 students
+    python manage.py seed_school --students 5000 --classes 20 --attendance-days 20
+
+Creates --sessions academic sessions of three terms ending with the current
+one, JSS 1-SS 3 classes with --subjects subjects each, a teacher for every
+few class-subjects, and --students students spread over the classes. Every
+student gets a result per subject for every term that has started (the
+latest term partly still pending) and an attendance mark for each of the
+last --attendance-days school days. Announcements, admission applications,
+contact messages and news articles make up the rest.
+
+Everything is written with bulk inserts in one transaction (plain
+executemany for results and attendance, the bulk of the rows). The derived
+data the signals would normally maintain (term reports and positions,
+attendance bitmaps, search entries and picker keys, dashboard counters) is
+then rebuilt from it. Run it on an empty database: it refuses to seed twice.
+All seeded users share the --password; usernames are printed at the end.
+"""
+import random
+import time
+from datetime import date, datetime, time as clock, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from portal import attendance, counters, reports, search, typeahead
+from portal.models import (
+    AcademicSession, AdmissionApplication, Announcement, Attendance, Class, ClassSubject, ContactMessage,
+    NewsArticle, Result, Student, Subject, Teacher, Term, User,
+)
+
+ADMIN_USERNAME = 'seed-admin'
+LEVELS = ['JSS 1', 'JSS 2', 'JSS 3', 'SS 1', 'SS 2', 'SS 3']
+SUBJECTS = [
+    ('Mathematics', 'MTH'), ('English Language', 'ENG'), ('Basic Science', 'BSC'), ('Civic Education', 'CIV'),
+    ('Biology', 'BIO'), ('Chemistry', 'CHM'), ('Physics', 'PHY'), ('Economics', 'ECO'), ('Geography', 'GEO'),
+    ('Literature in English', 'LIT'), ('Government', 'GOV'), ('Computer Studies', 'CMP'), ('Agricultural Science', 'AGR'),
+    ('French', 'FRE'), ('Further Mathematics', 'FMT'), ('Fine Art', 'ART'),
+]
+# (name, start month, start day, end month, end day) within a September-July session
+TERMS = [('First Term', 9, 8, 12, 15), ('Second Term', 1, 8, 4, 5), ('Third Term', 4, 22, 7, 20)]
+FIRST_NAMES = [
+    'Adaeze', 'Chinedu', 'Ngozi', 'Emeka', 'Aisha', 'Ibrahim', 'Funmilayo', 'Tunde', 'Blessing', 'Samuel',
+    'Grace', 'David', 'Fatima', 'Yusuf', 'Chiamaka', 'Olumide', 'Esther', 'Daniel', 'Zainab', 'Kelechi',
+    'Amaka', 'Segun', 'Halima', 'Joseph', 'Ifeoma', 'Musa', 'Temitope', 'Peter', 'Hauwa', 'Obinna',
+]
+LAST_NAMES = [
+    'Okafor', 'Adeyemi', 'Bello', 'Eze', 'Ogunleye', 'Abubakar', 'Nwosu', 'Balogun', 'Okonkwo', 'Ibrahim',
+    'Adebayo', 'Mohammed', 'Chukwu', 'Olawale', 'Usman', 'Obi', 'Akinola', 'Suleiman', 'Nnamdi', 'Afolabi',
+    'Okeke', 'Lawal', 'Onyeka', 'Adekunle', 'Garba', 'Ezeh', 'Oyelaran', 'Danjuma', 'Uche', 'Babatunde',
+]
+BATCH_SIZE = 5000
+PENDING_SHARE = 0.1  # of the latest term's results, still awaiting approval
+
+
+def _chunks(objects, size=BATCH_SIZE):
+    objects = iter(objects)
+    while chunk := list(islice(objects, size)):
+        yield chunk
+
+
+def _bulk(model, objects):
+    """bulk_create ``objects`` (any iterable) a chunk at a time; returns the number of rows."""
+    rows = 0
+    for chunk in _chunks(objects):
+        model.objects.bulk_create(chunk, batch_size=BATCH_SIZE)
+        rows += len(chunk)
+    return rows
+
+
+def _insert(model, fields, rows):
+    """
+    INSERT ``rows`` (tuples of database values for ``fields``) with executemany,
+    a chunk at a time; returns the number of rows. bulk_create builds a model
+    instance per row and on SQLite sends only 999 parameters per statement;
+    for the millions of results and attendance marks plain tuples are several
+    times faster.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    sql = f"INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({', '.join(['%s'] * len(fields))})"
+    count = 0
+    with connection.cursor() as cursor:
+        for chunk in _chunks(rows):
+            cursor.executemany(sql, chunk)
+            count += len(chunk)
+    return count
+
+
+def _ranks(values):
+    """{value: rank} with the highest value first and ties sharing a rank, like SQL RANK()."""
+    ranks = {}
+    for position, value in enumerate(sorted(values, reverse=True), start=1):
+        ranks.setdefault(value, position)
+    return ranks
+
+
+def _aware(day, hour=9):
+    return timezone.make_aware(datetime.combine(day, clock(hour)))
+
+
+def _school_days(terms, count, today):
+    """The last ``count`` weekdays inside the given terms, up to today, oldest first."""
+    days = []
+    for term in sorted(terms, key=lambda t: t.start_date, reverse=True):
+        day = min(term.end_date, today)
+        while day >= term.start_date and len(days) < count:
+            if day.weekday() < 5:
+                days.append(day)
+            day -= timedelta(days=1)
+    return sorted(days)
+
+
+class Command(BaseCommand):
+    help = 'Bulk-insert a synthetic school (classes, students, results, attendance, ...) for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=50000)
+        parser.add_argument('--classes', type=int, default=100)
+        parser.add_argument('--subjects', type=int, default=10, help=f'Subjects per class (at most {len(SUBJECTS)}).')
+        parser.add_argument('--sessions', type=int, default=2, help='Academic sessions, ending with the current one.')
+        parser.add_argument('--attendance-days', type=int, default=40,
+                            help='Most recent school days with attendance marked (default 40).')
+        parser.add_argument('--announcements', type=int, default=2000)
+        parser.add_argument('--applications', type=int, default=3000)
+        parser.add_argument('--password', default='seed-password', help='Password of every seeded user.')
+        parser.add_argument('--seed', type=int, default=2024, help='Random seed (default 2024).')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username=ADMIN_USERNAME).exists():
+            raise CommandError('This database is already seeded; run seed_school on a fresh database.')
+        if not 1 <= options['subjects'] <= len(SUBJECTS):
+            raise CommandError(f'--subjects must be between 1 and {len(SUBJECTS)}.')
+        if options['students'] < 1 or options['classes'] < 1 or options['sessions'] < 1:
+            raise CommandError('--students, --classes and --sessions must be at least 1.')
+        self.rng = random.Random(options['seed'])
+        self.today = timezone.localdate()
+        self.password = make_password(options['password'])
+        started = time.perf_counter()
+        with transaction.atomic():
+            self._step('sessions and terms', self._calendar, options['sessions'])
+            self._step('classes and subjects', self._classes, options['classes'], options['subjects'])
+            self._step('teachers', self._teachers)
+            self._step('students', self._students, options['students'])
+            self._step('results', self._results)
+            self._step('attendance', self._attendance, options['attendance_days'])
+            self._step('announcements, applications, messages, news', self._notices,
+                       options['announcements'], options['applications'])
+            # bulk_create skips the signal handlers, so rebuild what they maintain
+            self._step('term reports', self._reports)
+            self._step('attendance rollups', self._rollups)
+            self._step('search index and picker keys', self._search)
+            self._step('dashboard counters', lambda: len(counters.recount()))
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.perf_counter() - started:.1f}s.'))
+        self.stdout.write(
+            f"Log in as {ADMIN_USERNAME}, {self.teachers[0].user.username} or {self.sample_student} "
+            f"with password {options['password']!r}."
+        )
+
+    def _step(self, label, func, *args):
+        started = time.perf_counter()
+        rows = func(*args)
+        self.stdout.write(f'{label:48} {rows:>10,} rows {time.perf_counter() - started:>8.1f}s')
+
+    def _calendar(self, n_sessions):
+        first_year = self.today.year if self.today.month >= 9 else self.today.year - 1
+        self.sessions, self.terms = [], []
+        for year in range(first_year - n_sessions + 1, first_year + 1):
+            session = AcademicSession.objects.create(
+                name=f'{year}/{year + 1}', start_date=date(year, 9, 1), end_date=date(year + 1, 7, 31),
+                is_current=year == first_year,
+            )
+            self.sessions.append(session)
+            for name, start_month, start_day, end_month, end_day in TERMS:
+                start_year = year if start_month >= 9 else year + 1
+                end_year = year if end_month >= 9 else year + 1
+                self.terms.append(Term.objects.create(
+                    session=session, name=name, start_date=date(start_year, start_month, start_day),
+                    end_date=date(end_year, end_month, end_day),
+                ))
+        return len(self.sessions) + len(self.terms)
+
+    def _classes(self, n_classes, n_subjects):
+        self.classes = Class.objects.bulk_create([
+            Class(name=f'{LEVELS[i % len(LEVELS)]}{_arm(i // len(LEVELS))}') for i in range(n_classes)
+        ])
+        self.subjects = Subject.objects.bulk_create([Subject(name=name, code=code) for name, code in SUBJECTS[:n_subjects]])
+        return len(self.classes) + len(self.subjects)
+
+    def _teachers(self):
+        # Each teacher takes one subject in about eight classes
+        per_subject = max(1, len(self.classes) // 8)
+        users = User.objects.bulk_create([
+            User(username=f'seed-t{n:04d}', password=self.password, role=User.ROLE_TEACHER,
+                 first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+                 email=f'seed-t{n:04d}@example.com')
+            for n in range(per_subject * len(self.subjects))
+        ], batch_size=BATCH_SIZE)
+        self.teachers = Teacher.objects.bulk_create([
+            Teacher(user=user, employee_id=f'SEED-T{n:04d}') for n, user in enumerate(users)
+        ], batch_size=BATCH_SIZE)
+        by_subject = {s.pk: self.teachers[i * per_subject:(i + 1) * per_subject] for i, s in enumerate(self.subjects)}
+        Teacher.subjects.through.objects.bulk_create([
+            Teacher.subjects.through(teacher_id=t.pk, subject_id=subject_id)
+            for subject_id, teachers in by_subject.items() for t in teachers
+        ], batch_size=BATCH_SIZE)
+        assignments = ClassSubject.objects.bulk_create([
+            ClassSubject(class_ref=c, subject=s, teacher=by_subject[s.pk][i % per_subject])
+            for i, c in enumerate(self.classes) for s in self.subjects
+        ], batch_size=BATCH_SIZE)
+        # Who uploads each class-subject's results
+        self.uploader = {(a.class_ref_id, a.subject_id): a.teacher.user_id for a in assignments}
+        User.objects.create(username=ADMIN_USERNAME, password=self.password, role=User.ROLE_ADMIN,
+                            first_name='School', last_name='Administrator', is_staff=True)
+        return len(users) + len(assignments) + 1
+
+    def _students(self, n_students):
+        rng, joined = self.rng, _aware(self.sessions[0].start_date)
+        users = User.objects.bulk_create([
+            User(username=f'seed-s{n:06d}', password=self.password, role=User.ROLE_STUDENT,
+                 first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES), date_joined=joined)
+            for n in range(n_students)
+        ], batch_size=BATCH_SIZE)
+        self.students = Student.objects.bulk_create([
+            Student(user=user, student_id=f'SEED{n:06d}', current_class=self.classes[n % len(self.classes)],
+                    parent_contact=f'080{rng.randrange(10 ** 8):08d}',
+                    date_of_birth=date(self.today.year - rng.randint(10, 18), rng.randint(1, 12), rng.randint(1, 28)))
+            for n, user in enumerate(users)
+        ], batch_size=BATCH_SIZE)
+        self.sample_student = users[0].username
+        # A steady ability per student, so averages and positions spread out like real ones
+        self.ability = [rng.gauss(60, 12) for _ in self.students]
+        return len(users) * 2
+
+    def _results(self):
+        terms = [t for t in self.terms if t.start_date <= self.today]
+        latest = terms[-1] if terms else None
+        difficulty = {s.pk: self.rng.uniform(-8, 8) for s in self.subjects}
+        rng, ops = self.rng, connection.ops
+        # Scores are whole tenths, so every possible value is adapted once
+        scores = [ops.adapt_decimalfield_value(Decimal(tenths) / 10, 5, 2) for tenths in range(1001)]
+        rolls = {}
+        for student, ability in zip(self.students, self.ability):
+            rolls.setdefault(student.current_class_id, []).append((student.pk, ability))
+
+        def rows():
+            for term in terms:
+                approved_at = _aware(min(term.end_date, self.today), hour=15)
+                created = ops.adapt_datetimefield_value(approved_at - timedelta(days=7))
+                approved = ops.adapt_datetimefield_value(approved_at)
+                for class_id, roll in rolls.items():
+                    for subject in self.subjects:
+                        uploader = self.uploader[class_id, subject.pk]
+                        marks = [
+                            (student_id, min(1000, max(0, round(rng.gauss(ability + difficulty[subject.pk], 9) * 10))),
+                             term is latest and rng.random() < PENDING_SHARE)
+                            for student_id, ability in roll
+                        ]
+                        # Positions as reports.recompute ranks them, so it has none to correct
+                        positions = _ranks([tenths for _, tenths, pending in marks if not pending])
+                        for student_id, tenths, pending in marks:
+                            yield (student_id, subject.pk, term.pk, scores[tenths], uploader,
+                                   Result.STATUS_PENDING if pending else Result.STATUS_APPROVED, created,
+                                   None if pending else approved, None if pending else positions[tenths])
+        return _insert(Result, ['student', 'subject', 'term', 'score', 'uploaded_by', 'status', 'created_at',
+                                'approved_at', 'subject_position'], rows())
+
+    def _attendance(self, n_days):
+        days = [connection.ops.adapt_datefield_value(day) for day in _school_days(self.terms, n_days, self.today)]
+        rng = self.rng
+
+        def rows():
+            for student in self.students:
+                # Most students are almost always in; a few miss school often
+                rate = 0.97 if rng.random() < 0.9 else rng.uniform(0.6, 0.9)
+                for day in days:
+                    present = rng.random() < rate
+                    yield student.pk, day, present, '' if present else rng.choice(['', '', 'Sick', 'Travelled'])
+        return _insert(Attendance, ['student', 'date', 'present', 'remarks'], rows())
+
+    def _notices(self, n_announcements, n_applications):
+        rng, start = self.rng, self.sessions[0].start_date
+        span = max((self.today - start).days, 1)
+        admin = User.objects.get(username=ADMIN_USERNAME)
+        rows = _bulk(Announcement, (
+            Announcement(
+                title=f'{rng.choice(["Reminder", "Notice", "Update", "Event"])}: {rng.choice(SUBJECTS)[0]} {n}',
+                content='Parents and students should note the following arrangements for the coming week.',
+                date=start + timedelta(days=rng.randrange(span)),
+                scope=Announcement.SCOPE_CLASS if n % 3 else Announcement.SCOPE_SCHOOL,
+                target_class=rng.choice(self.classes) if n % 3 else None, created_by=admin,
+            )
+            for n in range(n_announcements)
+        ))
+        rows += _bulk(AdmissionApplication, (
+            AdmissionApplication(
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                email=f'applicant{n}@example.com', phone=f'080{rng.randrange(10 ** 8):08d}',
+                applying_class=rng.choice(self.classes), guardian_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                status=AdmissionApplication.STATUS_PENDING if n % 10 == 0 else AdmissionApplication.STATUS_APPROVED,
+                submitted_at=_aware(start + timedelta(days=rng.randrange(span))),
+            )
+            for n in range(n_applications)
+        ))
+        rows += _bulk(ContactMessage, (
+            ContactMessage(name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', email=f'parent{n}@example.com',
+                           subject='Enquiry about fees', message='Please send details of the fees for next term.',
+                           read=n % 20 != 0, submitted_at=_aware(start + timedelta(days=rng.randrange(span))))
+            for n in range(n_applications // 3)
+        ))
+        rows += _bulk(NewsArticle, (
+            NewsArticle(title=f'School news {n}', slug=f'seed-news-{n}', excerpt='Highlights from the school.',
+                        content='Students and staff came together for another successful event at the school.',
+                        published_date=self.today - timedelta(days=n * 2))
+            for n in range(300)
+        ))
+        return rows
+
+    def _reports(self):
+        started = [t.pk for t in self.terms if t.start_date <= self.today]
+        return sum(reports.recompute(c.pk, term_id) for term_id in started for c in self.classes)
+
+    def _rollups(self):
+        return sum(attendance.rebuild(session) for session in self.sessions)
+
+    def _search(self):
+        return sum(search.rebuild().values()) + sum(typeahead.rebuild().values())
+
+
+def _arm(n):
+    """Class arm suffix: A-Z, then A1, B1, ..."""
+    letter, cycle = chr(ord('A') + n % 26), n // 26
+    return letter + (str(cycle) if cycle else '')
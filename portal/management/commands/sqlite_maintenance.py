@@ -0,0 +1,47 @@
+"""
+Checkpoint the SQLite write-ahead log into the database file and refresh the
+query planner statistics. Schedule it every few minutes (cron, or Render's
+cron jobs) when the portal runs on SQLite:
+
+    python manage.py sqlite_maintenance
+    python manage.py sqlite_maintenance --mode PASSIVE --no-optimize
+
+TRUNCATE (the default) waits up to busy_timeout for writers, copies the
+whole WAL back and truncates the file to zero bytes. PASSIVE copies what it
+can without waiting. Does nothing on other databases.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from portal import sqlite
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint the SQLite WAL and run PRAGMA optimize.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--mode', default='TRUNCATE', choices=sqlite.CHECKPOINT_MODES)
+        parser.add_argument('--no-optimize', dest='optimize', action='store_false',
+                            help='Skip PRAGMA optimize.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            self.stdout.write(f"{options['database']} is not SQLite; nothing to do.")
+            return
+        if sqlite.pragma(connection, 'journal_mode').lower() != 'wal':
+            raise CommandError('The database is not in WAL mode; check SQLITE_PRAGMAS.')
+        started = time.perf_counter()
+        before = sqlite.wal_size(connection)
+        busy, wal_pages, copied = sqlite.checkpoint(connection, options['mode'])
+        if options['optimize']:
+            sqlite.optimize(connection)
+        self.stdout.write(
+            f'WAL {before / 2 ** 20:.1f} MiB -> {sqlite.wal_size(connection) / 2 ** 20:.1f} MiB; '
+            f'{copied} of {wal_pages} pages checkpointed'
+            + (' (blocked by an open reader or writer)' if busy else '')
+        )
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.2f}s.'))
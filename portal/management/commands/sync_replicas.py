@@ -0,0 +1,43 @@
+"""
+Copy the primary SQLite database onto the SQLite replicas, for trying the
+primary/replica router locally without a replicating server:
+
+    DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3 python manage.py sync_replicas
+
+Run it again whenever the replica should catch up; in between, the replica
+lags like a real one. Replicas on PostgreSQL or MySQL are kept current by the
+database's own replication and are left alone.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from portal.replicas import replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto every SQLite replica (local testing).'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        # By vendor, not ENGINE: the default SQLite engine is portal.backends.sqlite3
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('The primary database is not SQLite; replication is the database server\'s job.')
+        targets = [alias for alias in replicas() if connections[alias].vendor == 'sqlite']
+        if not targets:
+            raise CommandError('No SQLite replicas configured (set DATABASE_REPLICA_URLS).')
+        source = sqlite3.connect(str(primary['NAME']))
+        try:
+            for alias in targets:
+                connections[alias].close()
+                target = sqlite3.connect(str(settings.DATABASES[alias]['NAME']))
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"  {alias}: {settings.DATABASES[alias]['NAME']}")
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Copied {primary["NAME"]} to {len(targets)} replica(s).'))
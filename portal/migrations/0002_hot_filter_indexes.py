@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='admissionapplication',
+            index=models.Index(fields=['status', '-submitted_at'], name='admission_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['-date', '-created_at'], name='announcement_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['scope', '-date'], name='announcement_scope_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['target_class', '-date'], name='announcement_class_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'present'], name='attendance_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(condition=models.Q(('read', False)), fields=['-submitted_at'], name='contact_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsarticle',
+            index=models.Index(fields=['-published_date'], name='news_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['term', 'student'], name='result_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['student', 'status', 'term'], name='result_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['uploaded_by', 'status'], name='result_uploader_status_idx'),
+        ),
+    ]
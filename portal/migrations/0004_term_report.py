@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0003_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='subject_position',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TermReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('average', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('subject_count', models.PositiveIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('class_size', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('class_ref', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_reports', to='portal.class')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_reports', to='portal.student')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='portal.term')),
+            ],
+            options={
+                'ordering': ['term', 'class_ref', 'position'],
+                'indexes': [models.Index(fields=['term', 'class_ref', 'position'], name='termreport_ranking_idx')],
+                'unique_together': {('student', 'term')},
+            },
+        ),
+    ]
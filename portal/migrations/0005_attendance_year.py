@@ -0,0 +1,110 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:33
+
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copies of the bitmap helpers in portal.attendance as of this
+# migration, so later changes to the app code cannot change what it writes.
+
+def calendar(session):
+    terms = list(session.terms.values_list('pk', 'start_date', 'end_date'))
+    return session.start_date, session.end_date, terms
+
+
+def _span(cal):
+    return (cal[1] - cal[0]).days + 1
+
+
+def _count(bits, start, stop):
+    if stop <= start:
+        return 0
+    return ((bits >> start) & ((1 << (stop - start)) - 1)).bit_count()
+
+
+def _rollups(cal, marked, present):
+    start, end, terms = cal
+    span = _span(cal)
+    months = {}
+    month = start.replace(day=1)
+    while month <= end:
+        following = (month + timedelta(days=32)).replace(day=1)
+        lo, hi = max((month - start).days, 0), min((following - start).days, span)
+        days = _count(marked, lo, hi)
+        if days:
+            months[month.strftime('%Y-%m')] = [days, _count(present, lo, hi)]
+        month = following
+    term_counts = {}
+    for term_pk, term_start, term_end in terms:
+        lo, hi = max((term_start - start).days, 0), min((term_end - start).days + 1, span)
+        term_counts[str(term_pk)] = [_count(marked, lo, hi), _count(present, lo, hi)]
+    return {'months': months, 'terms': term_counts}
+
+
+def year_fields(cal, days):
+    start, end, _ = cal
+    marked = present = 0
+    for on_date, is_present in days:
+        if start <= on_date <= end:
+            bit = 1 << (on_date - start).days
+            marked |= bit
+            if is_present:
+                present |= bit
+    size = (_span(cal) + 7) // 8
+    return {
+        'marked': marked.to_bytes(size, 'little'),
+        'present': present.to_bytes(size, 'little'),
+        'days_marked': marked.bit_count(),
+        'days_present': present.bit_count(),
+        'rollups': _rollups(cal, marked, present),
+    }
+
+
+def backfill(apps, schema_editor):
+    """One AttendanceYear per student per session from the existing Attendance rows."""
+    AcademicSession = apps.get_model('portal', 'AcademicSession')
+    Attendance = apps.get_model('portal', 'Attendance')
+    AttendanceYear = apps.get_model('portal', 'AttendanceYear')
+    for session in AcademicSession.objects.all():
+        cal = calendar(session)
+        rows = Attendance.objects.filter(
+            date__range=(session.start_date, session.end_date),
+        ).order_by('student_id').values_list('student_id', 'date', 'present')
+        years = [
+            AttendanceYear(student_id=student_id, session=session,
+                           **year_fields(cal, ((on_date, present) for _, on_date, present in group)))
+            for student_id, group in groupby(rows.iterator(chunk_size=5000), key=itemgetter(0))
+        ]
+        AttendanceYear.objects.bulk_create(years, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_term_report'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marked', models.BinaryField(default=b'')),
+                ('present', models.BinaryField(default=b'')),
+                ('days_marked', models.PositiveIntegerField(default=0)),
+                ('days_present', models.PositiveIntegerField(default=0)),
+                ('rollups', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_years', to='portal.academicsession')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_years', to='portal.student')),
+            ],
+            options={
+                'unique_together': {('student', 'session')},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0005_attendance_year'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsarticle',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admissionapplication',
+            name='student',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='application', to='portal.student'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Full-text index over portal_searchentry (see portal/search.py). SQLite: an
+# external-content FTS5 table kept in step by triggers. PostgreSQL: a
+# generated tsvector column with a GIN index. Other databases get neither and
+# fall back to icontains.
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE portal_searchentry_fts USING fts5(
+        title, body, content='portal_searchentry', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER portal_searchentry_ai AFTER INSERT ON portal_searchentry BEGIN
+        INSERT INTO portal_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER portal_searchentry_ad AFTER DELETE ON portal_searchentry BEGIN
+        INSERT INTO portal_searchentry_fts(portal_searchentry_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER portal_searchentry_au AFTER UPDATE ON portal_searchentry BEGIN
+        INSERT INTO portal_searchentry_fts(portal_searchentry_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO portal_searchentry_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS portal_searchentry_au',
+    'DROP TRIGGER IF EXISTS portal_searchentry_ad',
+    'DROP TRIGGER IF EXISTS portal_searchentry_ai',
+    'DROP TABLE IF EXISTS portal_searchentry_fts',
+]
+POSTGRES_FORWARD = [
+    """ALTER TABLE portal_searchentry ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED""",
+    'CREATE INDEX portal_searchentry_vector_idx ON portal_searchentry USING GIN (search_vector)',
+]
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS portal_searchentry_vector_idx',
+    'ALTER TABLE portal_searchentry DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0010_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('student', 'Student'), ('news', 'News'), ('announcement', 'Announcement'), ('application', 'Application')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=300)),
+                ('body', models.TextField(blank=True)),
+                ('url', models.CharField(blank=True, max_length=300)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_ref', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='portal.class')),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
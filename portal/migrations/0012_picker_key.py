@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0011_search_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PickerKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('student', 'Student'), ('teacher', 'Teacher')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('key', models.CharField(max_length=100)),
+                ('label', models.CharField(max_length=200)),
+                ('class_ref', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='portal.class')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'key'], name='portal_pickerkey_prefix', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']), models.Index(fields=['kind', 'object_id'], name='portal_pickerkey_object')],
+            },
+        ),
+    ]
@@ -18,6 +18,7 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default=ROLE_STUDENT)
     phone = models.CharField(max_length=20, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     @property
     def is_portal_admin(self):
@@ -128,15 +129,46 @@ class Result(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
     created_at = models.DateTimeField(default=timezone.now)
     approved_at = models.DateTimeField(null=True, blank=True)
+    # Rank within (class, term, subject) among approved results; kept by portal.reports
+    subject_position = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         unique_together = ['student', 'subject', 'term']
         ordering = ['-term', 'student', 'subject']
+        indexes = [
+            # Approval queue and dashboard count only ever look at pending rows
+            models.Index(fields=['term', 'student'], condition=models.Q(status='pending'), name='result_pending_idx'),
+            models.Index(fields=['student', 'status', 'term'], name='result_student_status_idx'),
+            models.Index(fields=['uploaded_by', 'status'], name='result_uploader_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student} - {self.subject} - {self.term}"
 
 
+class TermReport(models.Model):
+    """Per-student, per-term aggregate of approved results (see portal.reports)."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='term_reports')
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name='reports')
+    class_ref = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='term_reports')
+    total = models.DecimalField(max_digits=8, decimal_places=2)
+    average = models.DecimalField(max_digits=5, decimal_places=2)
+    subject_count = models.PositiveIntegerField()
+    position = models.PositiveIntegerField()
+    class_size = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'term']
+        ordering = ['term', 'class_ref', 'position']
+        indexes = [
+            models.Index(fields=['term', 'class_ref', 'position'], name='termreport_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.term}"
+
+
 class Announcement(models.Model):
     SCOPE_SCHOOL = 'school'
     SCOPE_CLASS = 'class'
@@ -154,6 +186,11 @@ class Announcement(models.Model):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['-date', '-created_at'], name='announcement_date_idx'),
+            models.Index(fields=['scope', '-date'], name='announcement_scope_date_idx'),
+            models.Index(fields=['target_class', '-date'], name='announcement_class_date_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -180,9 +217,13 @@ class AdmissionApplication(models.Model):
     submitted_at = models.DateTimeField(default=timezone.now)
     reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_applications')
     reviewed_at = models.DateTimeField(null=True, blank=True)
+    student = models.OneToOneField(Student, on_delete=models.SET_NULL, null=True, blank=True, related_name='application')
 
     class Meta:
         ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['status', '-submitted_at'], name='admission_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -198,6 +239,9 @@ class ContactMessage(models.Model):
 
     class Meta:
         ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['-submitted_at'], condition=models.Q(read=False), name='contact_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.subject} from {self.name}"
@@ -209,11 +253,16 @@ class NewsArticle(models.Model):
     excerpt = models.CharField(max_length=300, blank=True)
     content = models.TextField()
     image = models.ImageField(upload_to='news/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     published_date = models.DateField(default=timezone.now)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-published_date']
+        indexes = [
+            models.Index(fields=['-published_date'], name='news_published_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -228,6 +277,170 @@ class Attendance(models.Model):
     class Meta:
         unique_together = ['student', 'date']
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'present'], name='attendance_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student} - {self.date}"
+
+
+class AttendanceYear(models.Model):
+    """
+    A student's attendance for one academic session as two bitmaps (bit i =
+    session start + i days): days marked and days present. Monthly
+    [marked, present] counts are kept alongside (see portal.attendance);
+    remarks stay on the Attendance rows.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_years')
+    session = models.ForeignKey(AcademicSession, on_delete=models.CASCADE, related_name='attendance_years')
+    marked = models.BinaryField(default=b'')
+    present = models.BinaryField(default=b'')
+    days_marked = models.PositiveIntegerField(default=0)
+    days_present = models.PositiveIntegerField(default=0)
+    rollups = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'session']
+
+    def __str__(self):
+        return f"{self.student} - {self.session}"
+
+
+class Counter(models.Model):
+    """Named running total kept in step with the data (see portal.counters)."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class Notification(models.Model):
+    """One event for one user; emailed in a digest (see portal.notifications)."""
+    KIND_RESULTS = 'results'
+    KIND_ANNOUNCEMENT = 'announcement'
+    KIND_CHOICES = [
+        (KIND_RESULTS, 'Results'),
+        (KIND_ANNOUNCEMENT, 'Announcement'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Set by the delivery run sending this row, so concurrent runs skip it
+    claimed_by = models.CharField(max_length=32, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Delivery walks the undelivered rows user by user
+            models.Index(fields=['user', 'created_at'], condition=models.Q(sent_at__isnull=True), name='notification_unsent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.title}"
+
+
+class SearchEntry(models.Model):
+    """Searchable text of one object, indexed by the database's full-text engine (see portal.search)."""
+    KIND_STUDENT = 'student'
+    KIND_NEWS = 'news'
+    KIND_ANNOUNCEMENT = 'announcement'
+    KIND_APPLICATION = 'application'
+    KIND_CHOICES = [
+        (KIND_STUDENT, 'Student'),
+        (KIND_NEWS, 'News'),
+        (KIND_ANNOUNCEMENT, 'Announcement'),
+        (KIND_APPLICATION, 'Application'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=300)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=300, blank=True)
+    # The student's class, or the class a class-specific announcement is for
+    class_ref = models.ForeignKey(Class, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['kind', 'object_id']
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
+
+
+class Job(models.Model):
+    """A queued call to a registered task, run by ``manage.py runworker`` (see portal.jobs)."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(max_length=50, default='default')
+    priority = models.SmallIntegerField(default=100, help_text='Lower runs first.')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    timeout = models.PositiveIntegerField(default=300, help_text='Seconds a claim lasts before another worker may retry the job.')
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    key = models.CharField(max_length=100, blank=True, help_text='At most one queued job per non-empty key.')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The claim query: ready jobs of a queue in priority order
+            models.Index(fields=['status', 'queue', 'priority', 'run_at'], name='job_claim_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_expired_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status='queued') & ~models.Q(key=''), name='job_queued_key_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+
+class PickerKey(models.Model):
+    """
+    One lower-cased word (name, username or ID) of a student or teacher, for
+    typeahead pickers: prefix lookups are index range scans (see portal.typeahead).
+    """
+    KIND_STUDENT = 'student'
+    KIND_TEACHER = 'teacher'
+    KIND_CHOICES = [(KIND_STUDENT, 'Student'), (KIND_TEACHER, 'Teacher')]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    key = models.CharField(max_length=100)
+    label = models.CharField(max_length=200)
+    class_ref = models.ForeignKey(Class, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL serve LIKE 'abc%' from it; elsewhere a plain index
+            models.Index(fields=['kind', 'key'], name='portal_pickerkey_prefix', opclasses=['varchar_pattern_ops'] * 2),
+            models.Index(fields=['kind', 'object_id'], name='portal_pickerkey_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.key} -> {self.label}"
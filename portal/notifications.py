@@ -0,0 +1,206 @@
+"""
+Notifications: recorded per recipient, emailed as digests.
+
+An event (results approved, announcement published) becomes one Notification
+row per recipient, written with batched INSERTs by a queued job (see
+portal.jobs). The request that raised the event only adds the Job row.
+Delivery is a second job, run NOTIFICATION_DIGEST_DELAY seconds after the
+first undelivered notification. By then a user's events have usually piled
+up, and each user gets one email listing them all. The emails go out in
+batches of DELIVERY_BATCH over one SMTP connection held open for the whole
+run, rather than a connect/login/quit per message. A retried delivery resends
+only the batches that were not marked sent.
+
+Every step is safe to repeat or overlap. ``record()`` writes all of an
+event's rows in one transaction, so a retried job does not add them twice.
+At most one delivery job waits in the queue (a unique job key). Each run
+claims a batch's rows with one conditional UPDATE before sending it, so two
+runs, or one reclaimed after its timeout, never email the same rows.
+
+Applicants have no account yet, so admission decisions are emailed directly.
+"""
+import logging
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .jobs import task
+from .models import AdmissionApplication, Announcement, ClassSubject, Notification, Student, Term, User
+
+logger = logging.getLogger(__name__)
+
+RECORD_BATCH = 1000
+DELIVERY_BATCH = 100  # users (so emails) per send_messages() call
+CLAIM_TIMEOUT = 10 * 60  # seconds a run holds a batch before another run may send it
+DELIVER_KEY = 'notifications.deliver'
+BODY_LENGTH = 500
+
+
+# --- Recording ------------------------------------------------------------------
+
+@transaction.atomic
+def record(user_ids, kind, title, body=''):
+    """Add a notification for each user (any iterable of pks) in batched INSERTs; returns the count."""
+    now = timezone.now()
+    batch, count = [], 0
+    for user_id in user_ids:
+        batch.append(Notification(user_id=user_id, kind=kind, title=title, body=body, created_at=now))
+        if len(batch) >= RECORD_BATCH:
+            count += len(Notification.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        count += len(Notification.objects.bulk_create(batch))
+    if count:
+        schedule_delivery()
+    return count
+
+
+def schedule_delivery():
+    """Queue a delivery run after the digest delay, unless one is already waiting."""
+    deliver.enqueue_unique(DELIVER_KEY, timezone.now() + timedelta(seconds=settings.NOTIFICATION_DIGEST_DELAY))
+
+
+@task(priority=50)
+def results_approved(pairs):
+    """Notify students of newly approved results; ``pairs`` is [[student_id, term_id], ...]."""
+    students_by_term = defaultdict(set)
+    for student_id, term_id in pairs:
+        students_by_term[term_id].add(student_id)
+    users = dict(Student.objects.filter(pk__in={s for s, _ in pairs}).values_list('pk', 'user_id'))
+    count = 0
+    for term_id, session, name in Term.objects.filter(pk__in=students_by_term).values_list('pk', 'session__name', 'name'):
+        count += record(
+            [users[s] for s in sorted(students_by_term[term_id]) if s in users],
+            Notification.KIND_RESULTS, f'Results approved: {session} {name}',
+            'New results are available in the student portal.',
+        )
+    return count
+
+
+def announcement_recipients(announcement):
+    """User pks an announcement goes to: everyone, or a class's students and teachers."""
+    if announcement.scope == Announcement.SCOPE_SCHOOL or announcement.target_class_id is None:
+        users = User.objects.filter(role__in=[User.ROLE_STUDENT, User.ROLE_TEACHER])
+    else:
+        teachers = ClassSubject.objects.filter(class_ref_id=announcement.target_class_id).values('teacher__user_id')
+        users = User.objects.filter(student_profile__current_class_id=announcement.target_class_id) | User.objects.filter(pk__in=teachers)
+    return users.filter(is_active=True).order_by('pk').values_list('pk', flat=True).iterator(chunk_size=RECORD_BATCH)
+
+
+@task(priority=50)
+def announcement_published(announcement_id):
+    announcement = Announcement.objects.filter(pk=announcement_id).first()
+    if announcement is None:
+        return 0
+    return record(
+        announcement_recipients(announcement), Notification.KIND_ANNOUNCEMENT,
+        f'Announcement: {announcement.title}', announcement.content[:BODY_LENGTH],
+    )
+
+
+@task(priority=50)
+def admission_approved(application_id):
+    app = AdmissionApplication.objects.select_related('applying_class').filter(pk=application_id).first()
+    if app is None or app.status != AdmissionApplication.STATUS_APPROVED:
+        return 0
+    class_name = f' to {app.applying_class.name}' if app.applying_class else ''
+    return send_mail(
+        f'{settings.SCHOOL_NAME}: application approved',
+        f'Dear {app.guardian_name or app.first_name},\n\n'
+        f'The application for {app.first_name} {app.last_name}{class_name} has been approved. '
+        f'The school will send the student portal login details shortly.\n',
+        settings.DEFAULT_FROM_EMAIL,
+        [app.email],
+    )
+
+
+# --- Delivery -------------------------------------------------------------------
+
+class DeliveryStats:
+    def __init__(self):
+        self.emails = 0
+        self.notifications = 0
+        self.skipped = 0  # notifications for users without an email address
+        self.seconds = 0.0
+        self.lags = []  # seconds from recording to sending, per notification
+
+    @property
+    def rate(self):
+        return self.emails / self.seconds if self.seconds else 0.0
+
+    def lag(self, fraction):
+        if not self.lags:
+            return 0.0
+        lags = sorted(self.lags)
+        return lags[min(int(len(lags) * fraction), len(lags) - 1)]
+
+
+def digest(user, items):
+    """One email covering all of a user's undelivered notifications."""
+    name = user.get_full_name() or user.username
+    subject = items[0].title if len(items) == 1 else f'{len(items)} new notifications'
+    lines = [f'Dear {name},', '']
+    for item in items:
+        lines.append(f'- {item.title}')
+        if item.body:
+            lines.append(f'  {item.body}')
+    lines += ['', 'Sign in to the portal for details.']
+    return EmailMessage(f'{settings.SCHOOL_NAME}: {subject}', '\n'.join(lines), settings.DEFAULT_FROM_EMAIL, [user.email])
+
+
+def deliver_pending(batch_size=DELIVERY_BATCH, connection=None, stats=None):
+    """Email every undelivered notification as per-user digests; returns DeliveryStats."""
+    stats = stats if stats is not None else DeliveryStats()
+    started = time.perf_counter()
+    run_id = uuid.uuid4().hex
+    mine = Notification.objects.filter(claimed_by=run_id, sent_at=None)
+    with connection or get_connection() as mail:
+        while True:
+            now = timezone.now()
+            unclaimed = Notification.objects.filter(Q(claimed_until=None) | Q(claimed_until__lt=now), sent_at=None)
+            user_ids = list(unclaimed.order_by('user_id').values_list('user_id', flat=True).distinct()[:batch_size])
+            if not user_ids:
+                break
+            # The UPDATE re-checks the claim per row, so a concurrent run gets none of these
+            if not unclaimed.filter(user_id__in=user_ids).update(
+                    claimed_by=run_id, claimed_until=now + timedelta(seconds=CLAIM_TIMEOUT)):
+                continue
+            users = User.objects.filter(pk__in=user_ids).only('pk', 'username', 'first_name', 'last_name', 'email').in_bulk()
+            items = defaultdict(list)
+            for item in mine.order_by('user_id', 'created_at', 'pk'):
+                items[item.user_id].append(item)
+            messages = [digest(users[u], items[u]) for u in user_ids if u in users and users[u].email and items[u]]
+            try:
+                if messages:
+                    mail.send_messages(messages)
+            except Exception:
+                mine.update(claimed_by='', claimed_until=None)  # let the retry send them
+                raise
+            now = timezone.now()
+            mine.update(sent_at=now)
+            stats.emails += len(messages)
+            for u, group in items.items():
+                if u in users and users[u].email:
+                    stats.notifications += len(group)
+                    stats.lags.extend((now - item.created_at).total_seconds() for item in group)
+                else:
+                    stats.skipped += len(group)
+    stats.seconds += time.perf_counter() - started
+    return stats
+
+
+@task(priority=60, timeout=60 * 30)
+def deliver():
+    stats = deliver_pending()
+    logger.info(
+        'Delivered %s notifications in %s emails in %.1fs (%.1f emails/s); lag p50 %.0fs, max %.0fs',
+        stats.notifications, stats.emails, stats.seconds, stats.rate, stats.lag(0.5), stats.lag(1.0),
+    )
+    return stats.emails
@@ -0,0 +1,361 @@
+"""
+Bulk student onboarding: approved admissions or a roster sheet into User +
+Student rows.
+
+Every entry is validated in memory against lookups loaded once up front, and
+nothing is written unless the whole batch is clean, so a corrected sheet can
+simply be uploaded again. Password hashing is the expensive step (PBKDF2 is
+slow on purpose), so it runs before the transaction across a process pool.
+Generated one-time passwords are long random strings and are hashed at
+INITIAL_PASSWORD_ITERATIONS; Django re-hashes them at the full work factor on
+the student's first login. Users, students and the application links are
+then written with a few batched INSERTs and UPDATEs. Student IDs are
+allocated inside that transaction, under a lock on a Counter row that keeps
+the last serial of the year, and usernames generated from them are checked
+there too.
+
+Returns a credentials list (student ID, username, password) for the school to
+hand out; used by the ``onboard_students`` command and the admissions page.
+"""
+import os
+import secrets
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import counters, search, typeahead
+from .importers import MAX_REPORTED_ERRORS, ImportFormatError, _key, _norm
+from .models import AdmissionApplication, Class, Counter, PickerKey, Student, User
+
+BATCH_SIZE = 500
+HASH_CHUNK_SIZE = 20
+PASSWORD_LENGTH = 12
+# No look-alike characters (0/O, 1/l/I): the passwords are read off a printout
+PASSWORD_ALPHABET = ''.join(c for c in string.ascii_letters + string.digits if c not in '0O1lI')
+
+FIRST_NAME_HEADERS = ('first_name', 'firstname', 'first', 'given_name')
+LAST_NAME_HEADERS = ('last_name', 'lastname', 'surname', 'family_name')
+NAME_HEADERS = ('name', 'full_name', 'student_name')
+CLASS_HEADERS = ('class', 'class_name', 'class_id')
+STUDENT_ID_HEADERS = ('student_id', 'admission_no', 'reg_no')
+OPTIONAL_HEADERS = {
+    'email': ('email', 'email_address'),
+    'parent_contact': ('parent_contact', 'guardian_contact', 'parent_phone', 'guardian_phone'),
+    'date_of_birth': ('date_of_birth', 'dob', 'birth_date'),
+    'username': ('username',),
+    'password': ('password',),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+
+
+def generate_password():
+    return ''.join(secrets.choice(PASSWORD_ALPHABET) for _ in range(PASSWORD_LENGTH))
+
+
+def hash_passwords(chunk):
+    """Encoded hashes for a list of (password, generated) pairs; runs in a pool worker."""
+    hasher = PBKDF2PasswordHasher()
+    return [
+        hasher.encode(password, hasher.salt(), settings.INITIAL_PASSWORD_ITERATIONS) if generated
+        else make_password(password)
+        for password, generated in chunk
+    ]
+
+
+def iter_hashed(pairs, workers=None, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Hashes for (password, generated) pairs, in order. ``workers=0`` hashes
+    in-process; otherwise a pool of ``workers`` processes (default: CPU count).
+    """
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    if workers == 0 or len(chunks) < 2:
+        for chunk in chunks:
+            yield from hash_passwords(chunk)
+        return
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        for hashes in pool.map(hash_passwords, chunks):
+            yield from hashes
+
+
+def _parse_date(raw):
+    if isinstance(raw, datetime):
+        return raw.date()
+    if isinstance(raw, date):
+        return raw
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(raw).strip(), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f'Date of birth "{raw}" is not a date (use YYYY-MM-DD).')
+
+
+class OnboardingReport:
+    def __init__(self):
+        self.entries = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors = []  # [(row label, message)], capped at MAX_REPORTED_ERRORS
+        self.credentials = []  # [{'student_id', 'username', 'name', 'class_name', 'password'}]
+        self.hash_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def add_error(self, where, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((where, message))
+
+    @property
+    def ok(self):
+        return self.error_count == 0
+
+
+class StudentOnboarder:
+    """
+    Turn entries (dicts with first_name, last_name and optionally class_id,
+    email, parent_contact, date_of_birth, student_id, username, password,
+    application_id) into students. ``class_ref`` is used for entries without
+    a class. Build entries with ``from_applications`` or ``from_rows``.
+    """
+
+    def __init__(self, class_ref=None, workers=None, batch_size=BATCH_SIZE):
+        self.class_ref = class_ref
+        self.workers = workers
+        self.batch_size = batch_size
+        self.report = OnboardingReport()
+        self.class_names = dict(Class.objects.values_list('pk', 'name'))
+        self.classes = {}
+        for pk, name in self.class_names.items():
+            self.classes[_key(name)] = pk
+            self.classes[str(pk)] = pk
+
+    # --- Entry sources ------------------------------------------------------
+
+    @staticmethod
+    def pending_applications():
+        """Approved applications that have no student yet."""
+        return AdmissionApplication.objects.filter(status=AdmissionApplication.STATUS_APPROVED, student=None)
+
+    def from_applications(self, applications):
+        return [
+            {
+                'where': f'Application {app.pk} ({app.first_name} {app.last_name})',
+                'application_id': app.pk,
+                'first_name': app.first_name.strip(),
+                'last_name': app.last_name.strip(),
+                'email': app.email,
+                'parent_contact': app.guardian_contact or app.phone,
+                'class_id': app.applying_class_id,
+            }
+            for app in applications.order_by('submitted_at', 'pk')
+        ]
+
+    def from_rows(self, rows):
+        """Entries from spreadsheet rows (header first); bad cells are recorded as errors."""
+        rows = iter(rows)
+        header = next(rows, None)
+        if not header:
+            raise ImportFormatError('The file is empty.')
+        columns = [_norm(h) for h in header]
+
+        def find(candidates):
+            return next((i for i, col in enumerate(columns) if col in candidates), None)
+
+        first_col, last_col, name_col = find(FIRST_NAME_HEADERS), find(LAST_NAME_HEADERS), find(NAME_HEADERS)
+        if first_col is None and name_col is None:
+            raise ImportFormatError('Missing a "first_name" (or "name") column.')
+        class_col, student_id_col = find(CLASS_HEADERS), find(STUDENT_ID_HEADERS)
+        if class_col is None and self.class_ref is None:
+            raise ImportFormatError('Missing a "class" column. Choose a class or add the column.')
+        optional = {field: find(candidates) for field, candidates in OPTIONAL_HEADERS.items()}
+
+        def cell(row, index):
+            if index is None or index >= len(row) or row[index] is None:
+                return ''
+            value = row[index]
+            return value.strip() if isinstance(value, str) else value
+
+        entries = []
+        for row_number, row in enumerate(rows, start=2):
+            if not any(str(c).strip() for c in row):
+                continue
+            where = f'Row {row_number}'
+            first, last = str(cell(row, first_col)), str(cell(row, last_col))
+            if first_col is None:
+                first, _, last = str(cell(row, name_col)).rpartition(' ')
+                if not first:
+                    first, last = last, ''
+            entry = {'where': where, 'first_name': first, 'last_name': last}
+            if class_col is not None and cell(row, class_col) != '':
+                raw = cell(row, class_col)
+                entry['class_id'] = self.classes.get(_key(raw))
+                if entry['class_id'] is None:
+                    self.report.add_error(where, f'Unknown class "{raw}".')
+                    continue
+            if student_id_col is not None:
+                entry['student_id'] = str(cell(row, student_id_col))
+            for field, index in optional.items():
+                entry[field] = cell(row, index)
+            if entry['date_of_birth'] != '':
+                try:
+                    entry['date_of_birth'] = _parse_date(entry['date_of_birth'])
+                except ValueError as exc:
+                    self.report.add_error(where, str(exc))
+                    continue
+            entry['username'] = str(entry['username'])
+            entry['password'] = str(entry['password'])
+            entries.append(entry)
+        return entries
+
+    # --- Validation and writes ----------------------------------------------
+
+    def _validate(self, entries):
+        """Fill in classes and check that given student IDs and usernames are free."""
+        student_ids = {_key(s) for s in Student.objects.exclude(student_id='').values_list('student_id', flat=True)}
+        given_usernames = [e['username'] for e in entries if e.get('username')]
+        usernames = {_key(u) for u in User.objects.filter(username__in=given_usernames).values_list('username', flat=True)}
+        seen = {}
+        for entry in entries:
+            where = entry['where']
+            if not entry['first_name']:
+                self.report.add_error(where, 'First name is required.')
+            entry['class_id'] = entry.get('class_id') or (self.class_ref.pk if self.class_ref is not None else None)
+            if entry['class_id'] is None:
+                self.report.add_error(where, 'No class: set one on the entry or choose a default class.')
+            for field, label, taken in (('student_id', 'Student ID', student_ids), ('username', 'Username', usernames)):
+                value = _key(entry.get(field))
+                if not value:
+                    continue
+                if value in taken:
+                    self.report.add_error(where, f'{label} "{entry[field]}" is already in use.')
+                elif (field, value) in seen:
+                    self.report.add_error(where, f'{label} "{entry[field]}" repeats {seen[field, value]}.')
+                else:
+                    seen[field, value] = where
+
+    def _allocate_ids(self, count):
+        """
+        ``count`` unused student IDs of the form <prefix><year><serial>, in
+        order. Concurrent onboardings queue on the year's Counter row, which
+        exists even before the year's first student does.
+        """
+        prefix = f'{settings.STUDENT_ID_PREFIX}{timezone.localdate().year}'
+        counter, _ = Counter.objects.select_for_update().get_or_create(name=f'student_ids:{prefix}')
+        last = counter.value
+        # IDs may also have been typed in by hand
+        for student_id in Student.objects.filter(student_id__startswith=prefix).values_list('student_id', flat=True):
+            serial = student_id[len(prefix):]
+            if serial.isdecimal():
+                last = max(last, int(serial))
+        if count:
+            Counter.objects.filter(pk=counter.pk).update(value=last + count)
+        return [f'{prefix}{serial:04d}' for serial in range(last + 1, last + 1 + count)]
+
+    def _check_usernames(self, entries, usernames):
+        """Report final usernames (given or generated) taken by an existing user or by another entry."""
+        taken = {_key(u) for u in User.objects.filter(username__in=usernames).values_list('username', flat=True)}
+        seen = {}
+        for entry, username in zip(entries, usernames):
+            where, value = entry['where'], _key(username)
+            generated = '' if entry.get('username') else ' (generated from the student ID)'
+            if value in taken:
+                self.report.add_error(where, f'Username "{username}"{generated} is already in use.')
+            elif value in seen:
+                self.report.add_error(where, f'Username "{username}"{generated} repeats {seen[value]}.')
+            else:
+                seen[value] = where
+
+    def _fill_pks(self, objs, unique_field):
+        """Set the pks of freshly bulk-created ``objs`` on backends (MySQL) that do not return them."""
+        if connection.features.can_return_rows_from_bulk_insert:
+            return
+        model = type(objs[0])
+        for i in range(0, len(objs), self.batch_size):
+            batch = objs[i:i + self.batch_size]
+            pks = dict(model.objects.filter(
+                **{f'{unique_field}__in': [getattr(obj, unique_field) for obj in batch]}
+            ).values_list(unique_field, 'pk'))
+            for obj in batch:
+                obj.pk = pks[getattr(obj, unique_field)]
+
+    def run(self, entries):
+        """Create a student for every entry, or none if any entry is invalid; returns the report."""
+        self.report.entries += len(entries)
+        self._validate(entries)
+        if not self.report.ok or not entries:
+            return self.report
+
+        started = time.perf_counter()
+        passwords = [(e.get('password') or generate_password(), not e.get('password')) for e in entries]
+        hashes = list(iter_hashed(passwords, workers=self.workers))
+        self.report.hash_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            new_ids = iter(self._allocate_ids(sum(1 for e in entries if not e.get('student_id'))))
+            student_ids = [e.get('student_id') or next(new_ids) for e in entries]
+            usernames = [e.get('username') or student_id.lower() for e, student_id in zip(entries, student_ids)]
+            self._check_usernames(entries, usernames)
+            if not self.report.ok:
+                transaction.set_rollback(True)
+                return self.report
+            for entry, student_id, username in zip(entries, student_ids, usernames):
+                entry['student_id'], entry['username'] = student_id, username
+            now = timezone.now()
+            users = User.objects.bulk_create([
+                User(
+                    username=e['username'], password=encoded, role=User.ROLE_STUDENT,
+                    first_name=e['first_name'], last_name=e['last_name'], email=e.get('email') or '',
+                    date_joined=now,
+                )
+                for e, encoded in zip(entries, hashes)
+            ], batch_size=self.batch_size)
+            self._fill_pks(users, 'username')
+            students = Student.objects.bulk_create([
+                Student(
+                    user=user, student_id=e['student_id'], current_class_id=e['class_id'],
+                    parent_contact=e.get('parent_contact') or '', date_of_birth=e.get('date_of_birth') or None,
+                )
+                for e, user in zip(entries, users)
+            ], batch_size=self.batch_size)
+            self._fill_pks(students, 'student_id')
+            applications = [
+                AdmissionApplication(pk=e['application_id'], student=student)
+                for e, student in zip(entries, students) if e.get('application_id')
+            ]
+            AdmissionApplication.objects.bulk_update(applications, ['student'], batch_size=self.batch_size)
+            # bulk_create skips the signals that keep the dashboard counter, search index and picker keys
+            counters.bump(counters.STUDENTS, len(students))
+            created = Student.objects.select_related('user', 'current_class').filter(pk__in=[s.pk for s in students])
+            search.index(created)
+            typeahead.refresh(PickerKey.KIND_STUDENT, created)
+        self.report.write_seconds = time.perf_counter() - started
+
+        self.report.created = len(students)
+        self.report.credentials = [
+            {
+                'student_id': e['student_id'], 'username': e['username'],
+                'name': f"{e['first_name']} {e['last_name']}".strip(),
+                'class_name': self.class_names.get(e['class_id'], ''), 'password': password,
+            }
+            for e, (password, _) in zip(entries, passwords)
+        ]
+        return self.report
+
+
+CREDENTIAL_COLUMNS = ('student_id', 'username', 'name', 'class_name', 'password')
+
+
+def write_credentials(writer, credentials):
+    """Write the credentials sheet through a csv.writer."""
+    writer.writerow(CREDENTIAL_COLUMNS)
+    for row in credentials:
+        writer.writerow([row[column] for column in CREDENTIAL_COLUMNS])
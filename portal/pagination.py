@@ -0,0 +1,173 @@
+"""
+Keyset (seek) pagination for portal lists.
+
+Pages are addressed by an opaque cursor holding the ordering values of the
+row at the page boundary, not by an offset, so page N is the same indexed
+range read as page 1 and rows inserted while someone pages do not shift or
+repeat entries. Orderings must end in a unique column (normally ``pk``).
+To order by a related column, annotate it onto the queryset and order by
+the annotation's name.
+
+    page = KeysetPaginator(queryset, ('-submitted_at', '-pk'), per_page=50).page_for_request(request)
+    {% include 'portal/_keyset_nav.html' with page=page %}
+
+A pre-built prefix of the list (e.g. a cached feed of dicts) can be passed as
+``cached``; pages that fall inside it are served without touching the
+database. Set ``cached_complete`` when it holds every row.
+"""
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_PARAM = 'cursor'
+_SALT = 'portal.pagination'
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.next_url = None
+        self.prev_url = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page=50, cached=None, cached_complete=False):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.fields = [f.lstrip('-') for f in ordering]
+        self.descending = [f.startswith('-') for f in ordering]
+        self.per_page = per_page
+        self.cached = cached
+        self.cached_complete = cached_complete
+
+    # --- cursors -------------------------------------------------------------
+
+    def _field(self, name):
+        if name == 'pk':
+            return self.model._meta.pk
+        # An annotation, e.g. a related column: annotate(term_start=F('term__start_date'))
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.model._meta.get_field(name)
+
+    def _values(self, row):
+        if isinstance(row, dict):
+            return [row[f] for f in self.fields]
+        return [getattr(row, f) for f in self.fields]
+
+    def _cursor(self, row, direction):
+        values = [_plain(v) for v in self._values(row)]
+        return signing.dumps([direction, values], salt=_SALT, compress=True)
+
+    def _decode(self, cursor):
+        """(direction, values) from a cursor, or None for a missing or tampered one."""
+        if not cursor:
+            return None
+        try:
+            direction, raw = signing.loads(cursor, salt=_SALT)
+            if direction not in ('next', 'prev') or len(raw) != len(self.fields):
+                return None
+            values = [self._field(f).to_python(v) for f, v in zip(self.fields, raw)]
+        except (signing.BadSignature, ValidationError, ValueError, TypeError):
+            return None
+        return direction, values
+
+    # --- queries -------------------------------------------------------------
+
+    def _seek(self, values, forward):
+        """Q selecting rows strictly after (forward) or before the given ordering values."""
+        branches = []
+        equal = Q()
+        for field, desc, value in zip(self.fields, self.descending, values):
+            lookup = 'lt' if desc == forward else 'gt'
+            branches.append(equal & Q(**{f'{field}__{lookup}': value}))
+            equal &= Q(**{field: value})
+        q = branches[0]
+        for branch in branches[1:]:
+            q |= branch
+        # Redundant range on the leading column so the planner can seek the index
+        lookup = 'lte' if self.descending[0] == forward else 'gte'
+        return Q(**{f'{self.fields[0]}__{lookup}': values[0]}) & q
+
+    def _order_by(self, forward):
+        return [f'-{f}' if desc == forward else f for f, desc in zip(self.fields, self.descending)]
+
+    def _is_after(self, row, values):
+        for current, boundary, desc in zip(self._values(row), values, self.descending):
+            if current != boundary:
+                return current < boundary if desc else current > boundary
+        return False
+
+    def _fetch(self, values, forward):
+        """Up to per_page + 1 rows on the requested side of ``values``."""
+        limit = self.per_page + 1
+        if self.cached is not None and forward:
+            start = 0 if values is None else next(
+                (i for i, row in enumerate(self.cached) if self._is_after(row, values)), len(self.cached))
+            window = self.cached[start:start + limit]
+            # The cache is a prefix of the full list; only trust it if it covers the page
+            if len(window) == limit or self.cached_complete:
+                return window
+        qs = self.queryset
+        if values is not None:
+            qs = qs.filter(self._seek(values, forward))
+        return list(qs.order_by(*self._order_by(forward))[:limit])
+
+    def page(self, cursor=None):
+        decoded = self._decode(cursor)
+        if decoded is None:
+            rows = self._fetch(None, True)
+            has_more, rows = len(rows) > self.per_page, rows[:self.per_page]
+            return KeysetPage(rows, self._cursor(rows[-1], 'next') if has_more else None, None)
+
+        direction, values = decoded
+        forward = direction == 'next'
+        rows = self._fetch(values, forward)
+        has_more, rows = len(rows) > self.per_page, rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage([], None, None)
+        next_cursor = self._cursor(rows[-1], 'next') if (has_more or not forward) else None
+        prev_cursor = self._cursor(rows[0], 'prev') if (forward or has_more) else None
+        return KeysetPage(rows, next_cursor, prev_cursor)
+
+    def page_for_request(self, request, param=CURSOR_PARAM):
+        """Page for ``request.GET[param]`` with next/prev URLs that keep the other query parameters."""
+        page = self.page(request.GET.get(param))
+        for attr, cursor in (('next_url', page.next_cursor), ('prev_url', page.prev_cursor)):
+            if cursor is not None:
+                params = request.GET.copy()
+                params[param] = cursor
+                setattr(page, attr, '?' + params.urlencode())
+        return page
+
+
+def _plain(value):
+    """JSON-safe form of an ordering value; parsed back with the field's to_python()."""
+    if value is None or isinstance(value, (int, str, bool)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
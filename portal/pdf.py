@@ -0,0 +1,75 @@
+"""
+Minimal PDF writer for generated documents (report cards).
+
+Only what printable portal documents need: A4 pages, the standard Helvetica
+faces, positioned text and ruled lines. No dependencies, and pure functions
+of their input, so documents can be built in worker processes.
+
+    doc = PDFDocument()
+    page = doc.add_page()
+    page.text(50, 800, 'Report Card', size=18, bold=True)
+    page.line(50, 790, 545, 790)
+    data = doc.to_bytes()
+"""
+A4 = (595, 842)
+FONTS = {False: b'/F1', True: b'/F2'}
+
+
+def _escape(text):
+    raw = str(text).encode('cp1252', 'replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class PDFPage:
+    def __init__(self):
+        self._ops = []
+
+    def text(self, x, y, text, size=10, bold=False):
+        self._ops.append(b'BT %s %d Tf %.2f %.2f Td (%s) Tj ET' % (FONTS[bold], size, x, y, _escape(text)))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self._ops.append(b'%.2f w %.2f %.2f m %.2f %.2f l S' % (width, x1, y1, x2, y2))
+
+    def content(self):
+        return b'\n'.join(self._ops)
+
+
+class PDFDocument:
+    def __init__(self, size=A4):
+        self.size = size
+        self.pages = []
+
+    def add_page(self):
+        page = PDFPage()
+        self.pages.append(page)
+        return page
+
+    def to_bytes(self):
+        # Objects: 1 catalog, 2 page tree, 3-4 fonts, then a (page, content) pair per page
+        width, height = self.size
+        page_ids = [5 + 2 * i for i in range(len(self.pages))]
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                b' '.join(b'%d 0 R' % i for i in page_ids), len(page_ids)),
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        for page_id, page in zip(page_ids, self.pages):
+            stream = page.content()
+            objects.append(
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+                % (width, height, page_id + 1))
+            objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+
+        out = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(out)
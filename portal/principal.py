@@ -0,0 +1,178 @@
+"""
+The request principal: the logged-in user together with its role profile.
+
+PrincipalBackend loads the user, its Student or Teacher profile and the
+student's class in one joined query, and keeps the result in the cache for
+PRINCIPAL_TIMEOUT seconds. It is dropped early when the user, a profile or a
+class changes (see portal.signals). The cached copy leaves out the password
+hash; the hash and ``is_active`` are read by primary key on every request,
+so password changes and deactivations (even by queryset ``update()``, which
+sends no signal) take effect at once. PrincipalMiddleware exposes it as
+``request.principal``. Views and the role decorators read it instead of
+following ``request.user.student_profile`` and friends one query at a time;
+async views resolve it first with ``aload()``.
+"""
+from dataclasses import dataclass
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+
+from . import aio
+from .models import Class, Student, Teacher, User
+from .replicas import primary
+
+# Long enough to serve a burst of page loads, short enough that a missed invalidation heals quickly
+PRINCIPAL_TIMEOUT = 60
+
+
+def cache_key(user_id):
+    return f'portal:principal:{user_id}'
+
+
+def load_user(user_id):
+    """The user with student profile, class and teacher profile joined in; cached briefly, less the password."""
+    with primary():
+        credentials = User.objects.filter(pk=user_id).values_list('password', 'is_active').first()
+    if credentials is None:
+        return None
+    key = cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        with primary():
+            user = (
+                User.objects.select_related('student_profile__current_class', 'teacher_profile')
+                .defer('password').filter(pk=user_id).first()
+            )
+        if user is None:
+            return None
+        cache.set(key, user, PRINCIPAL_TIMEOUT)
+    user.password, user.is_active = credentials
+    return user
+
+
+def forget(*user_ids):
+    cache.delete_many([cache_key(user_id) for user_id in user_ids])
+
+
+class PrincipalBackend(ModelBackend):
+    """ModelBackend whose per-request user lookup is load_user()."""
+
+    def get_user(self, user_id):
+        user = load_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+def _related(user, name):
+    try:
+        return getattr(user, name)
+    except ObjectDoesNotExist:
+        return None
+
+
+@dataclass(frozen=True)
+class Principal:
+    user: User | None
+    role: str | None
+    student: Student | None = None
+    teacher: Teacher | None = None
+
+    @classmethod
+    def for_user(cls, user):
+        if not user.is_authenticated:
+            return ANONYMOUS
+        return cls(
+            user=user, role=user.role,
+            student=_related(user, 'student_profile'), teacher=_related(user, 'teacher_profile'),
+        )
+
+    @property
+    def is_authenticated(self):
+        return self.user is not None
+
+    @property
+    def is_admin(self):
+        return self.role == User.ROLE_ADMIN
+
+    @property
+    def is_teacher(self):
+        return self.role == User.ROLE_TEACHER
+
+    @property
+    def is_student(self):
+        return self.role == User.ROLE_STUDENT
+
+    @property
+    def current_class(self) -> Class | None:
+        return self.student.current_class if self.student else None
+
+    @property
+    def class_id(self) -> int | None:
+        return self.student.current_class_id if self.student else None
+
+
+ANONYMOUS = Principal(user=None, role=None)
+
+
+class PrincipalMiddleware:
+    """Set ``request.principal``; must come after AuthenticationMiddleware."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: Principal.for_user(request.user))
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        return self.get_response(request)
+
+    async def _acall(self, request):
+        return await self.get_response(request)
+
+
+async def aload(request):
+    """
+    Resolve ``request.principal`` on a worker thread (it may need the session
+    and a query). Async views call this first; afterwards the principal and
+    its profiles are plain attributes.
+    """
+    await aio.run(lambda: request.principal.role)
+    return request.principal
+
+
+def role_required(role):
+    """
+    View decorator: send anyone whose principal lacks ``role`` to the portal
+    login. On async views it also does login_required's job, redirecting
+    anonymous users to the login page with ``?next=``. The role is kept on
+    the view as ``required_role`` (bench_suite reads it to pick a user).
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                principal = await aload(request)
+                if not principal.is_authenticated:
+                    return redirect_to_login(request.get_full_path())
+                if principal.role != role:
+                    return redirect('portal:login')
+                return await view_func(request, *args, **kwargs)
+            async_wrapper.required_role = role
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.principal.role != role:
+                return redirect('portal:login')
+            return view_func(request, *args, **kwargs)
+        wrapper.required_role = role
+        return wrapper
+    return decorator
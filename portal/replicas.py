@@ -0,0 +1,139 @@
+"""
+Read replicas: route the reads of read-only views to replica databases.
+
+Replicas are the aliases listed in ``settings.DATABASE_REPLICAS`` (from
+DATABASE_REPLICA_URLS). Nothing reads from them by default. A view opts in
+with ``@replica_reads``, and only its GET/HEAD requests do. Everything else
+(writes, management commands, the job worker, authentication) stays on the
+primary.
+
+Read-your-writes. A request that writes, or any POST, sets a short-lived
+cookie. Until it expires (REPLICA_PIN_SECONDS) that browser reads from the
+primary, so a teacher who just uploaded results sees them even while the
+replicas lag. A replica-read view that writes switches itself back to the
+primary for the rest of the request.
+
+Shared caches (feeds, API responses, public pages, principals) are always
+filled inside ``primary()``. Otherwise a lagging replica could put stale rows
+back into the cache just after a write invalidated them.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+PRIMARY, REPLICA, PINNED = 'primary', 'replica', 'pinned'
+_mode = ContextVar('portal_db_mode', default=PRIMARY)
+_wrote = ContextVar('portal_db_wrote', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def primary():
+    """Read from the primary inside the block, even in a replica-read view."""
+    token = _mode.set(PINNED)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def _eligible(request):
+    return (replicas() and request.method in ('GET', 'HEAD') and PIN_COOKIE not in request.COOKIES
+            and _mode.get() != PINNED)
+
+
+def replica_reads(view):
+    """Let a read-only view's GET/HEAD requests read from a replica (unless the browser is pinned)."""
+    if iscoroutinefunction(view):
+        # Worker threads the view starts inherit the mode along with the context
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not _eligible(request):
+                return await view(request, *args, **kwargs)
+            token = _mode.set(REPLICA)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _mode.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _eligible(request):
+            return view(request, *args, **kwargs)
+        token = _mode.set(REPLICA)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _mode.reset(token)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """Writes (and reads outside replica-read views) go to the primary; replica reads to a random replica."""
+
+    def db_for_read(self, model, **hints):
+        pool = replicas()
+        if not pool:
+            return None
+        return random.choice(pool) if _mode.get() == REPLICA else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        if _mode.get() == REPLICA:
+            # Read what was just written
+            _mode.set(PINNED)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return False if db in replicas() else None
+
+
+class ReplicaMiddleware:
+    """Pin a browser to the primary for REPLICA_PIN_SECONDS after it writes."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        token = _wrote.set(False)
+        try:
+            return self._pin(request, self.get_response(request))
+        finally:
+            _wrote.reset(token)
+
+    async def _acall(self, request):
+        token = _wrote.set(False)
+        try:
+            return self._pin(request, await self.get_response(request))
+        finally:
+            _wrote.reset(token)
+
+    def _pin(self, request, response):
+        if replicas() and (_wrote.get() or request.method not in SAFE_METHODS):
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                                samesite='Lax', secure=request.is_secure())
+        return response
@@ -0,0 +1,223 @@
+"""
+Batch report cards: one PDF per student, zipped, for whole classes.
+
+Each class-term is loaded in a handful of queries into plain dicts, split
+into chunks and rendered across a process pool (rendering touches no
+database). Finished PDFs are written into a zip as they arrive, and the zip
+is produced as a stream of byte chunks, so neither the cards nor the archive
+are ever held in memory whole. Used by the ``render_report_cards`` command,
+the class rankings download and the TermReport admin action.
+"""
+import os
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import cache
+
+import django
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Class, Result, Student, Term, TermReport
+from .pdf import A4, PDFDocument
+
+CHUNK_SIZE = 25
+ROW_HEIGHT = 18
+
+
+def load_cards(class_id, term_id, student_ids=None):
+    """Plain-dict card data for every student in a class for one term."""
+    class_name = Class.objects.values_list('name', flat=True).get(pk=class_id)
+    term = Term.objects.select_related('session').get(pk=term_id)
+    students = Student.objects.filter(current_class_id=class_id).select_related('user').order_by('student_id', 'pk')
+    if student_ids is not None:
+        students = students.filter(pk__in=student_ids)
+    summaries = {
+        r['student_id']: r for r in TermReport.objects.filter(term_id=term_id, class_ref_id=class_id).values(
+            'student_id', 'total', 'average', 'subject_count', 'position', 'class_size')
+    }
+    rows = defaultdict(list)
+    results = Result.objects.filter(
+        term_id=term_id, status=Result.STATUS_APPROVED, student__current_class_id=class_id,
+    ).order_by('subject__name').values_list('student_id', 'subject__name', 'score', 'subject_position')
+    for student_id, subject, score, position in results:
+        rows[student_id].append((subject, str(score), position))
+
+    generated = timezone.localdate().isoformat()
+    cards = []
+    for student in students:
+        name = student.user.get_full_name() or student.user.username
+        ref = student.student_id or str(student.pk)
+        cards.append({
+            'filename': f'{slugify(class_name)}/{slugify(ref)}-{slugify(name)}.pdf',
+            'school': settings.SCHOOL_NAME,
+            'term': f'{term.session.name} - {term.name}',
+            'class_name': class_name,
+            'name': name,
+            'student_id': student.student_id,
+            'rows': rows.get(student.pk, []),
+            'summary': summaries.get(student.pk),
+            'generated': generated,
+        })
+    return cards
+
+
+def render_card(card):
+    """PDF bytes for one card dict."""
+    doc = PDFDocument()
+    width, height = A4
+    page = doc.add_page()
+    y = height - 60
+    page.text(50, y, card['school'], size=18, bold=True)
+    page.text(50, y - 22, f"Report Card - {card['term']}", size=12)
+    page.line(50, y - 32, width - 50, y - 32, width=1)
+    y -= 60
+    for label, value in (('Name', card['name']), ('Student ID', card['student_id'] or '-'), ('Class', card['class_name'])):
+        page.text(50, y, f'{label}:', bold=True)
+        page.text(130, y, value)
+        y -= 16
+
+    def header(page, y):
+        page.text(50, y, 'Subject', bold=True)
+        page.text(340, y, 'Score', bold=True)
+        page.text(430, y, 'Subject Position', bold=True)
+        page.line(50, y - 6, width - 50, y - 6)
+        return y - ROW_HEIGHT
+
+    y = header(page, y - 20)
+    for subject, score, position in card['rows'] or [('No approved results for this term.', '', None)]:
+        if y < 120:
+            page = doc.add_page()
+            y = header(page, height - 60)
+        page.text(50, y, subject)
+        page.text(340, y, score)
+        page.text(430, y, position or '-')
+        y -= ROW_HEIGHT
+
+    summary = card['summary']
+    if summary:
+        page.line(50, y + 6, width - 50, y + 6)
+        y -= 10
+        page.text(50, y, f"Total: {summary['total']}    Average: {summary['average']}    Subjects: {summary['subject_count']}", bold=True)
+        page.text(50, y - 16, f"Position in class: {summary['position']} of {summary['class_size']}", bold=True)
+    page.text(50, 40, f"Generated {card['generated']}", size=8)
+    return doc.to_bytes()
+
+
+def render_cards(cards):
+    """Worker entry point: (pid, seconds, [(filename, pdf bytes), ...]) for a chunk of cards."""
+    started = time.perf_counter()
+    documents = [(card['filename'], render_card(card)) for card in cards]
+    return os.getpid(), time.perf_counter() - started, documents
+
+
+class WorkerStats:
+    """Cards rendered and busy seconds per worker process."""
+
+    def __init__(self):
+        self.workers = defaultdict(lambda: [0, 0.0])
+
+    def add(self, pid, cards, seconds):
+        self.workers[pid][0] += cards
+        self.workers[pid][1] += seconds
+
+    @property
+    def cards(self):
+        return sum(cards for cards, _ in self.workers.values())
+
+    def rows(self):
+        """(pid, cards, busy seconds, cards per second) for each worker."""
+        for pid, (cards, seconds) in sorted(self.workers.items()):
+            yield pid, cards, seconds, cards / seconds if seconds else 0.0
+
+
+def _chunks(cards, size):
+    for start in range(0, len(cards), size):
+        yield cards[start:start + size]
+
+
+@cache
+def _pool(workers):
+    """Process pool shared by every caller in this process, started on first use."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+
+def iter_rendered(pairs, workers=None, chunk_size=CHUNK_SIZE, stats=None, student_ids=None):
+    """
+    (filename, pdf bytes) for every card in the given (class_id, term_id)
+    pairs. ``workers=0`` renders in-process; otherwise a pool of ``workers``
+    processes (default: CPU count). At most two chunks per worker are in
+    flight, so memory stays bounded however many classes are requested.
+    """
+    stats = stats if stats is not None else WorkerStats()
+    if workers == 0:
+        for class_id, term_id in pairs:
+            for chunk in _chunks(load_cards(class_id, term_id, student_ids), chunk_size):
+                pid, seconds, documents = render_cards(chunk)
+                stats.add(pid, len(documents), seconds)
+                yield from documents
+        return
+
+    workers = workers or os.cpu_count() or 1
+    pool = _pool(workers)
+    pending = set()
+
+    def collect(done):
+        for future in done:
+            pending.discard(future)
+            pid, seconds, documents = future.result()
+            stats.add(pid, len(documents), seconds)
+            yield from documents
+
+    try:
+        for class_id, term_id in pairs:
+            # Loading the next class overlaps with rendering of the previous one
+            for chunk in _chunks(load_cards(class_id, term_id, student_ids), chunk_size):
+                pending.add(pool.submit(render_cards, chunk))
+                while len(pending) >= workers * 2:
+                    yield from collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        while pending:
+            yield from collect(wait(pending, return_when=FIRST_COMPLETED).done)
+    except BrokenProcessPool:
+        _pool.cache_clear()  # a worker died; the next call starts a fresh pool
+        raise
+    finally:
+        # An abandoned download leaves nothing queued in the shared pool
+        for future in pending:
+            future.cancel()
+
+
+class _Sink:
+    """Write-only, unseekable buffer that zipfile streams into."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def stream_zip(documents):
+    """Zip archive of (filename, bytes) pairs as a generator of byte chunks."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, data in documents:
+            archive.writestr(filename, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def zip_filename(class_name, term):
+    return f'report-cards-{slugify(class_name)}-{slugify(term)}.zip'
@@ -0,0 +1,90 @@
+"""
+Term report aggregates: totals, averages and class positions.
+
+One ``TermReport`` row per student per term, plus ``Result.subject_position``,
+computed for a whole class-term in a single grouped pass with window
+functions. Only the class-terms touched by an approval are recomputed (after
+the approving transaction commits), so report cards and ranking lists are
+plain indexed lookups.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Sum, Window
+from django.db.models.functions import Rank
+
+from . import api
+from .models import Result, Student, TermReport
+from .upserts import upsert
+
+TWO_PLACES = Decimal('0.01')
+
+
+def _of_class(class_id, term_id):
+    # Through the class's students, so the (student, status, term) index is used
+    # instead of scanning every result of the term
+    return Result.objects.filter(
+        term_id=term_id, student_id__in=Student.objects.filter(current_class_id=class_id).values('pk'),
+    ).order_by()
+
+
+def _approved(class_id, term_id):
+    return _of_class(class_id, term_id).filter(status=Result.STATUS_APPROVED)
+
+
+@transaction.atomic
+def recompute(class_id, term_id):
+    """Rebuild the TermReports and subject positions of one class for one term."""
+    results = _approved(class_id, term_id)
+
+    rows = list(
+        results.values('student_id')
+        .annotate(total=Sum('score'), subject_count=Count('pk'), average=Avg('score'))
+        .annotate(position=Window(Rank(), order_by=F('average').desc()))
+    )
+    reports = [
+        TermReport(
+            student_id=row['student_id'], term_id=term_id, class_ref_id=class_id,
+            total=Decimal(row['total']).quantize(TWO_PLACES),
+            average=Decimal(str(row['average'])).quantize(TWO_PLACES),
+            subject_count=row['subject_count'], position=row['position'], class_size=len(rows),
+        )
+        for row in rows
+    ]
+    upsert(
+        reports, unique_fields=['student', 'term'],
+        update_fields=['class_ref', 'total', 'average', 'subject_count', 'position', 'class_size', 'computed_at'],
+    )
+    TermReport.objects.filter(term_id=term_id, class_ref_id=class_id).exclude(
+        student_id__in=[row['student_id'] for row in rows]
+    ).delete()
+
+    ranked = results.annotate(
+        rank=Window(Rank(), partition_by=F('subject_id'), order_by=F('score').desc())
+    ).values_list('pk', 'subject_position', 'rank')
+    changed = [Result(pk=pk, subject_position=rank) for pk, old, rank in ranked if old != rank]
+    Result.objects.bulk_update(changed, ['subject_position'], batch_size=500)
+    # Positions only describe approved results
+    _of_class(class_id, term_id).filter(
+        status__in=[Result.STATUS_PENDING, Result.STATUS_REJECTED], subject_position__isnull=False,
+    ).update(subject_position=None)
+    api.touch('results')
+    return len(reports)
+
+
+def affected(queryset):
+    """Distinct (class_id, term_id) pairs covered by a Result queryset."""
+    return set(queryset.order_by().values_list('student__current_class_id', 'term_id').distinct())
+
+
+def recompute_many(pairs):
+    for class_id, term_id in sorted(pairs, key=lambda p: (p[1], p[0] or 0)):
+        if class_id is not None:
+            recompute(class_id, term_id)
+
+
+def schedule(pairs):
+    """Recompute the given class-terms once the current transaction commits."""
+    pairs = set(pairs)
+    if pairs:
+        transaction.on_commit(lambda: recompute_many(pairs))
@@ -0,0 +1,194 @@
+"""
+Full-text search over students, news, announcements and admission applications.
+
+Every searchable object has one SearchEntry row (title and body text). It is
+upserted by the signal handlers in portal.signals whenever the object changes,
+and ``manage.py rebuild_search`` rebuilds the lot. The database indexes the
+entries itself (schema in migration 0011):
+
+* SQLite: an FTS5 table over SearchEntry maintained by triggers, ranked with
+  bm25 (title weighted over body);
+* PostgreSQL: a generated tsvector column with a GIN index, ranked with
+  ts_rank;
+* anything else: icontains over the entries, correct but unindexed.
+
+Every word of a query must match the start of a word in the entry, so
+"ade oka" finds "Adebayo Okafor".
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import strip_tags
+
+from .jobs import task
+from .models import AdmissionApplication, Announcement, NewsArticle, SearchEntry, Student
+from .upserts import upsert
+
+BATCH_SIZE = 500
+MAX_TERMS = 8
+TITLE_WEIGHT = 10.0
+
+KINDS = {
+    Student: SearchEntry.KIND_STUDENT,
+    NewsArticle: SearchEntry.KIND_NEWS,
+    Announcement: SearchEntry.KIND_ANNOUNCEMENT,
+    AdmissionApplication: SearchEntry.KIND_APPLICATION,
+}
+
+
+# --- Documents ------------------------------------------------------------------
+
+def _join(*parts):
+    return ' '.join(str(p) for p in parts if p)
+
+
+def _student(student):
+    user = student.user
+    return {
+        'title': user.get_full_name() or user.username,
+        'body': _join(student.student_id, user.username, user.email,
+                      student.current_class.name if student.current_class else '', student.parent_contact),
+        'url': reverse('portal:student_profile', args=[student.pk]),
+        'class_ref_id': student.current_class_id,
+    }
+
+
+def _news(article):
+    return {
+        'title': article.title,
+        'body': _join(article.excerpt, strip_tags(article.content)),
+        'url': reverse('public:news_detail', args=[article.slug]),
+        'class_ref_id': None,
+    }
+
+
+def _announcement(announcement):
+    return {
+        'title': announcement.title,
+        'body': announcement.content,
+        'url': reverse('portal:announcements_list'),
+        'class_ref_id': announcement.target_class_id if announcement.scope == Announcement.SCOPE_CLASS else None,
+    }
+
+
+def _application(app):
+    return {
+        'title': f'{app.first_name} {app.last_name}',
+        'body': _join(app.email, app.phone, app.guardian_name, app.guardian_contact,
+                      app.applying_class.name if app.applying_class else '', app.get_status_display()),
+        'url': reverse('admin:portal_admissionapplication_change', args=[app.pk]),
+        'class_ref_id': app.applying_class_id,
+    }
+
+
+# model: (document builder, queryset loading what the builder reads)
+DOCUMENTS = {
+    Student: (_student, lambda: Student.objects.select_related('user', 'current_class')),
+    NewsArticle: (_news, lambda: NewsArticle.objects.all()),
+    Announcement: (_announcement, lambda: Announcement.objects.all()),
+    AdmissionApplication: (_application, lambda: AdmissionApplication.objects.select_related('applying_class')),
+}
+
+
+# --- Indexing -------------------------------------------------------------------
+
+def index(instances):
+    """Upsert the entries of ``instances`` (all of one model) in batches; returns the count."""
+    entries = []
+    for instance in instances:
+        build, _ = DOCUMENTS[type(instance)]
+        entries.append(SearchEntry(kind=KINDS[type(instance)], object_id=instance.pk, **build(instance)))
+    return upsert(
+        entries, unique_fields=['kind', 'object_id'],
+        update_fields=['title', 'body', 'url', 'class_ref', 'updated_at'], batch_size=BATCH_SIZE,
+    )
+
+
+def unindex(model, pks):
+    return SearchEntry.objects.filter(kind=KINDS[model], object_id__in=pks).delete()[0]
+
+
+def rebuild(models=None):
+    """Recreate the entries of the given models (default: all); returns {kind: count}."""
+    counts = {}
+    for model in models or DOCUMENTS:
+        _, queryset = DOCUMENTS[model]
+        SearchEntry.objects.filter(kind=KINDS[model]).delete()
+        batch, count = [], 0
+        for instance in queryset().order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            batch.append(instance)
+            if len(batch) >= BATCH_SIZE:
+                count += index(batch)
+                batch = []
+        counts[KINDS[model]] = count + (index(batch) if batch else 0)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO portal_searchentry_fts(portal_searchentry_fts) VALUES ('optimize')")
+    return counts
+
+
+@task(priority=80)
+def reindex_class(class_id):
+    """Refresh the entries that mention a class's name (after a rename)."""
+    _, students = DOCUMENTS[Student]
+    _, applications = DOCUMENTS[AdmissionApplication]
+    return (
+        index(students().filter(current_class_id=class_id))
+        + index(applications().filter(applying_class_id=class_id))
+    )
+
+
+# --- Queries --------------------------------------------------------------------
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _filters(kinds, class_id):
+    sql, params = [], []
+    if kinds:
+        sql.append(f"e.kind IN ({', '.join(['%s'] * len(kinds))})")
+        params += list(kinds)
+    if class_id is not None:
+        sql.append('(e.class_ref_id IS NULL OR e.class_ref_id = %s)')
+        params.append(class_id)
+    return ''.join(f' AND {clause}' for clause in sql), params
+
+
+def search(query, kinds=None, class_id=None, limit=20):
+    """
+    Entries matching every word of ``query``, best first. ``kinds`` limits the
+    kinds searched. With ``class_id``, class-bound entries of other classes
+    are left out (0 leaves out every class-bound entry).
+    """
+    words = terms(query)
+    if not words:
+        return []
+    where, params = _filters(kinds, class_id)
+    columns = 'e.id, e.kind, e.object_id, e.title, e.body, e.url, e.class_ref_id'
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        return list(SearchEntry.objects.raw(
+            f'SELECT {columns}, bm25(portal_searchentry_fts, %s, 1.0) AS rank '
+            f'FROM portal_searchentry_fts JOIN portal_searchentry e ON e.id = portal_searchentry_fts.rowid '
+            f'WHERE portal_searchentry_fts MATCH %s{where} ORDER BY rank LIMIT %s',
+            [TITLE_WEIGHT, match, *params, limit],
+        ))
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        return list(SearchEntry.objects.raw(
+            f"SELECT {columns}, ts_rank(e.search_vector, q) AS rank "
+            f"FROM portal_searchentry e, to_tsquery('simple', %s) q "
+            f"WHERE e.search_vector @@ q{where} ORDER BY rank DESC LIMIT %s",
+            [tsquery, *params, limit],
+        ))
+    entries = SearchEntry.objects.all()
+    for word in words:
+        entries = entries.filter(Q(title__icontains=word) | Q(body__icontains=word))
+    if kinds:
+        entries = entries.filter(kind__in=kinds)
+    if class_id is not None:
+        entries = entries.filter(Q(class_ref=None) | Q(class_ref_id=class_id))
+    return list(entries.order_by('kind', 'title')[:limit])
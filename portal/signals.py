@@ -0,0 +1,272 @@
+"""
+Signal handlers keeping derived data (dashboard counters, announcement feeds,
+term reports, attendance bitmaps, image derivatives, search entries, picker
+keys, API response versions) in step
+with the models, queueing notifications for new announcements, and tuning
+new SQLite connections.
+"""
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_init, post_save, post_delete
+
+from . import api, attendance, counters, feeds, images, notifications, principal, reports, search, sqlite, typeahead
+from .models import Announcement, Attendance, Class, NewsArticle, Result, Student, Teacher, User
+
+_STATE_ATTR = '_counter_state'
+
+
+def _remember(sender, instance, **kwargs):
+    # Note which counters the object belonged to when it was loaded, so a later
+    # save can tell whether it moved into or out of a counted set.
+    setattr(instance, _STATE_ATTR, {
+        name: counters.matches(instance, filters)
+        for name, filters in counters.counters_for(sender) if filters
+    })
+
+
+def _saved(sender, instance, created, raw=False, **kwargs):
+    state = getattr(instance, _STATE_ATTR, {})
+    for name, filters in counters.counters_for(sender):
+        now = counters.matches(instance, filters)
+        if created:
+            counters.bump(name, 1 if now else 0)
+        elif filters:
+            before = state.get(name)
+            if before is None or now is None:
+                counters.recount(name)
+            elif before != now:
+                counters.bump(name, 1 if now else -1)
+        state[name] = now
+    setattr(instance, _STATE_ATTR, state)
+
+
+def _deleted(sender, instance, **kwargs):
+    state = getattr(instance, _STATE_ATTR, {})
+    for name, filters in counters.counters_for(sender):
+        counted = state.get(name, True) if filters else True
+        if counted is None:
+            counters.recount(name)
+        elif counted:
+            counters.bump(name, -1)
+
+
+for _model in {model for model, _ in counters.COUNTERS.values()}:
+    post_init.connect(_remember, sender=_model, dispatch_uid=f'counters-init-{_model.__name__}')
+    post_save.connect(_saved, sender=_model, dispatch_uid=f'counters-save-{_model.__name__}')
+    post_delete.connect(_deleted, sender=_model, dispatch_uid=f'counters-delete-{_model.__name__}')
+
+
+# --- Term reports -------------------------------------------------------------
+
+def _report_state(instance):
+    values = instance.__dict__
+    return values.get('status'), values.get('score')
+
+
+def _remember_result(sender, instance, **kwargs):
+    instance._report_state = _report_state(instance)
+
+
+def _result_changed(sender, instance, created=False, **kwargs):
+    # Admin edits and deletes of single results; bulk paths schedule their own recomputes
+    before = None if created else getattr(instance, '_report_state', None)
+    after = _report_state(instance)
+    deleted = kwargs.get('signal') is post_delete
+    touches_approved = Result.STATUS_APPROVED in (after[0], before[0] if before else None)
+    if touches_approved and (deleted or before != after):
+        class_id = Student.objects.filter(pk=instance.student_id).values_list('current_class_id', flat=True).first()
+        reports.schedule([(class_id, instance.term_id)])
+    instance._report_state = after
+
+
+post_init.connect(_remember_result, sender=Result, dispatch_uid='reports-init-result')
+post_save.connect(_result_changed, sender=Result, dispatch_uid='reports-save-result')
+post_delete.connect(_result_changed, sender=Result, dispatch_uid='reports-delete-result')
+
+
+# --- Attendance bitmaps ------------------------------------------------------
+
+def _attendance_changed(sender, instance, raw=False, **kwargs):
+    # Single saves (Django admin); the register writes through attendance.mark()
+    if raw:
+        return
+    session = attendance.session_for(instance.date)
+    if session is not None:
+        transaction.on_commit(lambda: attendance.rebuild(session, student_ids=[instance.student_id]))
+
+
+post_save.connect(_attendance_changed, sender=Attendance, dispatch_uid='attendance-save')
+post_delete.connect(_attendance_changed, sender=Attendance, dispatch_uid='attendance-delete')
+
+
+# --- Image derivatives -------------------------------------------------------
+
+def _image_saved(sender, instance, raw=False, **kwargs):
+    if not raw and images.is_stale(instance):
+        images.schedule(instance)
+
+
+post_save.connect(_image_saved, sender=NewsArticle, dispatch_uid='images-save-news')
+post_save.connect(_image_saved, sender=User, dispatch_uid='images-save-user')
+
+
+# --- Request principals --------------------------------------------------------
+
+def _user_changed(sender, instance, **kwargs):
+    principal.forget(instance.pk)
+
+
+def _profile_changed(sender, instance, **kwargs):
+    principal.forget(instance.user_id)
+
+
+def _class_renamed(sender, instance, created=False, **kwargs):
+    # Cached principals carry the class object; drop those of its students
+    if not created:
+        principal.forget(*instance.students.values_list('user_id', flat=True))
+
+
+post_save.connect(_user_changed, sender=User, dispatch_uid='principal-save-user')
+post_delete.connect(_user_changed, sender=User, dispatch_uid='principal-delete-user')
+for _model in (Student, Teacher):
+    post_save.connect(_profile_changed, sender=_model, dispatch_uid=f'principal-save-{_model.__name__}')
+    post_delete.connect(_profile_changed, sender=_model, dispatch_uid=f'principal-delete-{_model.__name__}')
+post_save.connect(_class_renamed, sender=Class, dispatch_uid='principal-save-class')
+
+
+# --- Announcement feeds -------------------------------------------------------
+
+def _announcement_audience(instance):
+    """(is_school_wide, target_class_id) from loaded fields; None if either was deferred."""
+    values = instance.__dict__
+    if 'scope' not in values or 'target_class_id' not in values:
+        return None
+    return values['scope'] == Announcement.SCOPE_SCHOOL, values['target_class_id']
+
+
+def _remember_announcement(sender, instance, **kwargs):
+    instance._feed_audience = _announcement_audience(instance)
+
+
+def _announcement_changed(sender, instance, created=False, **kwargs):
+    before = None if created else getattr(instance, '_feed_audience', None)
+    after = _announcement_audience(instance)
+    audiences = [a for a in (before, after) if a is not None]
+    # If either side is unknown, rebuild everything rather than risk a stale feed
+    unknown = after is None or (not created and before is None)
+    school = unknown or any(is_school for is_school, _ in audiences)
+    class_ids = {class_id for _, class_id in audiences}
+    transaction.on_commit(lambda: feeds.refresh(class_ids=class_ids, school=school))
+    instance._feed_audience = after
+
+
+def _class_changed(sender, instance, **kwargs):
+    # Class names are denormalised into feed entries; a deleted class's feed is dropped
+    if kwargs.get('signal') is post_delete:
+        transaction.on_commit(lambda: feeds.forget(instance.pk))
+    elif not kwargs.get('created'):
+        transaction.on_commit(lambda: feeds.refresh(class_ids=[instance.pk]))
+
+
+def _announcement_published(sender, instance, created, raw=False, **kwargs):
+    # The fan-out to recipients runs on the job queue; here it is one INSERT
+    if created and not raw:
+        notifications.announcement_published.enqueue(instance.pk)
+
+
+post_init.connect(_remember_announcement, sender=Announcement, dispatch_uid='feeds-init-announcement')
+post_save.connect(_announcement_changed, sender=Announcement, dispatch_uid='feeds-save-announcement')
+post_delete.connect(_announcement_changed, sender=Announcement, dispatch_uid='feeds-delete-announcement')
+post_save.connect(_announcement_published, sender=Announcement, dispatch_uid='notifications-save-announcement')
+post_save.connect(_class_changed, sender=Class, dispatch_uid='feeds-save-class')
+post_delete.connect(_class_changed, sender=Class, dispatch_uid='feeds-delete-class')
+
+
+# --- Search index -------------------------------------------------------------
+
+SEARCHED_USER_FIELDS = {'first_name', 'last_name', 'username', 'email'}
+
+
+def _index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index([instance])
+
+
+def _unindex(sender, instance, **kwargs):
+    search.unindex(sender, [instance.pk])
+
+
+def _user_searchable_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A student's entry carries the user's name and email; logins only touch last_login
+    if raw or instance.role != User.ROLE_STUDENT:
+        return
+    if update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields):
+        return
+    search.index(Student.objects.select_related('user', 'current_class').filter(user=instance))
+
+
+def _class_searchable_changed(sender, instance, created=False, raw=False, **kwargs):
+    # Class names are denormalised into student and application entries
+    if not created and not raw:
+        search.reindex_class.enqueue(instance.pk)
+
+
+for _model in search.DOCUMENTS:
+    post_save.connect(_index, sender=_model, dispatch_uid=f'search-save-{_model.__name__}')
+    post_delete.connect(_unindex, sender=_model, dispatch_uid=f'search-delete-{_model.__name__}')
+post_save.connect(_user_searchable_changed, sender=User, dispatch_uid='search-save-user')
+post_save.connect(_class_searchable_changed, sender=Class, dispatch_uid='search-save-class')
+
+
+# --- Typeahead keys -----------------------------------------------------------
+
+PICKER_USER_FIELDS = {'first_name', 'last_name', 'username'}
+
+
+def _refresh_keys(sender, instance, raw=False, **kwargs):
+    if not raw:
+        typeahead.refresh(typeahead.KINDS[sender], [instance])
+
+
+def _remove_keys(sender, instance, **kwargs):
+    typeahead.remove(typeahead.KINDS[sender], [instance.pk])
+
+
+def _user_keys_changed(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Keys and labels carry the user's names; a new user has no profile yet
+    if raw or created or instance.role not in (User.ROLE_STUDENT, User.ROLE_TEACHER):
+        return
+    if update_fields is not None and not PICKER_USER_FIELDS & set(update_fields):
+        return
+    for kind, (_, _, queryset) in typeahead.SOURCES.items():
+        typeahead.refresh(kind, queryset().filter(user=instance))
+
+
+def _class_keys_changed(sender, instance, created=False, raw=False, **kwargs):
+    # Student labels show the class name
+    if not created and not raw:
+        typeahead.refresh_class.enqueue(instance.pk)
+
+
+for _model in typeahead.KINDS:
+    post_save.connect(_refresh_keys, sender=_model, dispatch_uid=f'typeahead-save-{_model.__name__}')
+    post_delete.connect(_remove_keys, sender=_model, dispatch_uid=f'typeahead-delete-{_model.__name__}')
+post_save.connect(_user_keys_changed, sender=User, dispatch_uid='typeahead-save-user')
+post_save.connect(_class_keys_changed, sender=Class, dispatch_uid='typeahead-save-class')
+
+
+# --- API versions -------------------------------------------------------------
+
+def _api_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        api.touch(*api.DEPENDENTS[sender])
+
+
+for _model in api.DEPENDENTS:
+    post_save.connect(_api_changed, sender=_model, dispatch_uid=f'api-save-{_model.__name__}')
+    post_delete.connect(_api_changed, sender=_model, dispatch_uid=f'api-delete-{_model.__name__}')
+
+
+# --- SQLite connections -------------------------------------------------------
+
+connection_created.connect(sqlite.tune, dispatch_uid='sqlite-tune')
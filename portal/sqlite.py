@@ -0,0 +1,60 @@
+"""
+SQLite tuning for running the portal on SQLite under several gunicorn workers.
+
+Every new SQLite connection gets ``settings.SQLITE_PRAGMAS`` (WAL journal,
+synchronous=NORMAL, busy_timeout, mmap and page cache sizes) from the
+connection_created handler in portal.signals. With WAL, readers never wait
+for writers and writers wait (up to busy_timeout) for each other instead of
+failing. The portal.backends.sqlite3 engine starts transactions with BEGIN
+IMMEDIATE.
+
+The WAL file is checkpointed back into the database automatically, but only
+when no reader holds it open. ``manage.py sqlite_maintenance`` runs a full
+checkpoint and PRAGMA optimize; schedule it every few minutes on busy sites.
+"""
+import os
+
+from django.conf import settings
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def tune(sender, connection, **kwargs):
+    """connection_created handler: apply SQLITE_PRAGMAS to SQLite connections."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def pragma(connection, name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+def wal_size(connection):
+    """Bytes in the connection's -wal file (0 when there is none)."""
+    try:
+        return os.path.getsize(f"{connection.settings_dict['NAME']}-wal")
+    except OSError:
+        return 0
+
+
+def checkpoint(connection, mode='TRUNCATE'):
+    """
+    Copy the WAL into the database file. Returns (busy, wal pages, pages
+    checkpointed); busy is 1 if readers or writers kept it from finishing.
+    """
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f'Unknown checkpoint mode {mode}.')
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+        return tuple(cursor.fetchone())
+
+
+def optimize(connection):
+    """Refresh the query planner statistics that have gone stale (PRAGMA optimize)."""
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA optimize')
@@ -0,0 +1,36 @@
+"""
+{% picture %}: a <picture> element with srcset for an image's derivatives.
+
+    {% load images %}
+    {% picture article.image article.image_variants sizes="(max-width: 600px) 100vw, 33vw" alt=article.title %}
+
+Falls back to the original upload while derivatives are still being built.
+"""
+from django import template
+from django.core.files.storage import default_storage
+
+from portal.images import MIME_TYPES
+
+register = template.Library()
+
+
+@register.inclusion_tag('portal/_picture.html')
+def picture(image, variants, sizes='100vw', alt='', css_class='', eager=False):
+    sources = (variants or {}).get('sources') or {}
+    srcsets = {
+        ext: ', '.join(f'{default_storage.url(name)} {width}w' for width, name in entries)
+        for ext, entries in sources.items() if entries
+    }
+    fallback = sources.get('jpg') or []
+    return {
+        'original': image.url if image and not fallback else None,
+        'sources': [(MIME_TYPES[ext], srcset) for ext, srcset in srcsets.items() if ext != 'jpg'],
+        'srcset': srcsets.get('jpg', ''),
+        'src': default_storage.url(fallback[len(fallback) // 2][1]) if fallback else None,
+        'width': variants.get('width') if variants else None,
+        'height': variants.get('height') if variants else None,
+        'sizes': sizes,
+        'alt': alt,
+        'css_class': css_class,
+        'loading': 'eager' if eager else 'lazy',
+    }
@@ -0,0 +1,676 @@
+import csv
+import io
+import zipfile
+from datetime import date, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import api, approvals, attendance, counters, feeds, jobs, notifications, onboarding, replicas, reports, search
+from .importers import ResultImporter
+from .models import (
+    AcademicSession, Announcement, Attendance, AttendanceYear, Class, ClassSubject, Counter, Job, Notification, Result,
+    SearchEntry, Student, Subject, Teacher, Term, TermReport, User,
+)
+from .pagination import KeysetPaginator
+
+# Cached feeds and API responses must not outlive a test
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'sessions')
+}
+
+
+class BulkResultActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ROLE_ADMIN)
+        session = AcademicSession.objects.create(name='2024/2025', start_date='2024-09-01', end_date='2025-07-31')
+        cls.term = Term.objects.create(session=session, name='First Term', start_date='2024-09-01', end_date='2024-12-15')
+        subject = Subject.objects.create(name='Mathematics', code='MTH')
+        for name in ('JSS 1', 'JSS 2'):
+            class_ref = Class.objects.create(name=name)
+            user = User.objects.create_user(f'student-{name}', role=User.ROLE_STUDENT)
+            student = Student.objects.create(user=user, student_id=f'S-{name}', current_class=class_ref)
+            Result.objects.create(student=student, subject=subject, term=cls.term, score=50)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_invalid_filter_changes_nothing(self):
+        response = self.client.post(reverse('portal:bulk_result_action'), {
+            'scope': 'filter', 'action': 'approve', 'term': self.term.pk, 'class_ref': 999999,
+        })
+        self.assertRedirects(response, reverse('portal:results_management'), fetch_redirect_response=False)
+        self.assertFalse(Result.objects.filter(status=Result.STATUS_APPROVED).exists())
+        self.assertIn('no longer valid', ' '.join(str(m) for m in get_messages(response.wsgi_request)))
+
+    def test_valid_filter_approves_only_matching_results(self):
+        class_ref = Class.objects.get(name='JSS 1')
+        self.client.post(reverse('portal:bulk_result_action'), {
+            'scope': 'filter', 'action': 'approve', 'term': self.term.pk, 'class_ref': class_ref.pk,
+        })
+        approved = Result.objects.filter(status=Result.STATUS_APPROVED)
+        self.assertEqual(list(approved.values_list('student__current_class', flat=True)), [class_ref.pk])
+
+
+class StudentProfilePagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ROLE_ADMIN)
+        session = AcademicSession.objects.create(name='2024/2025', start_date='2024-09-01', end_date='2025-07-31')
+        # Created out of calendar order: the newest term has the lowest pk
+        cls.third = Term.objects.create(session=session, name='Third Term', start_date='2025-04-20', end_date='2025-07-31')
+        cls.first = Term.objects.create(session=session, name='First Term', start_date='2024-09-01', end_date='2024-12-15')
+        cls.second = Term.objects.create(session=session, name='Second Term', start_date='2025-01-06', end_date='2025-04-05')
+        user = User.objects.create_user('student', role=User.ROLE_STUDENT)
+        cls.student = Student.objects.create(user=user, student_id='S-1')
+        for code in ('BIO', 'CHM', 'ENG', 'MTH'):
+            subject = Subject.objects.create(name=code, code=code)
+            for term in (cls.first, cls.second, cls.third):
+                Result.objects.create(student=cls.student, subject=subject, term=term, score=50)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pages_run_newest_term_first_without_gaps_or_repeats(self):
+        results = Result.objects.filter(student=self.student).annotate(term_start=F('term__start_date'))
+        paginator = KeysetPaginator(results, ('-term_start', '-term_id', 'subject_id', 'pk'), per_page=5)
+        rows, page = [], paginator.page()
+        while True:
+            rows += page.object_list
+            if not page.has_next:
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(sorted(r.pk for r in rows), sorted(Result.objects.values_list('pk', flat=True)))
+        self.assertEqual([r.term_id for r in rows], [self.third.pk] * 4 + [self.second.pk] * 4 + [self.first.pk] * 4)
+
+    def test_profile_renders(self):
+        response = self.client.get(reverse('portal:student_profile', args=[self.student.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_non_numeric_class_filter_is_ignored(self):
+        response = self.client.get(reverse('portal:student_management'), {'class': '²'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ReportPositionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ROLE_ADMIN)
+        session = AcademicSession.objects.create(name='2024/2025', start_date='2024-09-01', end_date='2025-07-31')
+        cls.term = Term.objects.create(session=session, name='First Term', start_date='2024-09-01', end_date='2024-12-15')
+        cls.class_ref = Class.objects.create(name='JSS 1')
+        maths = Subject.objects.create(name='Mathematics', code='MTH')
+        english = Subject.objects.create(name='English', code='ENG')
+        cls.students = {}
+        for name, scores in (('ada', (90, 80)), ('bola', (70, 80)), ('chi', (80, 70)), ('dayo', (40, 50))):
+            user = User.objects.create_user(name, role=User.ROLE_STUDENT)
+            student = Student.objects.create(user=user, student_id=name, current_class=cls.class_ref)
+            for subject, score in zip((maths, english), scores):
+                Result.objects.create(student=student, subject=subject, term=cls.term, score=score,
+                                      status=Result.STATUS_APPROVED)
+            cls.students[name] = student
+        # Pending results carry no position and do not count towards the report
+        Result.objects.filter(student=cls.students['dayo'], subject=english).update(status=Result.STATUS_PENDING)
+
+    def test_positions_share_ranks_on_ties(self):
+        self.assertEqual(reports.recompute(self.class_ref.pk, self.term.pk), 4)
+        positions = dict(TermReport.objects.values_list('student__student_id', 'position'))
+        self.assertEqual(positions, {'ada': 1, 'bola': 2, 'chi': 2, 'dayo': 4})
+        report = TermReport.objects.get(student=self.students['dayo'])
+        self.assertEqual((report.subject_count, report.class_size), (1, 4))
+        self.assertEqual(
+            dict(Result.objects.filter(subject__code='ENG').values_list('student__student_id', 'subject_position')),
+            {'ada': 1, 'bola': 1, 'chi': 3, 'dayo': None},
+        )
+
+    def test_recompute_drops_reports_of_students_without_approved_results(self):
+        reports.recompute(self.class_ref.pk, self.term.pk)
+        Result.objects.filter(student=self.students['dayo']).update(status=Result.STATUS_REJECTED)
+        reports.recompute(self.class_ref.pk, self.term.pk)
+        self.assertFalse(TermReport.objects.filter(student=self.students['dayo']).exists())
+        self.assertEqual(TermReport.objects.get(student=self.students['ada']).class_size, 3)
+
+    def test_rankings_with_non_numeric_ids_are_not_found(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('portal:class_rankings'), {'class': 'abc', 'term': self.term.pk})
+        self.assertEqual(response.status_code, 404)
+
+
+class AttendanceYearTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ROLE_ADMIN)
+        cls.session = AcademicSession.objects.create(
+            name='2024/2025', start_date=date(2024, 9, 1), end_date=date(2025, 7, 31), is_current=True,
+        )
+        cls.class_ref = Class.objects.create(name='JSS 1')
+        cls.students = []
+        for name in ('ada', 'bola'):
+            user = User.objects.create_user(name, role=User.ROLE_STUDENT)
+            cls.students.append(Student.objects.create(user=user, student_id=name, current_class=cls.class_ref))
+
+    def _mark(self, on_date, *present):
+        ada, bola = self.students
+        attendance.mark(on_date, {ada.pk: (present[0], ''), bola.pk: (present[1], '')})
+
+    def test_marking_sets_bits_and_remarking_overwrites_them(self):
+        ada, bola = self.students
+        self._mark(date(2024, 9, 2), True, False)
+        self._mark(date(2024, 9, 3), True, True)
+        self._mark(date(2024, 9, 2), False, True)  # corrected register
+        year = AttendanceYear.objects.select_related('session').get(student=ada)
+        self.assertEqual(attendance.year_days(year), [(date(2024, 9, 2), False), (date(2024, 9, 3), True)])
+        self.assertEqual((year.days_marked, year.days_present), (2, 1))
+        self.assertEqual(year.rollups['months'], {'2024-09': [2, 1]})
+        self.assertEqual(AttendanceYear.objects.get(student=bola).days_present, 2)
+        self.assertEqual(Attendance.objects.count(), 4)
+
+    def test_rebuild_matches_incremental_marking(self):
+        for day in range(2, 12):
+            self._mark(date(2024, 9, day), day % 3 != 0, day % 2 == 0)
+        marked = {y.student_id: (bytes(y.marked), bytes(y.present), y.rollups) for y in AttendanceYear.objects.all()}
+        AttendanceYear.objects.all().delete()
+        self.assertEqual(attendance.rebuild(self.session), 2)
+        rebuilt = {y.student_id: (bytes(y.marked), bytes(y.present), y.rollups) for y in AttendanceYear.objects.all()}
+        self.assertEqual(rebuilt, marked)
+
+    def test_term_report_uses_current_term_dates(self):
+        self._mark(date(2024, 9, 2), True, False)
+        self._mark(date(2025, 1, 7), True, True)
+        # Created after the days were marked
+        term = Term.objects.create(session=self.session, name='First Term',
+                                   start_date=date(2024, 9, 1), end_date=date(2024, 12, 15))
+        classes, flagged = attendance.absence_report(self.session, term)
+        self.assertEqual([(c['marked'], c['present']) for c in classes], [(2, 1)])
+        self.assertEqual([row['student_id'] for row in flagged], ['bola'])
+        term.end_date = date(2025, 1, 31)
+        term.save()
+        classes, flagged = attendance.absence_report(self.session, term)
+        self.assertEqual([(c['marked'], c['present']) for c in classes], [(4, 3)])
+
+    def test_report_with_non_numeric_ids_is_not_found(self):
+        self.client.force_login(self.admin)
+        for params in ({'session': 'x'}, {'session': self.session.pk, 'term': '²'}):
+            self.assertEqual(self.client.get(reverse('portal:attendance_report'), params).status_code, 404)
+
+
+class OnboardingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.class_ref = Class.objects.create(name='JSS 1')
+
+    def _onboard(self):
+        onboarder = onboarding.StudentOnboarder(class_ref=self.class_ref, workers=1)
+        entries = onboarder.from_rows([['name', 'password'], ['Ada Obi', 'pw-ada'], ['Bola Ade', '']])
+        return onboarder.run(entries)
+
+    def test_students_are_linked_to_their_users(self):
+        report = self._onboard()
+        self.assertTrue(report.ok)
+        self.assertEqual(report.created, 2)
+        self.assertEqual(
+            sorted(Student.objects.values_list('user__first_name', 'current_class__name')),
+            [('Ada', 'JSS 1'), ('Bola', 'JSS 1')],
+        )
+
+    def test_generated_ids_skip_hand_typed_ones(self):
+        prefix = f'{settings.STUDENT_ID_PREFIX}{timezone.localdate().year}'
+        for serial in ('0007', '²'):
+            user = User.objects.create_user(f'typed-{serial}', role=User.ROLE_STUDENT)
+            Student.objects.create(user=user, student_id=f'{prefix}{serial}')
+        self.assertTrue(self._onboard().ok)
+        self.assertEqual(
+            sorted(Student.objects.filter(user__first_name__in=['Ada', 'Bola']).values_list('student_id', flat=True)),
+            [f'{prefix}0008', f'{prefix}0009'],
+        )
+
+    def test_backends_without_returned_pks(self):
+        # MySQL: bulk_create leaves the new objects without pks
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False):
+            report = self._onboard()
+        self.assertTrue(report.ok)
+        for student in Student.objects.select_related('user'):
+            self.assertEqual(student.user.username, student.student_id.lower())
+
+
+@jobs.task(max_attempts=2)
+def flaky(fail):
+    if fail:
+        raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def test_claim_marks_the_job_running_for_one_worker(self):
+        job = flaky.enqueue(False)
+        self.assertEqual(jobs.claim('w1'), [job])
+        self.assertEqual(jobs.claim('w2'), [])
+        self.assertTrue(jobs.run(Job.objects.get(pk=job.pk)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.STATUS_DONE, 1, 'w1'))
+
+    def test_expired_claim_is_claimed_again(self):
+        job = flaky.enqueue(False)
+        jobs.claim('w1')
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        [reclaimed] = jobs.claim('w2')
+        self.assertEqual((reclaimed.locked_by, reclaimed.attempts), ('w2', 2))
+
+    def test_failure_is_retried_with_backoff_then_failed(self):
+        job = flaky.enqueue(True)
+        [claimed] = jobs.claim('w1')
+        with self.assertLogs('portal.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(claimed))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=jobs.RETRY_DELAY - 5))
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('portal.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(jobs.claim('w1')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+        self.assertIn('RuntimeError: boom', job.last_error)
+
+    def test_enqueue_unique_keeps_one_queued_job_per_key(self):
+        flaky.enqueue_unique('k', timezone.now(), False)
+        flaky.enqueue_unique('k', timezone.now(), False)
+        self.assertEqual(Job.objects.filter(key='k').count(), 1)
+
+    def test_failed_keyed_job_is_not_requeued_beside_its_successor(self):
+        flaky.enqueue_unique('k', timezone.now(), True)
+        [running] = jobs.claim('w1')
+        flaky.enqueue_unique('k', timezone.now(), True)  # queued while the first one runs
+        with self.assertLogs('portal.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(running))
+        running.refresh_from_db()
+        self.assertEqual(running.status, Job.STATUS_FAILED)
+        self.assertIn('already queued', running.last_error)
+        self.assertEqual(Job.objects.filter(key='k', status=Job.STATUS_QUEUED).count(), 1)
+
+    def test_retry_skips_keys_that_are_already_queued(self):
+        flaky.enqueue_unique('k', timezone.now(), True)
+        Job.objects.filter(key='k').update(status=Job.STATUS_FAILED)
+        flaky.enqueue_unique('k', timezone.now(), True)
+        other = flaky.enqueue(True)
+        Job.objects.filter(pk=other.pk).update(status=Job.STATUS_FAILED)
+        self.assertEqual(jobs.retry(Job.objects.filter(status=Job.STATUS_FAILED)), 1)
+        self.assertEqual(Job.objects.get(pk=other.pk).status, Job.STATUS_QUEUED)
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.class_ref = Class.objects.create(name='JSS 1')
+        user = User.objects.create_user('adebayo', first_name='Adebayo', last_name='Okafor', role=User.ROLE_STUDENT)
+        cls.student = Student.objects.create(user=user, student_id='S-1', current_class=cls.class_ref)
+
+    def _titles(self, query):
+        return [entry.title for entry in search.search(query)]
+
+    def test_saves_keep_one_entry_per_object(self):
+        self.assertEqual(self._titles('ade oka'), ['Adebayo Okafor'])
+        self.student.user.last_name = 'Eze'
+        self.student.user.save()
+        self.assertEqual(SearchEntry.objects.filter(kind=SearchEntry.KIND_STUDENT).count(), 1)
+        self.assertEqual(self._titles('oka'), [])
+        self.assertEqual(self._titles('adebayo eze'), ['Adebayo Eze'])
+
+    def test_backends_without_upsert_update_in_place(self):
+        entry = SearchEntry.objects.get(kind=SearchEntry.KIND_STUDENT)
+        features = type(connection.features)
+        with mock.patch.object(features, 'supports_update_conflicts', new_callable=mock.PropertyMock, return_value=False), \
+                mock.patch.object(features, 'supports_update_conflicts_with_target', new_callable=mock.PropertyMock,
+                                  return_value=False):
+            self.student.user.first_name = 'Bayo'
+            self.student.user.save()
+            other = User.objects.create_user('chi', first_name='Chi', role=User.ROLE_STUDENT)
+            search.index(Student.objects.select_related('user', 'current_class').filter(pk__in=[
+                self.student.pk, Student.objects.create(user=other, student_id='S-2').pk,
+            ]))
+        updated = SearchEntry.objects.get(kind=SearchEntry.KIND_STUDENT, object_id=self.student.pk)
+        self.assertEqual((updated.pk, updated.title), (entry.pk, 'Bayo Okafor'))
+        self.assertGreater(updated.updated_at, entry.updated_at)
+        self.assertEqual(SearchEntry.objects.filter(kind=SearchEntry.KIND_STUDENT).count(), 2)
+
+
+class TeacherPickerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ROLE_ADMIN)
+        session = AcademicSession.objects.create(name='2024/2025', start_date='2024-09-01', end_date='2025-07-31')
+        term = Term.objects.create(session=session, name='First Term', start_date='2024-09-01', end_date='2024-12-15')
+        subject = Subject.objects.create(name='Mathematics', code='MTH')
+        cls.teachers = []
+        for i, name in enumerate(('Ngozi', 'Tunde')):
+            user = User.objects.create_user(name.lower(), first_name=name, role=User.ROLE_TEACHER)
+            cls.teachers.append(Teacher.objects.create(user=user, employee_id=f'T-{i}'))
+            student = Student.objects.create(
+                user=User.objects.create_user(f'student-{i}', role=User.ROLE_STUDENT), student_id=f'S-{i}',
+            )
+            Result.objects.create(student=student, subject=subject, term=term, score=50, uploaded_by=user)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_uploader_filter_takes_the_picked_teacher(self):
+        teacher = self.teachers[1]
+        response = self.client.get(reverse('portal:results_management'), {'uploaded_by': teacher.pk})
+        self.assertEqual([r.uploaded_by for r in response.context['pending_results']], [teacher.user])
+        self.assertContains(response, 'data-typeahead="%s"' % reverse('portal:typeahead', args=['teacher']))
+        self.assertContains(response, 'Tunde · T-1')
+
+    def test_picker_answers_by_kind(self):
+        response = self.client.get(reverse('portal:typeahead', args=['teacher']), {'q': 'ngo'})
+        self.assertEqual(response.json()['results'], [{'id': self.teachers[0].pk, 'text': 'Ngozi · T-0'}])
+        self.assertEqual(self.client.get(reverse('portal:typeahead', args=['parent']), {'q': 'a'}).status_code, 404)
+        self.client.force_login(self.teachers[0].user)
+        self.assertEqual(self.client.get(reverse('portal:typeahead', args=['teacher']), {'q': 'a'}).status_code, 403)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='x', role=User.ROLE_ADMIN)
+        cls.class_ref = Class.objects.create(name='JSS 1')
+        for i, (first, contact) in enumerate((('=HYPERLINK("http://x")', '+2348030000000'), ('Ada', '0803'))):
+            user = User.objects.create_user(f'student-{i}', first_name=first, role=User.ROLE_STUDENT)
+            Student.objects.create(user=user, student_id=f'S-{i}', current_class=cls.class_ref, parent_contact=contact)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _csv(self, response):
+        body = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(body)))
+
+    def test_roster_streams_one_row_per_student(self):
+        response = self.client.get(reverse('portal:export_roster'), {'class': self.class_ref.pk, 'format': 'csv'})
+        rows = self._csv(response)
+        self.assertEqual(rows[0][:3], ['student_id', 'first_name', 'last_name'])
+        self.assertEqual([row[0] for row in rows[1:]], ['S-0', 'S-1'])
+        self.assertIn('roster-jss-1', response['Content-Disposition'])
+
+    def test_csv_cells_are_not_formulas(self):
+        rows = self._csv(self.client.get(reverse('portal:export_roster'), {'format': 'csv'}))
+        self.assertEqual((rows[1][1], rows[1][7]), ('\'=HYPERLINK("http://x")', "'+2348030000000"))
+        self.assertEqual((rows[2][1], rows[2][7]), ('Ada', '0803'))
+
+    def test_xlsx_is_a_readable_workbook(self):
+        response = self.client.get(reverse('portal:export_roster'), {'format': 'xlsx'})
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 3)
+        # Inline strings are never evaluated, so they keep their text as is
+        self.assertIn('<t xml:space="preserve">=HYPERLINK("http://x")</t>', sheet)
+
+    def test_non_numeric_ids_are_not_found(self):
+        for value in ('abc', '²'):
+            self.assertEqual(self.client.get(reverse('portal:export_roster'), {'class': value}).status_code, 404)
+
+    def test_bulk_action_ignores_non_numeric_selections(self):
+        response = self.client.post(reverse('portal:bulk_result_action'), {
+            'scope': 'selected', 'action': 'approve', 'selected': ['²'],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('No results selected', ' '.join(str(m) for m in get_messages(response.wsgi_request)))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        session = AcademicSession.objects.create(name='2024/2025', start_date='2024-09-01', end_date='2025-07-31')
+        cls.term = Term.objects.create(session=session, name='First Term', start_date='2024-09-01', end_date='2024-12-15')
+        subject = Subject.objects.create(name='Mathematics', code='MTH')
+        cls.teacher = Teacher.objects.create(user=User.objects.create_user('teacher', role=User.ROLE_TEACHER))
+        cls.classes, cls.students = [], []
+        for name in ('JSS 1', 'JSS 2'):
+            class_ref = Class.objects.create(name=name)
+            user = User.objects.create_user(f'student-{name}', role=User.ROLE_STUDENT)
+            student = Student.objects.create(user=user, student_id=f'S-{name}', current_class=class_ref)
+            Result.objects.create(student=student, subject=subject, term=cls.term, score=60,
+                                  status=Result.STATUS_APPROVED, uploaded_by=cls.teacher.user)
+            Attendance.objects.create(student=student, date='2024-09-02', present=True)
+            cls.classes.append(class_ref)
+            cls.students.append(student)
+        cls.subject = subject
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, name, **params):
+        return self.client.get(reverse('api_v1:resource', args=[name]), params)
+
+    def test_students_read_only_their_own_approved_results(self):
+        student = self.students[0]
+        Result.objects.create(student=student, subject=Subject.objects.create(name='English', code='ENG'),
+                              term=self.term, score=70)
+        self.client.force_login(student.user)
+        data = self._get('results', fields='student,score').json()['data']
+        self.assertEqual(data, [{'student': student.pk, 'score': '60.00'}])
+
+    def test_malformed_numbers_are_bad_requests(self):
+        self.client.force_login(self.students[0].user)
+        for params in ({'term': '²'}, {'term': 'x'}, {'limit': '²'}, {'limit': '0'}, {'limit': '-5'}):
+            self.assertEqual(self._get('results', **params).status_code, 400, params)
+
+    def test_etag_holds_until_the_data_changes(self):
+        self.client.force_login(self.students[0].user)
+        etag = self._get('results')['ETag']
+        self.assertEqual(self.client.get(reverse('api_v1:resource', args=['results']),
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Result.objects.filter(student=self.students[0]).update(score=75)
+            api.touch('results')
+        response = self.client.get(reverse('api_v1:resource', args=['results']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][0]['score'], '75.00')
+
+    def test_teacher_attendance_follows_class_assignments(self):
+        self.client.force_login(self.teacher.user)
+        self.assertEqual(self._get('attendance', fields='student').json()['data'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment = ClassSubject.objects.create(class_ref=self.classes[1], subject=self.subject, teacher=self.teacher)
+        self.assertEqual(self._get('attendance', fields='student').json()['data'], [{'student': self.students[1].pk}])
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.delete()
+        self.assertEqual(self._get('attendance', fields='student').json()['data'], [])
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        session = AcademicSession.objects.create(name='2024/2025', start_date='2024-09-01', end_date='2025-07-31')
+        cls.term = Term.objects.create(session=session, name='First Term', start_date='2024-09-01', end_date='2024-12-15')
+        cls.subject = Subject.objects.create(name='Mathematics', code='MTH')
+        cls.teacher = User.objects.create_user('teacher', role=User.ROLE_TEACHER)
+        cls.students = [
+            Student.objects.create(user=User.objects.create_user(f'student-{i}', role=User.ROLE_STUDENT),
+                                   student_id=f'S-{i}')
+            for i in range(3)
+        ]
+
+    def assertInStep(self, *names):
+        for name in names:
+            self.assertEqual(counters.read(name)[name], counters.true_count(name), name)
+
+    def test_single_saves_and_deletes(self):
+        result = Result.objects.create(student=self.students[0], subject=self.subject, term=self.term, score=50)
+        self.assertEqual(counters.read(counters.PENDING_RESULTS), {counters.PENDING_RESULTS: 1})
+        result.status = Result.STATUS_REJECTED
+        result.save()
+        self.assertInStep(counters.PENDING_RESULTS)
+        Result.objects.get(pk=result.pk).delete()  # loaded fresh: its state comes from post_init
+        self.students[2].delete()
+        self.assertInStep(counters.PENDING_RESULTS, counters.STUDENTS)
+
+    def test_bulk_paths_bump_by_the_rows_they_move(self):
+        self.assertInStep(counters.PENDING_RESULTS)
+        rows = [['student_id', 'score'], ['S-0', '40'], ['S-1', '50']]
+        for _ in range(2):  # re-importing pending rows leaves them pending, not counted twice
+            ResultImporter(self.term, self.teacher, subject=self.subject).run(rows)
+        self.assertEqual(counters.read(counters.PENDING_RESULTS)[counters.PENDING_RESULTS], 2)
+        approvals.approve(approvals.pending_results(pks=[Result.objects.get(student=self.students[0]).pk]))
+        approvals.reject(approvals.pending_results())
+        self.assertInStep(counters.PENDING_RESULTS)
+        ResultImporter(self.term, self.teacher, subject=self.subject).run(rows)  # reopens the rejected one
+        self.assertEqual(counters.read(counters.PENDING_RESULTS)[counters.PENDING_RESULTS], 1)
+        self.assertInStep(counters.PENDING_RESULTS)
+
+    def test_reconcile_corrects_drift(self):
+        counters.read()
+        Counter.objects.filter(name=counters.STUDENTS).update(value=99)
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('corrected 99 -> 3', out.getvalue())
+        self.assertInStep(*counters.COUNTERS)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.jss1 = Class.objects.create(name='JSS 1')
+        cls.jss2 = Class.objects.create(name='JSS 2')
+
+    def setUp(self):
+        cache.clear()
+
+    def _announce(self, title, class_ref=None, **fields):
+        scope = Announcement.SCOPE_CLASS if class_ref else Announcement.SCOPE_SCHOOL
+        with self.captureOnCommitCallbacks(execute=True):
+            return Announcement.objects.create(title=title, content='-', scope=scope, target_class=class_ref, **fields)
+
+    def _titles(self, class_ref=None):
+        return [entry['title'] for entry in feeds.get_feed(class_ref.pk if class_ref else None)]
+
+    def test_class_feeds_merge_school_and_own_notices(self):
+        self._announce('Sports day', date=date(2024, 10, 1))
+        self._announce('JSS 1 trip', self.jss1, date=date(2024, 10, 2))
+        self.assertEqual(self._titles(self.jss1), ['JSS 1 trip', 'Sports day'])
+        self.assertEqual(self._titles(self.jss2), ['Sports day'])
+        self.assertEqual(self._titles(), ['Sports day'])
+
+    def test_writes_reach_cached_feeds(self):
+        for class_ref in (self.jss1, self.jss2, None):
+            self._titles(class_ref)  # warm every feed
+        trip = self._announce('Trip', self.jss1)
+        self.assertEqual((self._titles(self.jss1), self._titles(self.jss2)), (['Trip'], []))
+        holiday = self._announce('Holiday')
+        self.assertEqual(self._titles(self.jss2), ['Holiday'])
+        with self.captureOnCommitCallbacks(execute=True):
+            trip.target_class = self.jss2  # moved: both classes' feeds change
+            trip.save()
+        self.assertNotIn('Trip', self._titles(self.jss1))
+        self.assertIn('Trip', self._titles(self.jss2))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jss2.name = 'JSS 2A'
+            self.jss2.save()
+        names = {entry['title']: entry['target_class_name'] for entry in feeds.get_feed(self.jss2.pk)}
+        self.assertEqual(names['Trip'], 'JSS 2A')
+        with self.captureOnCommitCallbacks(execute=True):
+            holiday.delete()
+        self.assertEqual((self._titles(self.jss1), self._titles()), ([], []))
+
+
+class NotificationDeliveryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(name, email=f'{name}@example.com', role=User.ROLE_STUDENT)
+            for name in ('ada', 'bola')
+        ]
+        cls.no_email = User.objects.create_user('chi', role=User.ROLE_STUDENT)
+
+    def _record(self, title, users=None):
+        return notifications.record([u.pk for u in users or self.users], Notification.KIND_RESULTS, title)
+
+    def test_one_digest_per_user_and_one_queued_run(self):
+        self._record('Maths approved')
+        self._record('English approved', [*self.users, self.no_email])
+        self.assertEqual(Job.objects.filter(key=notifications.DELIVER_KEY).count(), 1)
+        stats = notifications.deliver_pending()
+        self.assertEqual((stats.emails, stats.notifications, stats.skipped), (2, 4, 1))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['ada@example.com', 'bola@example.com'])
+        self.assertIn('2 new notifications', mail.outbox[0].subject)
+        self.assertFalse(Notification.objects.filter(sent_at=None).exists())
+        self.assertEqual(notifications.deliver_pending().emails, 0)
+
+    def test_rows_claimed_by_another_run_are_left_to_it(self):
+        self._record('Maths approved')
+        Notification.objects.filter(user=self.users[0]).update(
+            claimed_by='other', claimed_until=timezone.now() + timedelta(seconds=notifications.CLAIM_TIMEOUT))
+        notifications.deliver_pending()
+        self.assertEqual([m.to[0] for m in mail.outbox], ['bola@example.com'])
+        # Once that claim runs out the rows are sent by the next run
+        Notification.objects.filter(user=self.users[0]).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        notifications.deliver_pending()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_send_releases_its_claim(self):
+        self._record('Maths approved')
+        broken = mock.MagicMock()
+        broken.__enter__.return_value.send_messages.side_effect = OSError('SMTP down')
+        with self.assertRaises(OSError):
+            notifications.deliver_pending(connection=broken)
+        self.assertFalse(Notification.objects.exclude(claimed_by='').exists())
+        self.assertEqual(notifications.deliver_pending().emails, 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = replicas.PrimaryReplicaRouter()
+
+    def _read_db(self, request, write=False):
+        """The alias a replica-read view reads from, before and after an optional write."""
+        seen = []
+
+        @replicas.replica_reads
+        def view(request):
+            seen.append(self.router.db_for_read(Result))
+            if write:
+                self.router.db_for_write(Result)
+                seen.append(self.router.db_for_read(Result))
+            return HttpResponse()
+
+        response = replicas.ReplicaMiddleware(view)(request)
+        return seen, response
+
+    def test_get_reads_from_a_replica(self):
+        seen, response = self._read_db(self.factory.get('/'))
+        self.assertEqual(seen, ['replica1'])
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(Result), 'default')  # outside the view
+
+    def test_a_write_pins_the_rest_of_the_request_and_the_browser(self):
+        seen, response = self._read_db(self.factory.get('/'), write=True)
+        self.assertEqual(seen, ['replica1', 'default'])
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 60)
+
+    def test_pinned_browsers_posts_and_primary_blocks_read_the_primary(self):
+        pinned = self.factory.get('/')
+        pinned.COOKIES[replicas.PIN_COOKIE] = '1'
+        self.assertEqual(self._read_db(pinned)[0], ['default'])
+        seen, response = self._read_db(self.factory.post('/'))
+        self.assertEqual(seen, ['default'])
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+        @replicas.replica_reads
+        def view(request):
+            with replicas.primary():
+                return self.router.db_for_read(Result)
+        self.assertEqual(view(self.factory.get('/')), 'default')
@@ -0,0 +1,144 @@
+"""
+Typeahead for student and teacher pickers.
+
+Each person has one PickerKey row per lower-cased word of their name,
+username and ID, carrying a ready-made label. A keystroke is one range scan
+on the (kind, key) index: ``key >= 'ade' AND key < 'ade\\uffff'`` on SQLite,
+``key LIKE 'ade%'`` on PostgreSQL (served by a varchar_pattern_ops index).
+Each further word of the query must prefix-match another key of the same
+person. The rows are refreshed by the signal handlers in portal.signals,
+and ``manage.py rebuild_search`` rebuilds them.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from .jobs import task
+from .models import PickerKey, Student, Teacher
+
+BATCH_SIZE = 1000
+MAX_TERMS = 4
+LIMIT = 10
+KEY_LENGTH = PickerKey._meta.get_field('key').max_length
+LABEL_LENGTH = PickerKey._meta.get_field('label').max_length
+
+
+def words(text):
+    return [w[:KEY_LENGTH] for w in re.findall(r'\w+', (text or '').lower())]
+
+
+# --- Keys -----------------------------------------------------------------------
+
+def _student(student):
+    user = student.user
+    name = user.get_full_name() or user.username
+    details = [student.student_id, student.current_class.name if student.current_class else '']
+    label = ' · '.join([name] + [d for d in details if d])
+    keys = words(f'{user.first_name} {user.last_name} {user.username} {student.student_id}')
+    return label, keys, student.current_class_id
+
+
+def _teacher(teacher):
+    user = teacher.user
+    name = user.get_full_name() or user.username
+    label = f'{name} · {teacher.employee_id}' if teacher.employee_id else name
+    keys = words(f'{user.first_name} {user.last_name} {user.username} {teacher.employee_id}')
+    return label, keys, None
+
+
+# kind: (model, key builder, queryset loading what the builder reads)
+SOURCES = {
+    PickerKey.KIND_STUDENT: (Student, _student, lambda: Student.objects.select_related('user', 'current_class')),
+    PickerKey.KIND_TEACHER: (Teacher, _teacher, lambda: Teacher.objects.select_related('user')),
+}
+KINDS = {model: kind for kind, (model, _, _) in SOURCES.items()}
+
+
+def refresh(kind, objects):
+    """Replace the keys of ``objects`` (all of ``kind``); returns the number of rows written."""
+    _, build, _ = SOURCES[kind]
+    rows, pks = [], []
+    for obj in objects:
+        pks.append(obj.pk)
+        label, keys, class_id = build(obj)
+        rows += [
+            PickerKey(kind=kind, object_id=obj.pk, key=key, label=label[:LABEL_LENGTH], class_ref_id=class_id)
+            for key in dict.fromkeys(keys)
+        ]
+    remove(kind, pks)
+    PickerKey.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def remove(kind, pks):
+    return PickerKey.objects.filter(kind=kind, object_id__in=pks).delete()[0] if pks else 0
+
+
+def rebuild(kinds=None):
+    """Recreate the keys of the given kinds (default: all); returns {kind: people}."""
+    counts = {}
+    for kind in kinds or SOURCES:
+        _, _, queryset = SOURCES[kind]
+        PickerKey.objects.filter(kind=kind).delete()
+        batch, count = [], 0
+        for obj in queryset().order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                refresh(kind, batch)
+                count, batch = count + len(batch), []
+        if batch:
+            refresh(kind, batch)
+        counts[kind] = count + len(batch)
+    return counts
+
+
+@task(priority=80)
+def refresh_class(class_id):
+    """Relabel a class's students (after a rename)."""
+    _, _, students = SOURCES[PickerKey.KIND_STUDENT]
+    return refresh(PickerKey.KIND_STUDENT, students().filter(current_class_id=class_id))
+
+
+# --- Lookups --------------------------------------------------------------------
+
+def _prefix(queryset, word):
+    if connection.vendor == 'postgresql':
+        return queryset.filter(key__startswith=word)
+    return queryset.filter(key__gte=word, key__lt=word + '\uffff')
+
+
+def matching(kind, query, class_id=None):
+    """PickerKey rows of people matching every word of ``query`` (None if it has no words)."""
+    terms = words(query)[:MAX_TERMS]
+    if not terms:
+        return None
+    # The longest word is the most selective: scan for it, check the others per person
+    terms.sort(key=len, reverse=True)
+    rows = _prefix(PickerKey.objects.filter(kind=kind), terms[0])
+    if class_id is not None:
+        rows = rows.filter(class_ref_id=class_id)
+    for term in terms[1:]:
+        rows = rows.filter(Exists(_prefix(PickerKey.objects.filter(kind=kind, object_id=OuterRef('object_id')), term)))
+    return rows
+
+
+def suggest(kind, query, class_id=None, limit=LIMIT):
+    """Top ``limit`` matches as [{'id': pk, 'text': label}], closest key first."""
+    rows = matching(kind, query, class_id)
+    if rows is None:
+        return []
+    results, seen = [], set()
+    # A person has at most a handful of keys starting with the same prefix
+    for object_id, label in rows.order_by('key').values_list('object_id', 'label')[:limit * 4]:
+        if object_id not in seen:
+            seen.add(object_id)
+            results.append({'id': object_id, 'text': label})
+            if len(results) == limit:
+                break
+    return results
+
+
+def label(kind, pk):
+    """The picker label of one person, or '' if unknown."""
+    return PickerKey.objects.filter(kind=kind, object_id=pk).values_list('label', flat=True).first() or ''
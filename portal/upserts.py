@@ -0,0 +1,58 @@
+"""
+Batched upserts that work on every database backend.
+
+Search entries, imported results, term reports and attendance rows are
+written with one INSERT ... ON CONFLICT (unique key) DO UPDATE per batch.
+The statement differs by backend:
+
+* SQLite and PostgreSQL: ON CONFLICT on the given unique fields;
+* MySQL / MariaDB: ON DUPLICATE KEY UPDATE, which takes no conflict target
+  (it fires on any unique key, so the model must have no other unique
+  constraint the new rows could hit);
+* anything else: the existing rows are looked up by their unique fields and
+  updated with bulk_update, and the rest inserted with bulk_create.
+
+    upsert(rows, unique_fields=['student', 'term'], update_fields=['total', 'position'])
+"""
+from django.db import connections, router
+
+BATCH_SIZE = 500
+
+
+def upsert(objs, unique_fields, update_fields, batch_size=BATCH_SIZE):
+    """Insert ``objs`` (all of one model) or update the rows sharing their unique fields; returns the count."""
+    objs = list(objs)
+    if not objs:
+        return 0
+    model = type(objs[0])
+    features = connections[router.db_for_write(model)].features
+    if features.supports_update_conflicts_with_target:
+        model.objects.bulk_create(
+            objs, batch_size=batch_size,
+            update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields,
+        )
+    elif features.supports_update_conflicts:
+        model.objects.bulk_create(objs, batch_size=batch_size, update_conflicts=True, update_fields=update_fields)
+    else:
+        for i in range(0, len(objs), batch_size):
+            _update_or_insert(model, objs[i:i + batch_size], unique_fields, update_fields)
+    return len(objs)
+
+
+def _update_or_insert(model, objs, unique_fields, update_fields):
+    attnames = [model._meta.get_field(name).attname for name in unique_fields]
+    # One IN list per key column selects a superset of the rows; match them exactly here
+    lookups = {f'{attname}__in': {getattr(obj, attname) for obj in objs} for attname in attnames}
+    existing = {row[:-1]: row[-1] for row in model.objects.filter(**lookups).values_list(*attnames, 'pk')}
+    updates, inserts = [], []
+    for obj in objs:
+        pk = existing.get(tuple(getattr(obj, attname) for attname in attnames))
+        if pk is None:
+            inserts.append(obj)
+            continue
+        obj.pk = pk
+        for name in update_fields:
+            model._meta.get_field(name).pre_save(obj, add=False)  # fills auto_now columns
+        updates.append(obj)
+    model.objects.bulk_update(updates, update_fields)
+    model.objects.bulk_create(inserts)
@@ -1,37 +1,55 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'portal'
 
+
+def _dashboard(sync_view, async_view):
+    # Served by the async version under ASGI (config/asgi.py turns ASYNC_VIEWS on)
+    return async_view if settings.ASYNC_VIEWS else sync_view
+
+
 urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('', views.dashboard, name='dashboard'),
+    path('search/', views.search, name='search'),
+    path('typeahead/<str:kind>/', views.typeahead, name='typeahead'),
 
     # Admin
-    path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin-dashboard/', _dashboard(views.admin_dashboard, views.admin_dashboard_async), name='admin_dashboard'),
     path('admin/students/', views.student_management, name='student_management'),
     path('admin/students/<int:pk>/', views.student_profile, name='student_profile'),
     path('admin/teachers/', views.teacher_management, name='teacher_management'),
     path('admin/teachers/<int:pk>/', views.teacher_profile, name='teacher_profile'),
     path('admin/classes/', views.class_management, name='class_management'),
     path('admin/results/', views.results_management, name='results_management'),
+    path('admin/results/bulk/', views.bulk_result_action, name='bulk_result_action'),
     path('admin/results/<int:pk>/approve/', views.approve_result, name='approve_result'),
     path('admin/results/<int:pk>/reject/', views.reject_result, name='reject_result'),
+    path('admin/results/rankings/', views.class_rankings, name='class_rankings'),
+    path('admin/results/report-cards/', views.download_report_cards, name='download_report_cards'),
+    path('admin/attendance/', views.attendance_report, name='attendance_report'),
+    path('admin/exports/results/', views.export_results, name='export_results'),
+    path('admin/exports/roster/', views.export_roster, name='export_roster'),
+    path('admin/exports/attendance/', views.export_attendance, name='export_attendance'),
     path('admin/announcements/', views.announcements_list, name='announcements_list'),
     path('admin/announcements/add/', views.add_announcement, name='add_announcement'),
     path('admin/admissions/', views.admissions_queue, name='admissions_queue'),
+    path('admin/admissions/onboard/', views.onboard_students, name='onboard_students'),
     path('admin/admissions/<int:pk>/approve/', views.approve_admission, name='approve_admission'),
     path('admin/admissions/<int:pk>/reject/', views.reject_admission, name='reject_admission'),
     path('admin/settings/', views.settings_page, name='settings'),
 
     # Teacher
-    path('teacher/', views.teacher_dashboard, name='teacher_dashboard'),
+    path('teacher/', _dashboard(views.teacher_dashboard, views.teacher_dashboard_async), name='teacher_dashboard'),
     path('teacher/upload-results/', views.upload_results, name='upload_results'),
     path('teacher/students/', views.view_students, name='view_students'),
+    path('teacher/attendance/', views.attendance_register, name='attendance_register'),
 
     # Student
-    path('student/', views.student_dashboard, name='student_dashboard'),
+    path('student/', _dashboard(views.student_dashboard, views.student_dashboard_async), name='student_dashboard'),
     path('student/results/', views.my_results, name='my_results'),
     path('student/announcements/', views.student_announcements, name='student_announcements'),
 ]
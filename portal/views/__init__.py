@@ -1,23 +1,28 @@
 from .auth import login_view, logout_view
 from .dashboard import dashboard
 from .admin_views import (
-    admin_dashboard, student_management, teacher_management,
+    admin_dashboard, admin_dashboard_async, student_management, teacher_management,
     class_management, results_management, announcements_list, add_announcement,
     admissions_queue, settings_page,
     student_profile, teacher_profile,
-    approve_result, reject_result,
-    approve_admission, reject_admission,
+    approve_result, reject_result, bulk_result_action, class_rankings,
+    download_report_cards, attendance_report,
+    export_results, export_roster, export_attendance,
+    approve_admission, onboard_students, reject_admission,
 )
-from .teacher_views import teacher_dashboard, upload_results, view_students
-from .student_views import student_dashboard, my_results, student_announcements
+from .teacher_views import teacher_dashboard, teacher_dashboard_async, upload_results, view_students, attendance_register
+from .student_views import student_dashboard, student_dashboard_async, my_results, student_announcements
+from .search_views import search, typeahead
 
 __all__ = [
     'login_view', 'logout_view', 'dashboard',
-    'admin_dashboard', 'student_management', 'teacher_management',
+    'admin_dashboard', 'admin_dashboard_async', 'student_management', 'teacher_management',
     'class_management', 'results_management', 'announcements_list', 'add_announcement',
     'admissions_queue', 'settings_page',
     'student_profile', 'teacher_profile',
-    'approve_result', 'reject_result', 'approve_admission', 'reject_admission',
-    'teacher_dashboard', 'upload_results', 'view_students',
-    'student_dashboard', 'my_results', 'student_announcements',
+    'approve_result', 'reject_result', 'bulk_result_action', 'class_rankings', 'download_report_cards', 'attendance_report',
+    'export_results', 'export_roster', 'export_attendance', 'approve_admission', 'onboard_students', 'reject_admission',
+    'teacher_dashboard', 'teacher_dashboard_async', 'upload_results', 'view_students', 'attendance_register',
+    'student_dashboard', 'student_dashboard_async', 'my_results', 'student_announcements',
+    'search', 'typeahead',
 ]
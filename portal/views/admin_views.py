@@ -1,60 +1,101 @@
+import csv
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from ..models import (
     User, Student, Teacher, Class, Subject, Term, Result,
-    Announcement, AdmissionApplication, ContactMessage,
-    AcademicSession, ClassSubject,
+    Announcement, AdmissionApplication,
+    AcademicSession, ClassSubject, TermReport, AttendanceYear,
 )
-from ..forms import AnnouncementForm
+from ..forms import AnnouncementForm, ResultFilterForm, StudentOnboardingForm
+from .. import aio, approvals, attendance, counters, exports, notifications, onboarding, report_cards
+from ..importers import ImportFormatError, iter_upload
+from ..pagination import KeysetPaginator
+from ..principal import role_required
+from ..replicas import replica_reads
+
+admin_required = role_required(User.ROLE_ADMIN)
+
+
+DASHBOARD_COUNTERS = {
+    'students_count': counters.STUDENTS,
+    'teachers_count': counters.TEACHERS,
+    'pending_results': counters.PENDING_RESULTS,
+    'pending_admissions': counters.PENDING_ADMISSIONS,
+    'unread_contacts': counters.UNREAD_CONTACTS,
+}
 
 
-def admin_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated or request.user.role != 'admin':
-            return redirect('portal:login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
+def _dashboard_context(totals):
+    return {name: totals[counter] for name, counter in DASHBOARD_COUNTERS.items()}
 
 
 @login_required
 @admin_required
 def admin_dashboard(request):
-    students_count = Student.objects.count()
-    teachers_count = Teacher.objects.count()
-    pending_results = Result.objects.filter(status=Result.STATUS_PENDING).count()
-    pending_admissions = AdmissionApplication.objects.filter(status=AdmissionApplication.STATUS_PENDING).count()
-    unread_contacts = ContactMessage.objects.filter(read=False).count()
-    return render(request, 'portal/admin/dashboard.html', {
-        'students_count': students_count,
-        'teachers_count': teachers_count,
-        'pending_results': pending_results,
-        'pending_admissions': pending_admissions,
-        'unread_contacts': unread_contacts,
-    })
+    totals = counters.read(*DASHBOARD_COUNTERS.values())
+    return render(request, 'portal/admin/dashboard.html', _dashboard_context(totals))
+
+
+@admin_required
+async def admin_dashboard_async(request):
+    """
+    admin_dashboard for ASGI. The counters are maintained rows read in one
+    query, so there is nothing to split; the read just runs off the event loop.
+    """
+    totals = (await aio.gather({'totals': lambda: counters.read(*DASHBOARD_COUNTERS.values())}))['totals']
+    return render(request, 'portal/admin/dashboard.html', _dashboard_context(totals))
 
 
 @login_required
 @admin_required
+@replica_reads
 def student_management(request):
-    students = Student.objects.select_related('user', 'current_class').all()
-    return render(request, 'portal/admin/student_management.html', {'students': students})
+    students = Student.objects.select_related('user', 'current_class')
+    class_pk = request.GET.get('class')
+    if class_pk and class_pk.isdecimal():
+        students = students.filter(current_class_id=class_pk)
+    page = KeysetPaginator(students, ('student_id', 'pk'), per_page=50).page_for_request(request)
+    return render(request, 'portal/admin/student_management.html', {
+        'students': page,
+        'page': page,
+        'classes': Class.objects.all(),
+        'selected_class': class_pk,
+    })
 
 
 @login_required
 @admin_required
 def student_profile(request, pk):
     student = get_object_or_404(Student, pk=pk)
-    results = Result.objects.filter(student=student).select_related('subject', 'term').order_by('-term__start_date')
-    return render(request, 'portal/admin/student_profile.html', {'student': student, 'results': results})
+    results = Result.objects.filter(student=student).select_related('subject', 'term').annotate(term_start=F('term__start_date'))
+    # Newest term first by date: term pks need not follow the calendar
+    page = KeysetPaginator(results, ('-term_start', '-term_id', 'subject_id', 'pk'), per_page=50).page_for_request(request)
+    year = AttendanceYear.objects.filter(student=student, session__is_current=True).select_related('session').first()
+    absences = [on_date for on_date, present in attendance.year_days(year) if not present] if year else []
+    return render(request, 'portal/admin/student_profile.html', {
+        'student': student,
+        'results': page,
+        'page': page,
+        'attendance_year': year,
+        'absences': absences,
+    })
 
 
 @login_required
 @admin_required
+@replica_reads
 def teacher_management(request):
-    teachers = Teacher.objects.select_related('user').prefetch_related('subjects').all()
-    return render(request, 'portal/admin/teacher_management.html', {'teachers': teachers})
+    teachers = Teacher.objects.select_related('user').prefetch_related('subjects')
+    page = KeysetPaginator(teachers, ('employee_id', 'pk'), per_page=50).page_for_request(request)
+    return render(request, 'portal/admin/teacher_management.html', {'teachers': page, 'page': page})
 
 
 @login_required
@@ -67,6 +108,7 @@ def teacher_profile(request, pk):
 
 @login_required
 @admin_required
+@replica_reads
 def class_management(request):
     classes = Class.objects.prefetch_related('class_subjects__subject', 'class_subjects__teacher').all()
     subjects = Subject.objects.all()
@@ -75,37 +117,206 @@ def class_management(request):
 
 @login_required
 @admin_required
+@replica_reads
 def results_management(request):
-    pending = Result.objects.filter(status=Result.STATUS_PENDING).select_related('student__user', 'subject', 'term', 'uploaded_by')
-    return render(request, 'portal/admin/results_management.html', {'pending_results': pending})
+    filter_form = ResultFilterForm(request.GET or None)
+    if filter_form.is_bound and not filter_form.is_valid():
+        messages.error(request, f'Filters cleared: {filter_form.error_summary()}')
+        return redirect('portal:results_management')
+    filters = filter_form.filters()
+    pending = approvals.pending_results(**filters).select_related('student__user', 'subject', 'term', 'uploaded_by')
+    page = KeysetPaginator(pending, ('term_id', 'student_id', 'pk'), per_page=100).page_for_request(request)
+    return render(request, 'portal/admin/results_management.html', {
+        'pending_results': page,
+        'page': page,
+        'filter_form': filter_form,
+        'is_filtered': bool(filters),
+        'query_string': request.GET.urlencode(),
+    })
+
+
+@login_required
+@admin_required
+def bulk_result_action(request):
+    """Approve or reject pending results by selection or by the current filters, in one UPDATE."""
+    if request.method != 'POST':
+        return redirect('portal:results_management')
+    filter_form = ResultFilterForm(request.POST)
+    if request.POST.get('scope') == 'selected':
+        pks = [pk for pk in request.POST.getlist('selected') if pk.isdecimal()]
+        if not pks:
+            messages.info(request, 'No results selected.')
+            return _back_to_results(request)
+        queryset = approvals.pending_results(pks=pks)
+    elif not filter_form.is_valid():
+        # Never fall back to no filters: that would act on every pending result in the school
+        messages.error(request, f'Nothing changed; the filters are no longer valid ({filter_form.error_summary()}).')
+        return redirect('portal:results_management')
+    else:
+        queryset = approvals.pending_results(**filter_form.filters())
+
+    action = request.POST.get('action')
+    if action not in ('approve', 'reject'):
+        messages.info(request, 'Choose approve or reject.')
+    elif request.POST.get('dry_run'):
+        count = queryset.count()
+        messages.info(request, f'Dry run: {count} pending result(s) would be {action}d.')
+    elif action == 'approve':
+        count = approvals.approve(queryset)
+        messages.success(request, f'{count} result(s) approved. They are now visible to students.')
+    else:
+        count = approvals.reject(queryset)
+        messages.info(request, f'{count} result(s) rejected.')
+    return _back_to_results(request)
+
+
+def _query_pk(request, name):
+    """The primary key passed as ?<name>=; 404 when it is missing or not a number."""
+    value = request.GET.get(name, '')
+    if not value.isdecimal():  # isdigit() also passes '²', which int() rejects
+        raise Http404(f'Invalid or missing "{name}".')
+    return int(value)
+
+
+def _back_to_results(request):
+    url = reverse('portal:results_management')
+    query_string = request.POST.get('query_string', '')
+    return redirect(f'{url}?{query_string}' if query_string else url)
 
 
 @login_required
 @admin_required
 def approve_result(request, pk):
-    result = get_object_or_404(Result, pk=pk)
-    result.status = Result.STATUS_APPROVED
-    result.approved_at = timezone.now()
-    result.save()
-    messages.success(request, 'Result approved. It is now visible to the student.')
+    if approvals.approve(Result.objects.filter(pk=pk)):
+        messages.success(request, 'Result approved. It is now visible to the student.')
+    else:
+        get_object_or_404(Result, pk=pk)
+        messages.info(request, 'Result was already reviewed.')
     return redirect('portal:results_management')
 
 
 @login_required
 @admin_required
 def reject_result(request, pk):
-    result = get_object_or_404(Result, pk=pk)
-    result.status = Result.STATUS_REJECTED
-    result.save()
-    messages.info(request, 'Result rejected.')
+    if approvals.reject(Result.objects.filter(pk=pk)):
+        messages.info(request, 'Result rejected.')
+    else:
+        get_object_or_404(Result, pk=pk)
+        messages.info(request, 'Result was already reviewed.')
     return redirect('portal:results_management')
 
 
 @login_required
 @admin_required
+@replica_reads
+def class_rankings(request):
+    """Class positions for a term, read straight from the precomputed TermReports."""
+    terms = Term.objects.select_related('session').order_by('-session__start_date', '-start_date')
+    classes = Class.objects.all()
+    class_pk = request.GET.get('class')
+    term_pk = request.GET.get('term')
+    page = None
+    if class_pk and term_pk:
+        rankings = TermReport.objects.filter(
+            class_ref_id=_query_pk(request, 'class'), term_id=_query_pk(request, 'term'),
+        ).select_related('student__user')
+        page = KeysetPaginator(rankings, ('position', 'pk'), per_page=100).page_for_request(request)
+    return render(request, 'portal/admin/class_rankings.html', {
+        'terms': terms,
+        'classes': classes,
+        'rankings': page or [],
+        'page': page,
+        'selected_class': class_pk,
+        'selected_term': term_pk,
+    })
+
+
+@login_required
+@admin_required
+def download_report_cards(request):
+    """Zip of PDF report cards for one class and term, streamed as the cards are rendered."""
+    class_ref = get_object_or_404(Class, pk=_query_pk(request, 'class'))
+    term = get_object_or_404(Term.objects.select_related('session'), pk=_query_pk(request, 'term'))
+    documents = report_cards.iter_rendered([(class_ref.pk, term.pk)], workers=settings.REPORT_CARD_WORKERS)
+    response = StreamingHttpResponse(report_cards.stream_zip(documents), content_type='application/zip')
+    filename = report_cards.zip_filename(class_ref.name, f'{term.session.name} {term.name}')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+@admin_required
+@replica_reads
+def attendance_report(request):
+    """Attendance rates per class and students below a threshold, from the yearly bitmaps."""
+    sessions = AcademicSession.objects.all()
+    session = sessions.filter(pk=_query_pk(request, 'session')).first() if request.GET.get('session') else None
+    session = session or sessions.filter(is_current=True).first()
+    terms = session.terms.all() if session else []
+    term = session.terms.filter(pk=_query_pk(request, 'term')).first() if session and request.GET.get('term') else None
+    try:
+        threshold = min(max(int(request.GET.get('threshold', 90)), 1), 100)
+    except ValueError:
+        threshold = 90
+    classes, flagged = attendance.absence_report(session, term, threshold / 100) if session else ([], [])
+    return render(request, 'portal/admin/attendance_report.html', {
+        'sessions': sessions,
+        'terms': terms,
+        'session': session,
+        'term': term,
+        'threshold': threshold,
+        'classes': classes,
+        'flagged': flagged,
+    })
+
+
+@login_required
+@admin_required
+def export_results(request):
+    """Results matching the results-page filters (any status unless ?status=), streamed as CSV or XLSX."""
+    filter_form = ResultFilterForm(request.GET or None)
+    if filter_form.is_bound and not filter_form.is_valid():
+        # An invalid filter must not widen the export to every result
+        return HttpResponseBadRequest(f'Invalid filters: {filter_form.error_summary()}', content_type='text/plain')
+    filters = filter_form.filters()
+    status = request.GET.get('status')
+    queryset = exports.results_queryset(status=status if status in dict(Result.STATUS_CHOICES) else None, **filters)
+    return exports.response(exports.results(queryset), request.GET.get('format'))
+
+
+@login_required
+@admin_required
+def export_roster(request):
+    """Students of one class (?class=) or the whole school, streamed as CSV or XLSX."""
+    students = Student.objects.all()
+    class_ref = None
+    if request.GET.get('class'):
+        class_ref = get_object_or_404(Class, pk=_query_pk(request, 'class'))
+        students = students.filter(current_class=class_ref)
+    name = f'roster-{class_ref.name}' if class_ref else 'roster'
+    return exports.response(exports.roster(students), request.GET.get('format'), name=name)
+
+
+@login_required
+@admin_required
+def export_attendance(request):
+    """Daily attendance rows for a session or term (and optionally a class), streamed as CSV or XLSX."""
+    session = get_object_or_404(AcademicSession, pk=_query_pk(request, 'session'))
+    term = get_object_or_404(session.terms, pk=_query_pk(request, 'term')) if request.GET.get('term') else None
+    class_ref = get_object_or_404(Class, pk=_query_pk(request, 'class')) if request.GET.get('class') else None
+    period = term or session
+    queryset = exports.attendance_queryset(class_ref, period.start_date, period.end_date)
+    name = ' '.join(['attendance', session.name, term.name if term else '', class_ref.name if class_ref else ''])
+    return exports.response(exports.attendance(queryset), request.GET.get('format'), name=name)
+
+
+@login_required
+@admin_required
+@replica_reads
 def announcements_list(request):
-    announcements = Announcement.objects.select_related('target_class', 'created_by').order_by('-date')[:50]
-    return render(request, 'portal/admin/announcements.html', {'announcements': announcements})
+    announcements = Announcement.objects.select_related('target_class', 'created_by')
+    page = KeysetPaginator(announcements, ('-date', '-created_at', '-pk'), per_page=50).page_for_request(request)
+    return render(request, 'portal/admin/announcements.html', {'announcements': page, 'page': page})
 
 
 @login_required
@@ -126,25 +337,71 @@ def add_announcement(request):
 
 @login_required
 @admin_required
+@replica_reads
 def admissions_queue(request):
     applications = AdmissionApplication.objects.select_related('applying_class').filter(
         status=AdmissionApplication.STATUS_PENDING
-    ).order_by('-submitted_at')
-    return render(request, 'portal/admin/admissions_queue.html', {'applications': applications})
+    )
+    page = KeysetPaginator(applications, ('-submitted_at', '-pk'), per_page=50).page_for_request(request)
+    return render(request, 'portal/admin/admissions_queue.html', {'applications': page, 'page': page})
 
 
 @login_required
 @admin_required
 def approve_admission(request, pk):
     app = get_object_or_404(AdmissionApplication, pk=pk)
+    newly_approved = app.status != AdmissionApplication.STATUS_APPROVED
     app.status = AdmissionApplication.STATUS_APPROVED
     app.reviewed_by = request.user
     app.reviewed_at = timezone.now()
-    app.save()
-    messages.success(request, 'Application approved. You can now create a student record from the admin.')
+    with transaction.atomic():
+        app.save()
+        if newly_approved:
+            notifications.admission_approved.enqueue(app.pk)
+    messages.success(request, 'Application approved. Create the student account from Onboard students.')
     return redirect('portal:admissions_queue')
 
 
+@login_required
+@admin_required
+def onboard_students(request):
+    """Create students in bulk; answers with the login details as a CSV download."""
+    report = None
+    pending = onboarding.StudentOnboarder.pending_applications()
+    if request.method == 'POST':
+        form = StudentOnboardingForm(request.POST, request.FILES)
+        if form.is_valid():
+            data = form.cleaned_data
+            onboarder = onboarding.StudentOnboarder(class_ref=data['class_ref'], workers=settings.ONBOARDING_WORKERS)
+            try:
+                if data['source'] == form.SOURCE_ROSTER:
+                    entries = onboarder.from_rows(iter_upload(data['file']))
+                else:
+                    entries = onboarder.from_applications(pending)
+                report = onboarder.run(entries)
+            except ImportFormatError as exc:
+                form.add_error(None, str(exc))
+            else:
+                if report.created:
+                    response = HttpResponse(content_type='text/csv')
+                    response['Content-Disposition'] = (
+                        f'attachment; filename="student-logins-{timezone.localdate().isoformat()}.csv"'
+                    )
+                    onboarding.write_credentials(csv.writer(response), report.credentials)
+                    return response
+                if report.ok:
+                    messages.info(request, 'Nothing to onboard.')
+                    return redirect('portal:onboard_students')
+                messages.warning(request, f'{report.error_count} problem(s) found; no students were created.')
+    else:
+        form = StudentOnboardingForm()
+    return render(request, 'portal/admin/onboard_students.html', {
+        'form': form,
+        'report': report,
+        'pending_count': pending.count(),
+    })
+
+
 @login_required
 @admin_required
 def reject_admission(request, pk):
@@ -0,0 +1,73 @@
+import hashlib
+import json
+
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from .. import api
+
+
+def _respond(request, status, body, etag):
+    """JSON response for ``body``; a 304 when the client already holds ``etag``."""
+    response = None
+    if status == 200 and etag:
+        response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, status=status, content_type='application/json')
+    if etag:
+        response['ETag'] = etag
+    # Per-user data: only the client may keep it, and must revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+@require_GET
+def api_index(request):
+    """The resources this caller can read, with their fields."""
+    resources = {
+        name: {
+            'url': request.build_absolute_uri(reverse('api_v1:resource', args=[name])),
+            'fields': list(api.RESOURCES[name].fields),
+            'default_fields': list(api.RESOURCES[name].default),
+            'filters': list(api.RESOURCES[name].filters),
+        }
+        for name in api.visible_resources(request.principal)
+    }
+    body = json.dumps({'version': api.VERSION, 'resources': resources}).encode()
+    return _respond(request, 200, body, '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest())
+
+
+@require_GET
+def api_resource(request, name, pk=None):
+    """A page of a collection (?fields=, ?limit=, ?cursor=, filters) or one item."""
+    return _respond(request, *api.fetch(name, request.principal, request.GET.dict(), pk))
+
+
+@require_GET
+def api_batch(request):
+    """
+    Several reads in one round trip: ``?get=results%3Fterm%3D3&get=announcements``.
+    Each part is answered as its own request would be. The batch's ETag
+    combines theirs, so an unchanged batch is a 304.
+    """
+    paths = request.GET.getlist('get')
+    if not paths or len(paths) > api.MAX_BATCH:
+        body = json.dumps({'error': f'Pass between 1 and {api.MAX_BATCH} "get" parameters.'}).encode()
+        return _respond(request, 400, body, None)
+    parts, etags = [], []
+    for path in paths:
+        parsed = api.parse_path(path)
+        if parsed is None:
+            status, body, etag = 400, json.dumps({'error': 'Malformed path.'}).encode(), None
+        else:
+            status, body, etag = api.fetch(parsed[0], request.principal, parsed[1], parsed[2])
+        etags.append(f'{status}:{etag}')
+        # Cached bodies are already JSON; splice them in rather than re-encoding
+        parts.append(b'{"path":%s,"status":%d,"etag":%s,"body":%s}' % (
+            json.dumps(path).encode(), status, json.dumps(etag).encode(), body))
+    body = b'{"responses":[' + b','.join(parts) + b']}'
+    etag = '"%s"' % hashlib.md5('|'.join(etags).encode(), usedforsecurity=False).hexdigest()
+    return _respond(request, 200, body, etag)
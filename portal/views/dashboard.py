@@ -5,11 +5,11 @@ from django.contrib.auth.decorators import login_required
 @login_required
 def dashboard(request):
     """Redirect to role-based dashboard."""
-    user = request.user
-    if user.role == 'admin':
+    principal = request.principal
+    if principal.is_admin:
         return redirect('portal:admin_dashboard')
-    if user.role == 'teacher':
+    if principal.is_teacher:
         return redirect('portal:teacher_dashboard')
-    if user.role == 'student':
+    if principal.is_student:
         return redirect('portal:student_dashboard')
     return redirect('portal:admin_dashboard')
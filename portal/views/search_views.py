@@ -0,0 +1,79 @@
+import time
+
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+
+from .. import search as search_index
+from .. import typeahead as typeahead_index
+from ..models import PickerKey, SearchEntry, User
+
+RESULT_LIMIT = 50
+# What each role may search for
+ROLE_KINDS = {
+    User.ROLE_ADMIN: [
+        SearchEntry.KIND_STUDENT, SearchEntry.KIND_APPLICATION, SearchEntry.KIND_ANNOUNCEMENT, SearchEntry.KIND_NEWS,
+    ],
+    User.ROLE_TEACHER: [SearchEntry.KIND_STUDENT, SearchEntry.KIND_ANNOUNCEMENT, SearchEntry.KIND_NEWS],
+    User.ROLE_STUDENT: [SearchEntry.KIND_ANNOUNCEMENT, SearchEntry.KIND_NEWS],
+}
+
+# Which pickers each role may query
+ROLE_PICKERS = {
+    User.ROLE_ADMIN: [PickerKey.KIND_STUDENT, PickerKey.KIND_TEACHER],
+    User.ROLE_TEACHER: [PickerKey.KIND_STUDENT],
+}
+TYPEAHEAD_MAX_AGE = 60  # seconds the browser may reuse an answer for the same prefix
+
+
+def _link(entry, principal):
+    """Where a result leads for this viewer (entries store the admin's link)."""
+    if entry.kind == SearchEntry.KIND_ANNOUNCEMENT and not principal.is_admin:
+        return reverse('portal:student_announcements' if principal.is_student else 'portal:teacher_dashboard')
+    if entry.kind == SearchEntry.KIND_STUDENT and principal.is_teacher:
+        return f"{reverse('portal:view_students')}?class={entry.class_ref_id or ''}"
+    return entry.url
+
+
+@login_required
+def search(request):
+    """Ranked full-text search over what the user's role may see."""
+    principal = request.principal
+    allowed = ROLE_KINDS.get(principal.role, [])
+    kind = request.GET.get('kind', '')
+    kinds = [kind] if kind in allowed else allowed
+    query = request.GET.get('q', '').strip()
+    # Students only see their own class's class-specific announcements
+    class_id = (principal.class_id or 0) if principal.is_student else None
+    started = time.perf_counter()
+    entries = search_index.search(query, kinds, class_id, limit=RESULT_LIMIT) if query and kinds else []
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for entry in entries:
+        entry.link = _link(entry, principal)
+    labels = dict(SearchEntry.KIND_CHOICES)
+    return render(request, 'portal/search.html', {
+        'query': query,
+        'entries': entries,
+        'kind': kind if kind in allowed else '',
+        'kind_choices': [(k, labels[k]) for k in allowed],
+        'elapsed_ms': elapsed_ms,
+    })
+
+
+@require_GET
+@login_required
+def typeahead(request, kind):
+    """Top picker matches for ``q`` as JSON: {"results": [{"id": pk, "text": label}, ...]}."""
+    if kind not in typeahead_index.SOURCES:
+        raise Http404(f'No "{kind}" picker.')
+    if kind not in ROLE_PICKERS.get(request.principal.role, []):
+        return JsonResponse({'results': []}, status=403)
+    class_id = request.GET.get('class', '')
+    results = typeahead_index.suggest(
+        kind, request.GET.get('q', ''), class_id=int(class_id) if class_id.isdecimal() else None,
+    )
+    response = JsonResponse({'results': results})
+    response['Cache-Control'] = f'private, max-age={TYPEAHEAD_MAX_AGE}'
+    return response
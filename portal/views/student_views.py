@@ -1,8 +1,11 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from datetime import datetime
-from django.db.models import Q
-from ..models import Student, Result, Announcement, Term
+from ..models import User, Result, Term, TermReport
+from .. import aio, feeds
+from ..pagination import KeysetPaginator
+from ..principal import role_required
+from ..replicas import replica_reads
 
 
 def _greeting():
@@ -14,41 +17,43 @@ def _greeting():
     return 'Evening'
 
 
-def student_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated or request.user.role != 'student':
-            return redirect('portal:login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
+student_required = role_required(User.ROLE_STUDENT)
+
+
+def _dashboard_queries(request):
+    """The student dashboard's independent reads, as {context name: callable}."""
+    # School-wide + class-specific announcements
+    return {'announcements': lambda: feeds.get_feed(request.principal.class_id)[:10]}
 
 
 @login_required
 @student_required
+@replica_reads
 def student_dashboard(request):
-    try:
-        student = request.user.student_profile
-    except Student.DoesNotExist:
-        student = None
-    # School-wide + class-specific announcements
-    announcements = Announcement.objects.filter(
-        Q(scope=Announcement.SCOPE_SCHOOL) | (Q(target_class=student.current_class) if student and student.current_class else Q(pk__in=[]))
-    ).distinct().order_by('-date')[:10]
+    context = {name: query() for name, query in _dashboard_queries(request).items()}
     return render(request, 'portal/student/dashboard.html', {
-        'student': student,
-        'announcements': announcements,
-        'greeting': _greeting(),
+        'student': request.principal.student, 'greeting': _greeting(), **context,
+    })
+
+
+@student_required
+@replica_reads
+async def student_dashboard_async(request):
+    """student_dashboard for ASGI: the feed is read off the event loop."""
+    context = await aio.gather(_dashboard_queries(request))
+    return render(request, 'portal/student/dashboard.html', {
+        'student': request.principal.student, 'greeting': _greeting(), **context,
     })
 
 
 @login_required
 @student_required
+@replica_reads
 def my_results(request):
-    try:
-        student = request.user.student_profile
-    except Student.DoesNotExist:
-        student = None
+    student = request.principal.student
     term_pk = request.GET.get('term')
     results = []
+    report = None
     terms = Term.objects.select_related('session').order_by('-session__start_date', '-start_date')
     if student and term_pk:
         results = Result.objects.filter(
@@ -56,6 +61,7 @@ def my_results(request):
             term_id=term_pk,
             status=Result.STATUS_APPROVED
         ).select_related('subject', 'term')
+        report = TermReport.objects.filter(student=student, term_id=term_pk).first()
     elif student:
         results = Result.objects.filter(
             student=student,
@@ -64,6 +70,7 @@ def my_results(request):
     return render(request, 'portal/student/my_results.html', {
         'student': student,
         'results': results,
+        'report': report,
         'terms': terms,
         'selected_term': term_pk,
     })
@@ -71,12 +78,15 @@ def my_results(request):
 
 @login_required
 @student_required
+@replica_reads
 def student_announcements(request):
-    try:
-        student = request.user.student_profile
-    except Student.DoesNotExist:
-        student = None
-    announcements = Announcement.objects.filter(
-        Q(scope=Announcement.SCOPE_SCHOOL) | (Q(target_class=student.current_class) if student and student.current_class else Q(pk__in=[]))
-    ).distinct().order_by('-date')
-    return render(request, 'portal/student/announcements.html', {'announcements': announcements, 'student': student})
+    student = request.principal.student
+    class_id = request.principal.class_id
+    feed = feeds.get_feed(class_id)
+    # Pages inside the cached feed cost no queries; older pages seek the index
+    page = KeysetPaginator(
+        feeds.feed_queryset(class_id), feeds.FEED_ORDERING, per_page=20,
+        cached=feed, cached_complete=len(feed) < feeds.FEED_SIZE,
+    ).page_for_request(request)
+    page.object_list = [a if isinstance(a, dict) else feeds.as_entry(a) for a in page.object_list]
+    return render(request, 'portal/student/announcements.html', {'announcements': page, 'page': page, 'student': student})
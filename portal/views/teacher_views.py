@@ -1,8 +1,16 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.utils import timezone
 from datetime import datetime
-from ..models import Teacher, Student, Class, Subject, Term, Result, Announcement, ClassSubject
+from ..models import User, Student, Class, Subject, Term, Result, ClassSubject
+from .. import aio, attendance, feeds
+from ..pagination import KeysetPaginator
+from ..forms import AttendanceRegisterForm, ResultImportForm
+from ..importers import ResultImporter, ImportFormatError, iter_upload, iter_pasted
+from ..principal import role_required
+from ..replicas import replica_reads
 
 
 def _greeting():
@@ -14,43 +22,80 @@ def _greeting():
     return 'Evening'
 
 
-def teacher_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if not request.user.is_authenticated or request.user.role != 'teacher':
-            return redirect('portal:login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
+teacher_required = role_required(User.ROLE_TEACHER)
+
+
+def _dashboard_queries(request):
+    """The teacher dashboard's independent reads, as {context name: callable}."""
+    teacher = request.principal.teacher
+    return {
+        'my_classes': lambda: list(
+            ClassSubject.objects.filter(teacher=teacher).select_related('class_ref', 'subject')
+        ) if teacher else [],
+        'announcements': lambda: feeds.get_feed()[:10],
+        'pending_count': lambda: Result.objects.filter(
+            uploaded_by_id=request.principal.user.pk, status=Result.STATUS_PENDING,
+        ).count(),
+    }
 
 
 @login_required
 @teacher_required
 def teacher_dashboard(request):
-    try:
-        teacher = request.user.teacher_profile
-    except Teacher.DoesNotExist:
-        teacher = None
-    my_classes = ClassSubject.objects.filter(teacher=teacher).select_related('class_ref', 'subject') if teacher else []
-    announcements = Announcement.objects.filter(scope=Announcement.SCOPE_SCHOOL).order_by('-date')[:10]
-    pending_count = Result.objects.filter(uploaded_by=request.user, status=Result.STATUS_PENDING).count()
+    context = {name: query() for name, query in _dashboard_queries(request).items()}
+    return render(request, 'portal/teacher/dashboard.html', {
+        'teacher': request.principal.teacher, 'greeting': _greeting(), **context,
+    })
+
+
+@teacher_required
+async def teacher_dashboard_async(request):
+    """teacher_dashboard for ASGI: the three reads run concurrently."""
+    context = await aio.gather(_dashboard_queries(request))
     return render(request, 'portal/teacher/dashboard.html', {
-        'teacher': teacher,
-        'my_classes': my_classes,
-        'announcements': announcements,
-        'pending_count': pending_count,
-        'greeting': _greeting(),
+        'teacher': request.principal.teacher, 'greeting': _greeting(), **context,
     })
 
 
 @login_required
 @teacher_required
 def upload_results(request):
-    try:
-        teacher = request.user.teacher_profile
-    except Teacher.DoesNotExist:
-        teacher = None
     classes = Class.objects.all()
     subjects = Subject.objects.all()
     terms = Term.objects.select_related('session').order_by('-session__start_date', '-start_date')[:10]
+    report = None
+    if request.method == 'POST':
+        import_form = ResultImportForm(request.POST, request.FILES)
+        if import_form.is_valid():
+            data = import_form.cleaned_data
+            importer = ResultImporter(
+                term=data['term'],
+                uploaded_by=request.user,
+                subject=data.get('subject'),
+                class_ref=data['class_ref'],
+            )
+            rows = iter_upload(data['file']) if data.get('file') else iter_pasted(data['pasted'])
+            try:
+                report = importer.run(rows)
+            except ImportFormatError as exc:
+                import_form.add_error(None, str(exc))
+            else:
+                unchanged = (f' {report.unchanged_approved} already approved result(s) left unchanged.'
+                             if report.unchanged_approved else '')
+                if report.ok:
+                    messages.success(request, f'{report.created_or_updated} result(s) submitted for approval.{unchanged}')
+                    return redirect('portal:upload_results')
+                messages.warning(
+                    request,
+                    f'{report.created_or_updated} result(s) submitted for approval; '
+                    f'{report.error_count} row error(s) need attention.{unchanged}',
+                )
+    else:
+        import_form = ResultImportForm(initial={
+            'class_ref': request.GET.get('class'),
+            'term': request.GET.get('term'),
+            'subject': request.GET.get('subject'),
+        })
     # Show results table for selected class
     class_pk = request.GET.get('class')
     subject_pk = request.GET.get('subject')
@@ -68,21 +113,54 @@ def upload_results(request):
         'selected_class': class_pk,
         'selected_subject': subject_pk,
         'selected_term': term_pk,
+        'import_form': import_form,
+        'report': report,
     })
 
 
 @login_required
 @teacher_required
+@replica_reads
 def view_students(request):
     class_pk = request.GET.get('class')
     students = []
+    page = None
     cls = None
     if class_pk:
         cls = get_object_or_404(Class, pk=class_pk)
-        students = Student.objects.filter(current_class=cls).select_related('user')
+        students = Student.objects.filter(current_class=cls).select_related('user', 'current_class')
+        students = page = KeysetPaginator(students, ('student_id', 'pk'), per_page=100).page_for_request(request)
     classes = Class.objects.all()
     return render(request, 'portal/teacher/view_students.html', {
         'classes': classes,
         'students': students,
+        'page': page,
         'selected_class': cls,
     })
+
+
+@login_required
+@teacher_required
+def attendance_register(request):
+    """Mark a whole class present/absent for a day; saved with one bulk upsert."""
+    data = request.POST if request.method == 'POST' else (request.GET or None)
+    form = AttendanceRegisterForm(data, initial={'date': timezone.localdate()})
+    rows = []
+    if form.is_valid():
+        cls, on_date = form.cleaned_data['class_ref'], form.cleaned_data['date']
+        rows = attendance.register(cls.pk, on_date)
+        if request.method == 'POST':
+            present = set(request.POST.getlist('present'))
+            marks = {
+                student.pk: (str(student.pk) in present, request.POST.get(f'remarks_{student.pk}', '').strip()[:200])
+                for student, _ in rows
+            }
+            count = attendance.mark(on_date, marks)
+            absent = sum(1 for is_present, _ in marks.values() if not is_present)
+            messages.success(request, f'Attendance saved for {count} student(s) in {cls.name} ({absent} absent).')
+            return redirect(f"{reverse('portal:attendance_register')}?class_ref={cls.pk}&date={on_date.isoformat()}")
+    return render(request, 'portal/teacher/attendance_register.html', {
+        'form': form,
+        'rows': rows,
+        'summary': attendance.daily_summary(form.cleaned_data['date']) if form.is_valid() else [],
+    })
@@ -0,0 +1,98 @@
+"""
+Whole-response cache for the public site.
+
+Anonymous GETs of the cached pages are answered from Django's cache, keyed
+by path and page number, without rendering a template or touching the
+database. Responses carry a strong ETag (hash of the body) and a
+Last-Modified taken from the newest NewsArticle change, so returning
+visitors get 304s. Any news save or delete moves the site stamp (see
+public.signals), which retires every cached page at once.
+
+Requests with a session or messages cookie, or any other method, go
+straight to the view: they may show a logged-in user or a flash message.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from portal.models import NewsArticle
+from portal.replicas import primary
+
+STAMP_KEY = 'public:stamp'
+# Pages are retired by the stamp; expiry only bounds the footer year and similar
+PAGE_TIMEOUT = 60 * 60 * 6
+BROWSER_MAX_AGE = 60
+
+
+def _stamp():
+    """Time of the last news change, as a POSIX timestamp."""
+    stamp = cache.get(STAMP_KEY)
+    if stamp is None:
+        newest = NewsArticle.objects.aggregate(newest=Max('updated_at'))['newest']
+        stamp = int((newest or timezone.now()).timestamp())
+        cache.add(STAMP_KEY, stamp, None)
+    return stamp
+
+
+def invalidate():
+    """Retire every cached public page (news was published, edited or removed)."""
+    cache.set(STAMP_KEY, int(timezone.now().timestamp()), None)
+
+
+def _cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and 'messages' not in request.COOKIES
+    )
+
+
+def _key(request, stamp):
+    return f"public:page:{stamp}:{request.path}:{request.GET.get('page', '')}"
+
+
+def _headers(response, etag, stamp):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stamp)
+    patch_vary_headers(response, ('Cookie',))
+    patch_cache_control(response, public=True, max_age=BROWSER_MAX_AGE)
+    return response
+
+
+def public_page(view):
+    """
+    Serve ``view`` to anonymous visitors from the page cache, with conditional
+    GET. Cache fills always read the primary, so an inner ``@replica_reads``
+    only routes the requests that bypass the cache (visitors with a session
+    or messages cookie) to a replica.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view(request, *args, **kwargs)
+        stamp = _stamp()
+        key = _key(request, stamp)
+        entry = cache.get(key)
+        if entry is None:
+            with primary():
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response = response.render()
+            if response.status_code != 200 or response.cookies:
+                return response
+            etag = '"%s"' % hashlib.md5(response.content, usedforsecurity=False).hexdigest()
+            entry = (response.content, response['Content-Type'], etag)
+            cache.set(key, entry, PAGE_TIMEOUT)
+        content, content_type, etag = entry
+        not_modified = get_conditional_response(request, etag=etag, last_modified=stamp)
+        if not_modified is not None:
+            return _headers(not_modified, etag, stamp)
+        return _headers(HttpResponse(content, content_type=content_type), etag, stamp)
+    return wrapper
@@ -0,0 +1,17 @@
+"""
+Signal handlers retiring cached public pages when news changes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from portal.models import NewsArticle
+
+from . import pagecache
+
+
+def _news_changed(sender, **kwargs):
+    transaction.on_commit(pagecache.invalidate)
+
+
+post_save.connect(_news_changed, sender=NewsArticle, dispatch_uid='pagecache-save-news')
+post_delete.connect(_news_changed, sender=NewsArticle, dispatch_uid='pagecache-delete-news')
@@ -1,5 +1,7 @@
 from django.urls import path
 from . import views
+from .pagecache import public_page
+from portal.replicas import replica_reads
 
 app_name = 'public'
 
@@ -9,7 +11,9 @@ urlpatterns = [
     path('academics/', views.academics, name='academics'),
     path('admissions/', views.admissions, name='admissions'),
     path('admissions/apply/', views.online_application, name='online_application'),
-    path('news/', views.NewsListView.as_view(), name='news_list'),
+    # Page-cache fills read the primary; only cache-bypassing requests use a replica
+    path('news/', public_page(replica_reads(views.NewsListView.as_view())), name='news_list'),
+    path('news/search/', views.news_search, name='news_search'),
     path('news/<slug:slug>/', views.news_detail, name='news_detail'),
     path('contact/', views.contact, name='contact'),
     path('portal-login/', views.portal_login, name='portal_login'),
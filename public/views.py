@@ -1,22 +1,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView
-from portal.models import NewsArticle, AdmissionApplication
+from portal import search
+from portal.models import NewsArticle, AdmissionApplication, SearchEntry
+from portal.replicas import replica_reads
 from portal.forms import ContactForm
 from django.contrib import messages
+from .pagecache import public_page
 
 
+@public_page
 def home(request):
     return render(request, 'public/home.html')
 
 
+@public_page
 def about(request):
     return render(request, 'public/about.html')
 
 
+@public_page
 def academics(request):
     return render(request, 'public/academics.html')
 
 
+@public_page
 def admissions(request):
     return render(request, 'public/admissions.html')
 
@@ -61,6 +68,18 @@ class NewsListView(ListView):
     paginate_by = 9
 
 
+@replica_reads
+def news_search(request):
+    """Ranked full-text search over news; not page-cached since every query differs."""
+    query = request.GET.get('q', '').strip()
+    entries = search.search(query, [SearchEntry.KIND_NEWS], limit=30) if query else []
+    found = NewsArticle.objects.in_bulk([e.object_id for e in entries])
+    articles = [found[e.object_id] for e in entries if e.object_id in found]
+    return render(request, 'public/news_list.html', {'articles': articles, 'query': query, 'searching': True})
+
+
+@public_page
+@replica_reads  # only for requests that bypass the page cache; its fills read the primary
 def news_detail(request, slug):
     article = get_object_or_404(NewsArticle, slug=slug)
     return render(request, 'public/news_detail.html', {'article': article})
@@ -1,4 +1,4 @@
-// Shared UI interactions (dropdowns, sidebar toggle)
+// Shared UI interactions (dropdowns, sidebar toggle, select-all checkboxes, typeahead pickers)
 (() => {
   const closeAllDropdowns = (exceptEl) => {
     document.querySelectorAll("[data-dropdown].open").forEach((el) => {
@@ -35,5 +35,83 @@
       document.body.classList.toggle("sidebar-open");
     });
   }
-})();
 
+  // "Select all" checkbox: <input type="checkbox" data-check-all="field-name">
+  document.addEventListener("change", (e) => {
+    const name = e.target.getAttribute && e.target.getAttribute("data-check-all");
+    if (!name) return;
+    const form = e.target.closest("form") || document;
+    form.querySelectorAll(`input[type="checkbox"][name="${name}"]`).forEach((box) => {
+      box.checked = e.target.checked;
+    });
+  });
+
+  // Typeahead picker (portal/forms.py TypeaheadInput): query as the user types,
+  // put the chosen id in the hidden input
+  document.querySelectorAll("[data-typeahead]").forEach((root) => {
+    const hidden = root.querySelector('input[type="hidden"]');
+    const box = root.querySelector('input[type="text"]');
+    const menu = root.querySelector(".typeahead-menu");
+    let timer = null;
+    let active = -1;
+    let request = null;
+
+    const close = () => { menu.hidden = true; active = -1; };
+    const choose = (item) => {
+      hidden.value = item.dataset.id;
+      box.value = item.textContent;
+      close();
+    };
+    const highlight = (index) => {
+      const items = menu.querySelectorAll("li");
+      if (!items.length) return;
+      active = (index + items.length) % items.length;
+      items.forEach((li, i) => li.classList.toggle("active", i === active));
+    };
+
+    box.addEventListener("input", () => {
+      hidden.value = "";
+      clearTimeout(timer);
+      const q = box.value.trim();
+      if (!q) return close();
+      timer = setTimeout(() => {
+        if (request) request.abort();
+        request = new AbortController();
+        fetch(`${root.dataset.typeahead}?q=${encodeURIComponent(q)}`, { signal: request.signal, credentials: "same-origin" })
+          .then((r) => (r.ok ? r.json() : { results: [] }))
+          .then((data) => {
+            menu.replaceChildren(...data.results.map((r) => {
+              const li = document.createElement("li");
+              li.dataset.id = r.id;
+              li.textContent = r.text;
+              li.setAttribute("role", "option");
+              return li;
+            }));
+            menu.hidden = !data.results.length;
+            active = -1;
+          })
+          .catch(() => {});
+      }, 120);
+    });
+
+    box.addEventListener("keydown", (e) => {
+      if (menu.hidden) return;
+      if (e.key === "ArrowDown" || e.key === "ArrowUp") {
+        highlight(active + (e.key === "ArrowDown" ? 1 : -1));
+        e.preventDefault();
+      } else if (e.key === "Enter" && active >= 0) {
+        choose(menu.querySelectorAll("li")[active]);
+        e.preventDefault();
+      } else if (e.key === "Escape") {
+        close();
+      }
+    });
+
+    menu.addEventListener("mousedown", (e) => {
+      const item = e.target.closest("li");
+      if (item) choose(item);
+      e.preventDefault();
+    });
+    box.addEventListener("blur", close);
+  });
+})();